@@ -0,0 +1,34 @@
+"""
+Ограничение частоты запросов к внешним API (общее для приложений проекта)
+"""
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """Ограничивает частоту запросов (не более rate в секунду) для всех потоков процесса"""
+    
+    def __init__(self, rate: Optional[float] = None):
+        self.rate = rate
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+    
+    def wait(self):
+        """Блокирует поток до момента, когда можно отправить следующий запрос"""
+        if not self.interval:
+            return
+        
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._next_slot - now)
+            self._next_slot = max(now, self._next_slot) + self.interval
+        
+        if delay:
+            time.sleep(delay)
+    
+    def pause(self, seconds: float):
+        """Откладывает следующие запросы всех потоков (например, по Retry-After)"""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
@@ -101,6 +101,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Размеры миниатюр /media-thumb/<ширина>x<высота>/<путь>, доступные без подписи
+THUMBNAIL_SIZES = config(
+    'THUMBNAIL_SIZES',
+    default='50x50,100x100,200x100,200x200,300x200',
+    cast=lambda v: {tuple(int(n) for n in s.strip().split('x')) for s in v.split(',') if s.strip()}
+)
+# Префикс для отдачи миниатюр через nginx (X-Accel-Redirect), например '/media/'; пусто - отдает Django
+THUMBNAIL_ACCEL_REDIRECT = config('THUMBNAIL_ACCEL_REDIRECT', default='')
+
 # CKEditor настройки
 CKEDITOR_UPLOAD_PATH = 'uploads/'
 # Используем локальные статические файлы вместо CDN для большей надежности
@@ -132,6 +141,12 @@ CKEDITOR_CONFIGS = {
 # Домен API для замены localhost в URL изображений
 API_DOMAIN = config('API_DOMAIN', default='api.temis.ooo')
 
+# Адрес API MoyKlass (для нагрузочной проверки - локальная заглушка, см. moyklass_stub_server)
+MOYKLASS_API_URL = config('MOYKLASS_API_URL', default='https://api.moyklass.com')
+
+# Доля успешных событий Telegram, для которых в логе сохраняются исходные данные (для ошибок - всегда)
+TELEGRAM_LOG_PAYLOAD_SAMPLE_RATE = config('TELEGRAM_LOG_PAYLOAD_SAMPLE_RATE', default=0.05, cast=float)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
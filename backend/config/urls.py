@@ -6,11 +6,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from moyklass.views import get_source_fields
+from content.views import media_thumbnail
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('admin/moyklass/moyklassintegration/get-source-fields/', 
          get_source_fields, name='moyklass_get_source_fields'),
+    path('media-thumb/<int:width>x<int:height>/<path:path>', media_thumbnail, name='media_thumbnail'),
     path('ckeditor/', include('ckeditor_uploader.urls')),
     path('api/content/', include('content.urls')),
     path('api/quizzes/', include('quizzes.urls')),
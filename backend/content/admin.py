@@ -10,6 +10,15 @@ from .models import (
     ContentPage, CatalogItem, GalleryImage, HomePageBlock, FAQItem,
     WelcomeBanner, WelcomeBannerCard, SocialNetwork
 )
+from .image_queue import requeue_images
+from .utils.thumbnails import thumbnail_url
+
+
+@admin.action(description='Повторить оптимизацию изображений')
+def requeue_image_optimization(modeladmin, request, queryset):
+    """Поставить изображения выбранных объектов в очередь оптимизации"""
+    updated = requeue_images(queryset)
+    modeladmin.message_user(request, f'Поставлено в очередь оптимизации: {updated}')
 
 
 # ==================== КОНТАКТЫ ====================
@@ -26,11 +35,12 @@ class BranchAdmin(admin.ModelAdmin):
     list_editable = ['order', 'is_active']
     list_filter = ['is_active', 'created_at', 'content_page']
     search_fields = ['name', 'address', 'metro', 'phone']
-    readonly_fields = ['image_preview', 'created_at', 'updated_at']
+    readonly_fields = ['image_preview', 'image_status', 'created_at', 'updated_at']
+    actions = [requeue_image_optimization]
     
     fieldsets = (
         ('Основная информация', {
-            'fields': ('name', 'address', 'metro', 'phone', 'image', 'image_preview')
+            'fields': ('name', 'address', 'metro', 'phone', 'image', 'image_preview', 'image_status')
         }),
         ('Страница филиала', {
             'fields': ('content_page',),
@@ -45,7 +55,7 @@ class BranchAdmin(admin.ModelAdmin):
         if obj and obj.image:
             return format_html(
                 '<img src="{}" style="max-width: 200px; max-height: 200px; object-fit: contain;" />',
-                obj.image.url
+                thumbnail_url(obj.image.name, 200, 200)
             )
         return "Нет изображения"
     image_preview.short_description = 'Превью изображения'
@@ -149,7 +159,7 @@ class ContentPageAdmin(admin.ModelAdmin):
         if obj and obj.image:
             return format_html(
                 '<img src="{}" style="max-width: 200px; max-height: 200px; object-fit: contain;" />',
-                obj.image.url
+                thumbnail_url(obj.image.name, 200, 200)
             )
         return "Нет изображения"
     image_preview.short_description = 'Превью изображения'
@@ -158,7 +168,7 @@ class ContentPageAdmin(admin.ModelAdmin):
         if obj and obj.faq_icon:
             return format_html(
                 '<img src="{}" style="max-width: 50px; max-height: 50px; object-fit: contain;" />',
-                obj.faq_icon.url
+                thumbnail_url(obj.faq_icon.name, 50, 50)
             )
         return "Нет иконки"
     faq_icon_preview.short_description = 'Превью иконки FAQ'
@@ -167,7 +177,7 @@ class ContentPageAdmin(admin.ModelAdmin):
         if obj and obj.faq_background_image:
             return format_html(
                 '<img src="{}" style="max-width: 200px; max-height: 100px; object-fit: cover; border-radius: 4px;" />',
-                obj.faq_background_image.url
+                thumbnail_url(obj.faq_background_image.name, 200, 100)
             )
         return "Нет фонового изображения"
     faq_background_image_preview.short_description = 'Превью фонового изображения FAQ'
@@ -194,7 +204,8 @@ class CatalogItemAdmin(admin.ModelAdmin):
     list_editable = ['order', 'is_active', 'has_own_page', 'width']
     list_filter = ['page', 'service', 'branch', 'has_own_page', 'button_type', 'is_active', 'width']
     search_fields = ['title', 'description', 'slug', 'service__title', 'branch__name']
-    readonly_fields = ['card_image_preview', 'page_image_preview']
+    readonly_fields = ['card_image_preview', 'page_image_preview', 'image_status']
+    actions = [requeue_image_optimization]
     prepopulated_fields = {'slug': ('title',)}
     
     fieldsets = (
@@ -207,7 +218,7 @@ class CatalogItemAdmin(admin.ModelAdmin):
             'description': 'Настройки отображения карточки элемента в списке каталога. Изображение, краткое описание (с форматированием), ширина карточки и настройки кнопки.'
         }),
         ('Страница элемента', {
-            'fields': ('has_own_page', 'slug', 'description', 'image', 'page_image_preview', 'image_position', 'image_target_width', 'image_target_height', 'image_align', 'image_size', 'gallery_page'),
+            'fields': ('has_own_page', 'slug', 'description', 'image', 'page_image_preview', 'image_status', 'image_position', 'image_target_width', 'image_target_height', 'image_align', 'image_size', 'gallery_page'),
             'description': 'Настройки страницы элемента (отображается при открытии карточки, если включен режим "Может быть открыт как страница"). Здесь можно задать полное описание с форматированием, изображение и параметры отображения. Видео можно вставлять прямо в редактор описания через кнопку "Вставить видео". Можно выбрать страницу галереи, которая будет отображаться на странице элемента.'
         }),
         ('Настройки', {
@@ -220,12 +231,12 @@ class CatalogItemAdmin(admin.ModelAdmin):
         if obj and obj.card_image:
             return format_html(
                 '<img src="{}" style="max-width: 100px; max-height: 100px; object-fit: contain;" />',
-                obj.card_image.url
+                thumbnail_url(obj.card_image.name, 100, 100)
             )
         elif obj and obj.image:
             return format_html(
                 '<img src="{}" style="max-width: 100px; max-height: 100px; object-fit: contain; opacity: 0.5;" title="Используется изображение страницы" />',
-                obj.image.url
+                thumbnail_url(obj.image.name, 100, 100)
             )
         return "Нет изображения"
     card_image_preview.short_description = 'Превью карточки'
@@ -235,7 +246,7 @@ class CatalogItemAdmin(admin.ModelAdmin):
         if obj and obj.image:
             return format_html(
                 '<img src="{}" style="max-width: 200px; max-height: 200px; object-fit: contain;" />',
-                obj.image.url
+                thumbnail_url(obj.image.name, 200, 200)
             )
         return "Нет изображения"
     page_image_preview.short_description = 'Превью страницы'
@@ -262,14 +273,15 @@ class GalleryImageAdmin(admin.ModelAdmin):
     list_display = ['page', 'content_type', 'order', 'is_active', 'content_preview', 'created_at']
     list_editable = ['order', 'is_active']
     list_filter = ['page', 'content_type', 'is_active', 'created_at']
-    readonly_fields = ['content_preview']
+    readonly_fields = ['content_preview', 'image_status']
+    actions = [requeue_image_optimization]
     
     fieldsets = (
         ('Основная информация', {
             'fields': ('page', 'content_type', 'description')
         }),
         ('Изображение', {
-            'fields': ('image', 'content_preview'),
+            'fields': ('image', 'content_preview', 'image_status'),
             'description': 'Загрузите изображение, если тип контента - "Изображение"'
         }),
         ('Видео', {
@@ -285,7 +297,7 @@ class GalleryImageAdmin(admin.ModelAdmin):
         if obj and obj.content_type == 'image' and obj.image:
             return format_html(
                 '<img src="{}" style="max-width: 200px; max-height: 200px; object-fit: contain;" />',
-                obj.image.url
+                thumbnail_url(obj.image.name, 200, 200)
             )
         elif obj and obj.content_type == 'video':
             if obj.video_file:
@@ -403,7 +415,7 @@ class MenuItemAdmin(admin.ModelAdmin):
             'description': 'Выберите тип пункта меню. "Селектор филиала" отобразит выбор филиала в меню.'
         }),
         ('Контент (для типа "Обычная ссылка")', {
-            'fields': ('title', 'image', 'image_preview', 'content_page', 'url'),
+            'fields': ('title', 'image', 'image_preview', 'image_status', 'content_page', 'url'),
             'description': 'Укажите либо текст (title), либо загрузите изображение. Выберите страницу контента или укажите URL вручную. Эти поля используются только для типа "Обычная ссылка".'
         }),
         ('Настройки', {
@@ -411,7 +423,8 @@ class MenuItemAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ['image_preview']
+    readonly_fields = ['image_preview', 'image_status']
+    actions = [requeue_image_optimization]
     
     def display_name(self, obj):
         """Отображает название или информацию об изображении"""
@@ -427,7 +440,7 @@ class MenuItemAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 100px; max-width: 200px; object-fit: contain;" />',
-                obj.image.url
+                thumbnail_url(obj.image.name, 200, 100)
             )
         return 'Нет изображения'
     image_preview.short_description = 'Превью изображения'
@@ -438,7 +451,7 @@ class HeaderSettingsAdmin(admin.ModelAdmin):
     list_display = ['logo_text', 'logo_height', 'header_height', 'show_menu', 'menu', 'show_phone']
     fieldsets = (
         ('Логотип', {
-            'fields': ('logo_text', 'logo_image', 'logo_url', 'logo_preview')
+            'fields': ('logo_text', 'logo_image', 'logo_url', 'logo_preview', 'image_status')
         }),
         ('Размеры', {
             'fields': ('logo_height', 'logo_width', 'logo_mobile_scale', 'header_height'),
@@ -452,13 +465,15 @@ class HeaderSettingsAdmin(admin.ModelAdmin):
             'fields': ('show_phone', 'phone_text')
         }),
     )
-    readonly_fields = ['logo_preview']
+    readonly_fields = ['logo_preview', 'image_status']
     
     def logo_preview(self, obj):
         if obj and obj.logo_image:
-            return f'<img src="{obj.logo_image.url}" style="max-width: 200px; max-height: 100px;" />'
+            return format_html(
+                '<img src="{}" style="max-width: 200px; max-height: 100px;" />',
+                thumbnail_url(obj.logo_image.name, 200, 100)
+            )
         return "Нет изображения (будет использован текст)"
-    logo_preview.allow_tags = True
     logo_preview.short_description = 'Превью логотипа'
     
     def has_add_permission(self, request):
@@ -481,7 +496,7 @@ class HeroSettingsAdmin(admin.ModelAdmin):
             'description': 'Настройте действие кнопки: ссылка, открытие анкеты или формы записи. Если выбран тип "Ссылка", укажите URL. Если "Анкета" - выберите её. Если "Прямая запись" - выберите форму.'
         }),
         ('Внешний вид', {
-            'fields': ('background_image', 'image_preview', 'background_color')
+            'fields': ('background_image', 'image_preview', 'image_status', 'background_color')
         }),
         ('Настройки изображения', {
             'fields': ('image_position', 'image_vertical_align', 'image_size', 'image_scale', 'show_overlay', 'overlay_opacity'),
@@ -499,7 +514,7 @@ class HeroSettingsAdmin(admin.ModelAdmin):
             'fields': ('is_active',)
         }),
     )
-    readonly_fields = ['image_preview']
+    readonly_fields = ['image_preview', 'image_status']
     
     class Media:
         css = {
@@ -537,7 +552,7 @@ class HeroSettingsAdmin(admin.ModelAdmin):
         if obj and obj.background_image:
             return format_html(
                 '<img src="{}" style="max-width: 300px; max-height: 200px; object-fit: contain;" />',
-                obj.background_image.url
+                thumbnail_url(obj.background_image.name, 300, 200)
             )
         return "Нет изображения"
     image_preview.short_description = 'Превью фонового изображения'
@@ -570,7 +585,7 @@ class SocialNetworkAdmin(admin.ModelAdmin):
         if obj and obj.icon:
             return format_html(
                 '<img src="{}" style="max-width: 50px; max-height: 50px; object-fit: contain;" />',
-                obj.icon.url
+                thumbnail_url(obj.icon.name, 50, 50)
             )
         return "Нет иконки (будет использована стандартная)"
     icon_preview.short_description = 'Превью иконки'
@@ -701,7 +716,7 @@ class ServiceAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'has_own_page', 'created_at']
     search_fields = ['title', 'description', 'slug']
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['image_status', 'created_at', 'updated_at']
     inlines = [ServiceBranchInline]
     
     fieldsets = (
@@ -714,7 +729,7 @@ class ServiceAdmin(admin.ModelAdmin):
             'description': 'Базовые цены услуги. Если для филиала не указана индивидуальная цена, будет использована базовая. Выберите расположение блока с ценой относительно описания. Включите "Цена От" или "Цена по абонементу От", чтобы перед ценой отображалось "От" (например, "От 1000 ₽").'
         }),
         ('Изображение', {
-            'fields': ('image', 'image_align', 'image_size')
+            'fields': ('image', 'image_status', 'image_align', 'image_size')
         }),
         ('Настройки страницы', {
             'fields': ('has_own_page', 'show_booking_button', 'booking_form')
@@ -728,7 +743,7 @@ class ServiceAdmin(admin.ModelAdmin):
         }),
     )
     
-    actions = ['add_to_all_branches', 'remove_from_all_branches']
+    actions = ['add_to_all_branches', 'remove_from_all_branches', requeue_image_optimization]
     
     def save_formset(self, request, form, formset, change):
         """Переопределяем для передачи пользователя при сохранении inline"""
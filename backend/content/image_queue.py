@@ -0,0 +1,133 @@
+"""
+Фоновая оптимизация изображений
+
+Сохранение модели с новым изображением только помечает его статусом 'pending'
+(OptimizedImageModel.image_status) и после коммита запускает обработку в фоне.
+Сам статус и есть очередь: обработчик выбирает объекты со статусом 'pending',
+оптимизирует файл и одним UPDATE подменяет путь к файлу и статус. Если за это
+время изображение заменили, результат отбрасывается - новое изображение стоит
+в очереди само.
+
+То, что не успело обработаться (например, при перезапуске сервера), разбирает
+команда process_image_queue (в продакшене - сервис temis-image-queue, см. deploy/README.md).
+"""
+import logging
+import threading
+from typing import Dict
+from django.apps import apps
+from django.db import connection
+from .models import OptimizedImageModel
+from .utils.image_processing import image_fingerprint, process_uploaded_image
+
+logger = logging.getLogger(__name__)
+
+# Не запускаем больше одного обработчика очереди в процессе
+_processing_lock = threading.Lock()
+
+
+def get_image_models():
+    """Модели, изображения которых оптимизируются в фоне"""
+    return [
+        model for model in apps.get_app_config('content').get_models()
+        if issubclass(model, OptimizedImageModel)
+    ]
+
+
+def optimize_instance_image(instance) -> bool:
+    """
+    Оптимизирует изображение объекта и сохраняет результат без вызова save()
+    
+    Returns:
+        True, если изображение оптимизировано
+    """
+    model = type(instance)
+    field_name = instance.IMAGE_FIELD
+    image = getattr(instance, field_name)
+    source_name = image.name
+    
+    if not image or instance.image_is_optimized():
+        # Нечего обрабатывать: изображения нет или файл уже обработан текущим профилем
+        model.objects.filter(pk=instance.pk, image_status='pending').update(image_status='ready')
+        return True
+    
+    # Отпечаток не совпал: файл новый или обработан по старым настройкам профиля -
+    # перекодируем, даже если он уже результат конвейера
+    optimized = process_uploaded_image(image, image_type=instance.IMAGE_TYPE, reencode=True)
+    # process_uploaded_image привязывает к объекту новый путь
+    new_name = getattr(instance, field_name).name
+    
+    update = {'image_status': 'ready' if optimized else 'error'}
+    if optimized:
+        update[field_name] = new_name
+        update['image_fingerprint'] = image_fingerprint(new_name, instance.IMAGE_TYPE)
+    # Условие на исходный путь: если изображение успели заменить, не затираем новое
+    model.objects.filter(pk=instance.pk, **{field_name: source_name}).update(**update)
+    return optimized
+
+
+def process_pending_images(batch_size: int = 20) -> Dict[str, int]:
+    """
+    Оптимизирует пачку изображений, ожидающих обработки
+    
+    Returns:
+        Словарь со счетчиками processed, errors
+    """
+    results = {'processed': 0, 'errors': 0}
+    
+    for model in get_image_models():
+        for instance in model.objects.filter(image_status='pending').order_by('pk')[:batch_size]:
+            try:
+                optimized = optimize_instance_image(instance)
+            except Exception as e:
+                logger.error(f'Ошибка оптимизации изображения {model.__name__} {instance.pk}: {str(e)}', exc_info=True)
+                model.objects.filter(pk=instance.pk).update(image_status='error')
+                optimized = False
+            results['processed' if optimized else 'errors'] += 1
+    
+    return results
+
+
+def drain_queue(batch_size: int = 20) -> Dict[str, int]:
+    """Обрабатывает очередь, пока в ней есть изображения со статусом 'pending'"""
+    totals = {'processed': 0, 'errors': 0}
+    while True:
+        results = process_pending_images(batch_size)
+        for key, value in results.items():
+            totals[key] += value
+        if not any(results.values()):
+            return totals
+
+
+def has_pending_images() -> bool:
+    """Есть ли изображения, ожидающие обработки"""
+    return any(model.objects.filter(image_status='pending').exists() for model in get_image_models())
+
+
+def process_pending_images_async():
+    """Запускает оптимизацию изображений в фоновом потоке, если она еще не запущена"""
+    def worker():
+        try:
+            while _processing_lock.acquire(blocking=False):
+                try:
+                    drain_queue()
+                finally:
+                    _processing_lock.release()
+                # Изображение могло встать в очередь после последней проверки очереди, но до
+                # освобождения блокировки: запущенный для него поток уже вышел, разбираем сами
+                if not has_pending_images():
+                    break
+        except Exception as e:
+            logger.error(f'Ошибка фоновой оптимизации изображений: {str(e)}', exc_info=True)
+        finally:
+            connection.close()
+    
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+
+
+def requeue_images(queryset) -> int:
+    """Поставить изображения объектов в очередь повторно (например, после ошибки)"""
+    updated = queryset.update(image_status='pending')
+    if updated:
+        process_pending_images_async()
+    return updated
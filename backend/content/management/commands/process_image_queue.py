@@ -0,0 +1,60 @@
+"""
+Команда для фоновой оптимизации изображений
+
+Изображения обычно оптимизируются в фоне сразу после сохранения объекта. Команда
+разбирает то, что осталось в очереди (например, после перезапуска сервера), и
+может работать постоянно или из cron.
+
+Использование:
+    python manage.py process_image_queue
+    python manage.py process_image_queue --retry-errors
+    python manage.py process_image_queue --loop --interval 10
+"""
+import time
+from django.core.management.base import BaseCommand
+from content.image_queue import drain_queue, get_image_models
+
+
+class Command(BaseCommand):
+    help = 'Оптимизирует изображения, ожидающие обработки'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Количество объектов каждой модели в одной пачке (по умолчанию: 20)'
+        )
+        parser.add_argument(
+            '--retry-errors',
+            action='store_true',
+            help='Повторить обработку изображений, завершившуюся ошибкой'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проверяя очередь с интервалом --interval'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=10,
+            help='Интервал проверки очереди в секундах в режиме --loop (по умолчанию: 10)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['retry_errors']:
+            for model in get_image_models():
+                model.objects.filter(image_status='error').update(image_status='pending')
+        
+        while True:
+            results = drain_queue(options['batch_size'])
+            if any(results.values()):
+                self.stdout.write(
+                    f'Оптимизировано: {results["processed"]}, '
+                    f'ошибок: {results["errors"]}'
+                )
+            
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,264 @@
+"""
+Команда для переобработки медиатеки по текущим профилям изображений
+
+Нужна после изменения IMAGE_PROFILES или настроек адаптивных вариантов: обходит
+все ImageField моделей content, обрабатывает файлы параллельно в нескольких
+процессах и в конце одной пачкой обновляет ссылки на файлы в БД.
+
+Изображения моделей с фоновой оптимизацией, уже обработанные текущим профилем
+(совпадает image_fingerprint), пропускаются, остальные перекодируются. У прочих
+полей отпечатка нет, поэтому их файлы, уже обработанные конвейером, перекодируются
+только с --force (иначе для них досоздаются адаптивные варианты). Поля без профиля
+обработки (иконки, фавикон) не изменяются.
+
+Обработанные файлы записываются в файл контрольной точки, поэтому прерванный
+запуск можно продолжить той же командой: готовые файлы повторно не обрабатываются.
+
+Использование:
+    python manage.py reprocess_images --dry-run
+    python manage.py reprocess_images
+    python manage.py reprocess_images --workers 4 --force
+    python manage.py reprocess_images --model catalogitem
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections, models, transaction
+from content.models import OptimizedImageModel
+from content.utils.image_processing import image_fingerprint, reprocess_image_file, save_rendition_sets
+
+
+# Поля без фоновой оптимизации, которые тоже обрабатываются: (модель, поле) -> тип изображения
+EXTRA_IMAGE_FIELDS = {
+    ('catalogitem', 'card_image'): 'general',
+    ('contentpage', 'image'): 'general',
+    ('contentpage', 'faq_background_image'): 'hero',
+}
+
+DEFAULT_CHECKPOINT = 'reprocess_images.checkpoint'
+
+
+def get_image_type(model, field):
+    """Тип изображения для поля или None, если поле не обрабатывается"""
+    if issubclass(model, OptimizedImageModel) and field.name == model.IMAGE_FIELD:
+        return model.IMAGE_TYPE
+    return EXTRA_IMAGE_FIELDS.get((model._meta.model_name, field.name))
+
+
+def job_key(name, image_type):
+    """Ключ задачи: один и тот же файл с одним профилем обрабатывается один раз"""
+    return f'{image_type}:{name}'
+
+
+def init_worker():
+    """Инициализация Django в дочернем процессе (нужна, если процессы не форкаются)"""
+    import django
+    django.setup()
+
+
+def run_job(name, image_type, upload_to, reencode):
+    """Обработать один файл в дочернем процессе"""
+    try:
+        return reprocess_image_file(name, image_type, upload_to, reencode=reencode)
+    except Exception as e:
+        return {'error': str(e)}
+
+
+class Command(BaseCommand):
+    help = 'Переобрабатывает изображения моделей content по текущим профилям'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Количество процессов обработки (по умолчанию: число ядер CPU)'
+        )
+        parser.add_argument(
+            '--model',
+            action='append',
+            default=[],
+            help='Обработать только указанную модель (можно указать несколько раз)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перекодировать все изображения, в том числе уже обработанные текущим профилем'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет обработано'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=DEFAULT_CHECKPOINT,
+            help=f'Файл контрольной точки для продолжения прерванного запуска (по умолчанию: {DEFAULT_CHECKPOINT})'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать заново, не учитывая контрольную точку'
+        )
+    
+    def handle(self, *args, **options):
+        references, jobs = self.collect_jobs(options['model'], options['force'])
+        
+        checkpoint = options['checkpoint']
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        results = self.load_checkpoint(checkpoint)
+        pending = {key: job for key, job in jobs.items() if key not in results}
+        
+        self.stdout.write(
+            f'Файлов к обработке: {len(jobs)} (ссылок в БД: {sum(len(rows) for rows in references.values())}), '
+            f'уже обработано по контрольной точке: {len(jobs) - len(pending)}'
+        )
+        if options['dry_run']:
+            for key, (name, image_type, upload_to, reencode) in pending.items():
+                action = 'перекодировать' if reencode else 'перекодировать при несоответствии профилю'
+                self.stdout.write(f'  {name} ({image_type}, {action}) -> {upload_to}')
+            return
+        
+        if pending:
+            self.process_jobs(pending, results, checkpoint, max(1, options['workers']))
+        
+        updated, errors = self.apply_results(references, jobs, results)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено ссылок в БД: {updated}, ошибок обработки: {errors}'))
+        
+        if not errors and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+    
+    def collect_jobs(self, model_names, force):
+        """
+        Собрать ссылки на изображения и задачи обработки
+        
+        Returns:
+            tuple: ({(модель, поле): [(pk, путь, тип изображения)]},
+                    {ключ задачи: (путь, тип изображения, upload_to, перекодировать)})
+        """
+        references = {}
+        jobs = {}
+        model_names = {name.lower() for name in model_names}
+        
+        for model in apps.get_app_config('content').get_models():
+            if model_names and model._meta.model_name not in model_names:
+                continue
+            for field in model._meta.get_fields():
+                if not isinstance(field, models.ImageField):
+                    continue
+                image_type = get_image_type(model, field)
+                if image_type is None:
+                    self.stdout.write(f'Пропущено поле без профиля: {model.__name__}.{field.name}')
+                    continue
+                
+                queryset = model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                with_fingerprint = issubclass(model, OptimizedImageModel) and field.name == model.IMAGE_FIELD
+                values = ['pk', field.name] + (['image_fingerprint'] if with_fingerprint else [])
+                
+                rows = []
+                for row in queryset.values_list(*values).iterator():
+                    pk, name = row[0], row[1]
+                    if with_fingerprint and not force and row[2] == image_fingerprint(name, image_type):
+                        continue
+                    rows.append((pk, name, image_type))
+                    upload_to = field.upload_to if isinstance(field.upload_to, str) else os.path.dirname(name)
+                    # Отпечаток не совпал - файл обработан по старым настройкам профиля
+                    reencode = force or with_fingerprint
+                    key = job_key(name, image_type)
+                    if key in jobs:
+                        # Файл общий для нескольких полей: перекодируем, если это нужно хотя бы одному
+                        reencode = reencode or jobs[key][3]
+                        upload_to = jobs[key][2]
+                    jobs[key] = (name, image_type, upload_to, reencode)
+                if rows:
+                    references[(model, field)] = rows
+        
+        return references, jobs
+    
+    def load_checkpoint(self, checkpoint):
+        """Результаты, записанные в контрольную точку прошлым запуском"""
+        results = {}
+        if not os.path.exists(checkpoint):
+            return results
+        with open(checkpoint, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Строка, недописанная при прерывании
+                    continue
+                if 'error' not in entry['result']:
+                    results[entry['key']] = entry['result']
+        return results
+    
+    def process_jobs(self, pending, results, checkpoint, workers):
+        """Обработать файлы в пуле процессов, записывая каждый результат в контрольную точку"""
+        # Дочерние процессы не должны наследовать открытые соединения с БД
+        connections.close_all()
+        
+        total = len(pending)
+        done = 0
+        with open(checkpoint, 'a', encoding='utf-8') as checkpoint_file, \
+                ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            futures = {
+                executor.submit(run_job, name, image_type, upload_to, reencode): key
+                for key, (name, image_type, upload_to, reencode) in pending.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                result = future.result()
+                results[key] = result
+                checkpoint_file.write(json.dumps({'key': key, 'result': result}, ensure_ascii=False) + '\n')
+                checkpoint_file.flush()
+                
+                done += 1
+                if 'error' in result:
+                    self.stderr.write(f'Ошибка обработки {pending[key][0]}: {result["error"]}')
+                if done % 50 == 0 or done == total:
+                    self.stdout.write(f'Обработано файлов: {done}/{total}')
+    
+    def apply_results(self, references, jobs, results):
+        """
+        Обновить ссылки на файлы и списки адаптивных вариантов в БД пачками
+        
+        Объект обновляется, только если его изображение не заменили за время обработки.
+        
+        Returns:
+            tuple: (обновлено ссылок, ошибок обработки)
+        """
+        errors = sum(1 for key in jobs if 'error' in results.get(key, {'error': ''}))
+        rendition_sets = {
+            result['name']: result['renditions']
+            for result in results.values() if 'error' not in result
+        }
+        
+        updated = 0
+        with transaction.atomic():
+            save_rendition_sets(rendition_sets)
+            
+            for (model, field), rows in references.items():
+                with_fingerprint = issubclass(model, OptimizedImageModel) and field.name == model.IMAGE_FIELD
+                current = dict(
+                    model.objects.filter(pk__in=[pk for pk, _, _ in rows]).values_list('pk', field.name)
+                )
+                
+                objects = []
+                for pk, name, image_type in rows:
+                    result = results.get(job_key(name, image_type))
+                    if not result or 'error' in result or current.get(pk) != name:
+                        continue
+                    obj = model(pk=pk)
+                    setattr(obj, field.attname, result['name'])
+                    if with_fingerprint:
+                        obj.image_fingerprint = image_fingerprint(result['name'], image_type)
+                        obj.image_status = 'ready'
+                    objects.append(obj)
+                
+                update_fields = [field.name] + (['image_fingerprint', 'image_status'] if with_fingerprint else [])
+                model.objects.bulk_update(objects, update_fields, batch_size=500)
+                updated += len(objects)
+        
+        return updated, errors
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0066_make_services_card_sizes_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogitem',
+            name='telegram_checked_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Когда последний раз проверялось, что пост не удален из канала', null=True, verbose_name='Пост проверен в Telegram'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0067_add_catalogitem_telegram_checked_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRenditionSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Путь оптимизированного изображения в хранилище', max_length=255, unique=True, verbose_name='Исходный файл')),
+                ('width', models.PositiveIntegerField(default=0, verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(default=0, verbose_name='Высота')),
+                ('renditions', models.JSONField(blank=True, default=list, help_text='Список вариантов: путь, формат, ширина, высота', verbose_name='Варианты')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлен')),
+            ],
+            options={
+                'verbose_name': 'Варианты изображения',
+                'verbose_name_plural': 'Варианты изображений',
+            },
+        ),
+    ]
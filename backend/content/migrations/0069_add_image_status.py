@@ -0,0 +1,73 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0068_add_imagerenditionset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='catalogitem',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='headersettings',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='herosettings',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='specialist',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+        migrations.AddField(
+            model_name='welcomebannercard',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Оптимизировано'), ('pending', 'Ожидает оптимизации'), ('error', 'Ошибка оптимизации')], default='ready', editable=False, max_length=20, verbose_name='Оптимизация изображения'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0069_add_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='catalogitem',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='headersettings',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='herosettings',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='specialist',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+        migrations.AddField(
+            model_name='welcomebannercard',
+            name='image_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Хеш оптимизированного файла и подпись профиля обработки', max_length=64, verbose_name='Отпечаток изображения'),
+        ),
+    ]
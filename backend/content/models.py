@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 from django.db.models.signals import pre_save
@@ -6,7 +6,7 @@ from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from ckeditor.fields import RichTextField
-from .utils.image_processing import process_uploaded_image
+from .utils.image_processing import image_fingerprint
 import re
 
 User = get_user_model()
@@ -28,7 +28,118 @@ def transliterate_slug(text):
     return slug.strip('-')[:50]
 
 
-class Branch(models.Model):
+# Сколько символов slug резервируется под суффикс "-N" (N до 99999)
+SLUG_SUFFIX_RESERVE = 6
+
+
+def unique_slug(model, base, separator='-', instance=None):
+    """
+    Свободный slug для модели: base или base{separator}N с наименьшим свободным N
+    
+    Все занятые варианты выбираются одним запросом по префиксу. Длина
+    результата не превышает max_length поля slug (база при необходимости обрезается).
+    
+    Args:
+        model: Класс модели с уникальным полем slug
+        base: Желаемый slug
+        separator: Разделитель перед номером
+        instance: Сохраняемый объект (его собственный slug не считается занятым)
+    """
+    if not base:
+        return base
+    max_length = model._meta.get_field('slug').max_length
+    base = base[:max_length]
+    stem = base[:max_length - SLUG_SUFFIX_RESERVE]
+    
+    taken = model.objects.filter(slug__startswith=stem)
+    if instance is not None and instance.pk:
+        taken = taken.exclude(pk=instance.pk)
+    taken = set(taken.values_list('slug', flat=True))
+    
+    if base not in taken:
+        return base
+    counter = 1
+    while True:
+        suffix = f'{separator}{counter}'
+        slug = f"{base[:max_length - len(suffix)].rstrip('-_')}{suffix}"
+        if slug not in taken:
+            return slug
+        counter += 1
+
+
+IMAGE_STATUS_CHOICES = [
+    ('ready', 'Оптимизировано'),
+    ('pending', 'Ожидает оптимизации'),
+    ('error', 'Ошибка оптимизации'),
+]
+
+
+class OptimizedImageModel(models.Model):
+    """
+    Модель с изображением, которое оптимизируется в фоне
+    
+    Сохранение нового файла не ждет Pillow: модель сохраняется один раз со
+    статусом 'pending', а после коммита транзакции запускается фоновая
+    оптимизация (content.image_queue). Пока она не закончилась, отдается
+    исходный файл.
+    """
+    # Поле с изображением и профиль обработки (см. IMAGE_PROFILES)
+    IMAGE_FIELD = 'image'
+    IMAGE_TYPE = 'general'
+    
+    image_status = models.CharField('Оптимизация изображения', max_length=20, choices=IMAGE_STATUS_CHOICES,
+                                    default='ready', editable=False)
+    image_fingerprint = models.CharField('Отпечаток изображения', max_length=64, blank=True, editable=False,
+                                         help_text='Хеш оптимизированного файла и подпись профиля обработки')
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Путь изображения из БД - чтобы при сохранении понять, заменено ли оно
+        if cls.IMAGE_FIELD in field_names:
+            instance._loaded_image_name = values[field_names.index(cls.IMAGE_FIELD)]
+        return instance
+    
+    def image_changed(self):
+        """Заменено ли изображение с момента загрузки объекта из БД"""
+        if self.IMAGE_FIELD in self.get_deferred_fields():
+            return False
+        image = getattr(self, self.IMAGE_FIELD)
+        if not image:
+            return False
+        # Новый файл (загрузка через форму) еще не записан в хранилище
+        if not image._committed:
+            return True
+        # Файл записан без формы (FieldFile.save, копирование пути) - сравниваем пути
+        if image.name == getattr(self, '_loaded_image_name', None):
+            return False
+        # Уже оптимизированный текущим профилем файл (например, из Telegram) не обрабатываем
+        return not self.image_is_optimized()
+    
+    def image_is_optimized(self):
+        """Совпадает ли отпечаток с текущим файлом и профилем обработки (без чтения файла)"""
+        image = getattr(self, self.IMAGE_FIELD)
+        return bool(image) and self.image_fingerprint == image_fingerprint(image.name, self.IMAGE_TYPE)
+    
+    def save(self, *args, **kwargs):
+        image_changed = self.image_changed()
+        if image_changed:
+            self.image_status = 'pending'
+            self.image_fingerprint = ''
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'image_status', 'image_fingerprint'}
+        super().save(*args, **kwargs)
+        if image_changed:
+            self._loaded_image_name = getattr(self, self.IMAGE_FIELD).name
+            from .image_queue import process_pending_images_async
+            transaction.on_commit(process_pending_images_async)
+
+
+class Branch(OptimizedImageModel):
     """Филиалы центра"""
     name = models.CharField('Название', max_length=200)
     address = models.CharField('Адрес', max_length=300)
@@ -52,21 +163,9 @@ class Branch(models.Model):
 
     def __str__(self):
         return self.name
-    
-    def save(self, *args, **kwargs):
-        # Сохраняем сначала, чтобы получить путь к файлу
-        super().save(*args, **kwargs)
-        # Обрабатываем изображение после сохранения
-        if self.image and hasattr(self.image, 'file'):
-            try:
-                process_uploaded_image(self.image, image_type='general')
-                # Сохраняем еще раз после обработки
-                super().save(update_fields=['image'])
-            except Exception as e:
-                print(f"Ошибка обработки изображения для Branch {self.name}: {e}")
 
 
-class Service(models.Model):
+class Service(OptimizedImageModel):
     """Услуги центра"""
     title = models.CharField('Название', max_length=200)
     slug = models.SlugField('URL', unique=True, blank=True)
@@ -152,21 +251,16 @@ class Service(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug and self.has_own_page:
-            self.slug = transliterate_slug(self.title) or f'service-{self.id or 0}'
+            self.slug = unique_slug(Service, transliterate_slug(self.title) or f'service-{self.id or 0}', instance=self)
         
-        # Сохраняем сначала
         super().save(*args, **kwargs)
-        # Обрабатываем изображение после сохранения
-        if self.image and hasattr(self.image, 'file'):
-            try:
-                process_uploaded_image(self.image, image_type='general')
-                super().save(update_fields=['image'])
-            except Exception as e:
-                print(f"Ошибка обработки изображения для Service {self.title}: {e}")
 
 
-class Specialist(models.Model):
+class Specialist(OptimizedImageModel):
     """Специалисты"""
+    IMAGE_FIELD = 'photo'
+    IMAGE_TYPE = 'avatar'
+    
     name = models.CharField('Имя', max_length=200)
     position = models.CharField('Должность', max_length=200)
     bio = models.TextField('Биография', blank=True)
@@ -186,17 +280,6 @@ class Specialist(models.Model):
 
     def __str__(self):
         return self.name
-    
-    def save(self, *args, **kwargs):
-        # Сохраняем сначала
-        super().save(*args, **kwargs)
-        # Обрабатываем фото после сохранения
-        if self.photo and hasattr(self.photo, 'file'):
-            try:
-                process_uploaded_image(self.photo, image_type='avatar')
-                super().save(update_fields=['photo'])
-            except Exception as e:
-                print(f"Ошибка обработки фото для Specialist {self.name}: {e}")
 
 
 class ServiceBranch(models.Model):
@@ -299,8 +382,11 @@ class ServiceBranchPriceHistory(models.Model):
         return f'{self.service_branch} - {self.changed_at.strftime("%d.%m.%Y %H:%M")}'
 
 
-class Review(models.Model):
+class Review(OptimizedImageModel):
     """Отзывы"""
+    IMAGE_FIELD = 'author_photo'
+    IMAGE_TYPE = 'avatar'
+    
     author_name = models.CharField('Имя автора', max_length=200)
     author_photo = models.ImageField('Фото автора', upload_to='reviews/', blank=True, null=True)
     text = models.TextField('Текст отзыва')
@@ -319,20 +405,9 @@ class Review(models.Model):
 
     def __str__(self):
         return f'{self.author_name} - {self.rating}⭐'
-    
-    def save(self, *args, **kwargs):
-        # Сохраняем сначала
-        super().save(*args, **kwargs)
-        # Обрабатываем фото автора после сохранения
-        if self.author_photo and hasattr(self.author_photo, 'file'):
-            try:
-                process_uploaded_image(self.author_photo, image_type='avatar')
-                super().save(update_fields=['author_photo'])
-            except Exception as e:
-                print(f"Ошибка обработки фото для Review {self.author_name}: {e}")
 
 
-class Promotion(models.Model):
+class Promotion(OptimizedImageModel):
     """Акции"""
     title = models.CharField('Название', max_length=200)
     slug = models.SlugField('URL', unique=True, blank=True)
@@ -356,20 +431,12 @@ class Promotion(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = transliterate_slug(self.title) or f'promotion-{self.id or 0}'
+            self.slug = unique_slug(Promotion, transliterate_slug(self.title) or f'promotion-{self.id or 0}', instance=self)
         
-        # Сохраняем сначала
         super().save(*args, **kwargs)
-        # Обрабатываем изображение после сохранения
-        if self.image and hasattr(self.image, 'file'):
-            try:
-                process_uploaded_image(self.image, image_type='general')
-                super().save(update_fields=['image'])
-            except Exception as e:
-                print(f"Ошибка обработки изображения для Promotion {self.title}: {e}")
 
 
-class Article(models.Model):
+class Article(OptimizedImageModel):
     """Статьи"""
     title = models.CharField('Название', max_length=200)
     slug = models.SlugField('URL', unique=True, blank=True)
@@ -392,17 +459,9 @@ class Article(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = transliterate_slug(self.title) or f'article-{self.id or 0}'
+            self.slug = unique_slug(Article, transliterate_slug(self.title) or f'article-{self.id or 0}', instance=self)
         
-        # Сохраняем сначала
         super().save(*args, **kwargs)
-        # Обрабатываем изображение после сохранения
-        if self.image and hasattr(self.image, 'file'):
-            try:
-                process_uploaded_image(self.image, image_type='general')
-                super().save(update_fields=['image'])
-            except Exception as e:
-                print(f"Ошибка обработки изображения для Article {self.title}: {e}")
 
 
 class Contact(models.Model):
@@ -567,14 +626,14 @@ class ContentPage(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = transliterate_slug(self.title)
+            self.slug = unique_slug(ContentPage, transliterate_slug(self.title), instance=self)
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return f'/{self.slug}/'
 
 
-class CatalogItem(models.Model):
+class CatalogItem(OptimizedImageModel):
     """Элемент каталога"""
     BUTTON_TYPES = [
         ('booking', 'Запись'),
@@ -683,6 +742,8 @@ class CatalogItem(models.Model):
     # Связь с Telegram постом
     telegram_message_id = models.BigIntegerField('ID сообщения Telegram', null=True, blank=True, unique=True,
                                                 help_text='ID сообщения из Telegram канала для связи с постом и обновления при редактировании')
+    telegram_checked_at = models.DateTimeField('Пост проверен в Telegram', null=True, blank=True, db_index=True,
+                                               help_text='Когда последний раз проверялось, что пост не удален из канала')
     
     # Настройки кнопки
     button_type = models.CharField('Тип кнопки', max_length=20, choices=BUTTON_TYPES, default='none')
@@ -751,17 +812,11 @@ class CatalogItem(models.Model):
                     self.button_booking_form = self.service.booking_form
         
         if not self.slug and self.has_own_page:
-            self.slug = transliterate_slug(self.title) or f'catalog-item-{self.id or 0}'
+            self.slug = unique_slug(CatalogItem, transliterate_slug(self.title) or f'catalog-item-{self.id or 0}', instance=self)
         super().save(*args, **kwargs)
-        if self.image and hasattr(self.image, 'file'):
-            try:
-                process_uploaded_image(self.image, image_type='general')
-                super().save(update_fields=['image'])
-            except Exception as e:
-                print(f"Ошибка обработки изображения для CatalogItem {self.id}: {e}")
 
 
-class GalleryImage(models.Model):
+class GalleryImage(OptimizedImageModel):
     """Изображение или видео в галерее"""
     CONTENT_TYPE_CHOICES = [
         ('image', 'Изображение'),
@@ -791,15 +846,6 @@ class GalleryImage(models.Model):
     def __str__(self):
         content_type_display = self.get_content_type_display()
         return f'{content_type_display} #{self.id} - {self.page.title}'
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.image and hasattr(self.image, 'file'):
-            try:
-                process_uploaded_image(self.image, image_type='general')
-                super().save(update_fields=['image'])
-            except Exception as e:
-                print(f"Ошибка обработки изображения для GalleryImage {self.id}: {e}")
 
 
 class FAQItem(models.Model):
@@ -870,7 +916,7 @@ class WelcomeBanner(models.Model):
         return True
 
 
-class WelcomeBannerCard(models.Model):
+class WelcomeBannerCard(OptimizedImageModel):
     BUTTON_TYPES = [
         ('none', 'Без кнопки'),
         ('link', 'Ссылка'),
@@ -900,15 +946,6 @@ class WelcomeBannerCard(models.Model):
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.image and hasattr(self.image, 'file'):
-            try:
-                process_uploaded_image(self.image, image_type='general')
-                super().save(update_fields=['image'])
-            except Exception as e:
-                print(f"Ошибка обработки изображения для WelcomeBannerCard {self.id}: {e}")
-
 
 class HomePageBlock(models.Model):
     """Блок на главной странице - ссылка на другую страницу контента"""
@@ -992,8 +1029,10 @@ class Menu(models.Model):
         return self.name
 
 
-class MenuItem(models.Model):
+class MenuItem(OptimizedImageModel):
     """Пункт меню"""
+    IMAGE_TYPE = 'thumbnail'
+    
     ITEM_TYPE_CHOICES = [
         ('link', 'Обычная ссылка'),
         ('branch_selector', 'Селектор филиала'),
@@ -1036,20 +1075,13 @@ class MenuItem(models.Model):
         if self.parent:
             return f'{self.parent.title or "Изображение"} → {display_name}'
         return display_name
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Обрабатываем изображение после сохранения
-        if self.image and hasattr(self.image, 'file'):
-            try:
-                process_uploaded_image(self.image, image_type='thumbnail')
-                super().save(update_fields=['image'])
-            except Exception as e:
-                print(f"Ошибка обработки изображения для MenuItem {self.id}: {e}")
 
 
-class HeaderSettings(models.Model):
+class HeaderSettings(OptimizedImageModel):
     """Настройки шапки"""
+    IMAGE_FIELD = 'logo_image'
+    IMAGE_TYPE = 'thumbnail'
+    
     logo_text = models.CharField('Текст логотипа', max_length=100, default='Temis')
     logo_image = models.ImageField('Изображение логотипа', upload_to='logo/', blank=True, null=True, 
                                     help_text='Если загружено, будет использоваться вместо текста')
@@ -1085,19 +1117,14 @@ class HeaderSettings(models.Model):
         # Разрешаем только одну запись
         self.pk = 1
         
-        # Сохраняем сначала
         super().save(*args, **kwargs)
-        # Обрабатываем логотип после сохранения
-        if self.logo_image and hasattr(self.logo_image, 'file'):
-            try:
-                process_uploaded_image(self.logo_image, image_type='thumbnail')
-                super().save(update_fields=['logo_image'])
-            except Exception as e:
-                print(f"Ошибка обработки логотипа для Header: {e}")
 
 
-class HeroSettings(models.Model):
+class HeroSettings(OptimizedImageModel):
     """Настройки Hero секции (шапка главной страницы)"""
+    IMAGE_FIELD = 'background_image'
+    IMAGE_TYPE = 'hero'
+    
     title = models.CharField('Заголовок', max_length=300)
     subtitle = RichTextField('Подзаголовок', blank=True,
                             help_text='Подзаголовок с поддержкой форматирования текста')
@@ -1197,15 +1224,7 @@ class HeroSettings(models.Model):
         # Разрешаем только одну запись
         self.pk = 1
         
-        # Сохраняем сначала
         super().save(*args, **kwargs)
-        # Обрабатываем фоновое изображение после сохранения
-        if self.background_image and hasattr(self.background_image, 'file'):
-            try:
-                process_uploaded_image(self.background_image, image_type='hero')
-                super().save(update_fields=['background_image'])
-            except Exception as e:
-                print(f"Ошибка обработки фонового изображения для Hero: {e}")
 
 
 class SocialNetwork(models.Model):
@@ -1334,3 +1353,22 @@ class SiteSettings(models.Model):
         # Разрешаем только одну запись
         self.pk = 1
         super().save(*args, **kwargs)
+
+
+class ImageRenditionSet(models.Model):
+    """Адаптивные варианты изображения (несколько ширин и форматов) для srcset"""
+    source = models.CharField('Исходный файл', max_length=255, unique=True,
+                              help_text='Путь оптимизированного изображения в хранилище')
+    width = models.PositiveIntegerField('Ширина', default=0)
+    height = models.PositiveIntegerField('Высота', default=0)
+    renditions = models.JSONField('Варианты', default=list, blank=True,
+                                  help_text='Список вариантов: путь, формат, ширина, высота')
+    created_at = models.DateTimeField('Создан', auto_now_add=True)
+    updated_at = models.DateTimeField('Обновлен', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Варианты изображения'
+        verbose_name_plural = 'Варианты изображений'
+    
+    def __str__(self):
+        return self.source
@@ -1,3 +1,4 @@
+import os
 import re
 from rest_framework import serializers
 from django.conf import settings
@@ -8,6 +9,7 @@ from .models import (
     ContentPage, CatalogItem, GalleryImage, HomePageBlock, FAQItem,
     WelcomeBanner, WelcomeBannerCard, SocialNetwork
 )
+from .utils.image_processing import MIME_TYPES, get_rendition_set
 
 
 def get_image_url(image_field, request=None):
@@ -15,8 +17,11 @@ def get_image_url(image_field, request=None):
     if not image_field:
         return None
     
-    image_url = image_field.url
-    
+    return get_media_url(image_field.url, request)
+
+
+def get_media_url(image_url, request=None):
+    """Возвращает полный URL файла из media по URL хранилища, заменяя localhost на правильный домен"""
     # Исправляем дублирование путей (например, logo/logo/logo/... -> logo/logo/)
     # Это исправляет уже сохраненные в БД неправильные пути
     # Правильный путь: /media/logo/logo/filename.jpg (два logo)
@@ -113,17 +118,71 @@ def get_image_url(image_field, request=None):
     return image_url
 
 
+def get_image_renditions(image_field, request=None):
+    """
+    Адаптивные варианты изображения для srcset
+    
+    Returns:
+        dict: {
+            'width', 'height': размеры оптимизированного изображения,
+            'srcset': {MIME-тип: 'url 320w, url 640w, ...'},
+            'renditions': [{'url', 'type', 'width', 'height'}, ...]
+        }
+        или None, если вариантов нет (изображение еще не обработано)
+    """
+    if not image_field:
+        return None
+    
+    rendition_set = get_rendition_set(image_field.name)
+    if not rendition_set:
+        return None
+    
+    storage = image_field.storage
+    renditions = [
+        {
+            'url': get_media_url(storage.url(rendition['name']), request),
+            'type': rendition['type'],
+            'width': rendition['width'],
+            'height': rendition['height'],
+        }
+        for rendition in rendition_set['renditions']
+    ]
+    # Самый крупный вариант - сам оптимизированный файл
+    ext = os.path.splitext(image_field.name)[1].lstrip('.').lower()
+    renditions.append({
+        'url': get_image_url(image_field, request),
+        'type': MIME_TYPES.get(ext, f'image/{ext}'),
+        'width': rendition_set['width'],
+        'height': rendition_set['height'],
+    })
+    
+    srcset = {}
+    for rendition in renditions:
+        srcset.setdefault(rendition['type'], []).append(f'{rendition["url"]} {rendition["width"]}w')
+    
+    return {
+        'width': rendition_set['width'],
+        'height': rendition_set['height'],
+        'srcset': {mime_type: ', '.join(candidates) for mime_type, candidates in srcset.items()},
+        'renditions': renditions,
+    }
+
+
 class BranchSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     content_page = serializers.SerializerMethodField()
     
     class Meta:
         model = Branch
-        fields = ['id', 'name', 'address', 'metro', 'phone', 'image', 'content_page', 'order']
+        fields = ['id', 'name', 'address', 'metro', 'phone', 'image', 'image_srcset', 'content_page', 'order']
     
     def get_image(self, obj):
         return get_image_url(obj.image, self.context.get('request'))
     
+    def get_image_srcset(self, obj):
+        return get_image_renditions(obj.image, self.context.get('request'))
+    
     def get_content_page(self, obj):
         """Возвращает базовую информацию о странице контента филиала, если она есть"""
         if obj.content_page:
@@ -167,6 +226,7 @@ class ServiceSerializer(serializers.ModelSerializer):
     booking_form_on_page_id = serializers.IntegerField(source='booking_form_on_page.id', read_only=True, allow_null=True)
     booking_form_on_page_title = serializers.CharField(source='booking_form_on_page.title', read_only=True, allow_null=True)
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     url = serializers.SerializerMethodField()
     service_branches = serializers.SerializerMethodField()
     price_range = serializers.SerializerMethodField()
@@ -176,7 +236,7 @@ class ServiceSerializer(serializers.ModelSerializer):
         model = Service
         fields = ['id', 'title', 'slug', 'description', 'card_short_description', 'price', 
                  'price_is_from', 'price_with_abonement', 'price_with_abonement_is_from', 
-                 'image', 'image_align', 'image_size', 
+                 'image', 'image_srcset', 'image_align', 'image_size', 
                  'price_duration_position', 'has_own_page', 'url', 'order', 
                  'show_booking_button', 'booking_form_id', 'booking_form_title',
                  'show_booking_button_on_page', 'booking_button_text', 'booking_form_on_page_id', 'booking_form_on_page_title',
@@ -185,6 +245,9 @@ class ServiceSerializer(serializers.ModelSerializer):
     def get_image(self, obj):
         return get_image_url(obj.image, self.context.get('request'))
     
+    def get_image_srcset(self, obj):
+        return get_image_renditions(obj.image, self.context.get('request'))
+    
     def get_url(self, obj):
         """Возвращает URL страницы услуги, если она может быть открыта как страница"""
         return obj.get_absolute_url()
@@ -248,47 +311,63 @@ class ServiceSerializer(serializers.ModelSerializer):
 class SpecialistSerializer(serializers.ModelSerializer):
     branch_name = serializers.CharField(source='branch.name', read_only=True)
     photo = serializers.SerializerMethodField()
+    photo_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Specialist
-        fields = ['id', 'name', 'position', 'bio', 'photo', 'branch', 'branch_name', 'order']
+        fields = ['id', 'name', 'position', 'bio', 'photo', 'photo_srcset', 'branch', 'branch_name', 'order']
     
     def get_photo(self, obj):
         return get_image_url(obj.photo, self.context.get('request'))
+    
+    def get_photo_srcset(self, obj):
+        return get_image_renditions(obj.photo, self.context.get('request'))
 
 
 class ReviewSerializer(serializers.ModelSerializer):
     author_photo = serializers.SerializerMethodField()
+    author_photo_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Review
-        fields = ['id', 'author_name', 'author_photo', 'text', 'rating', 'order', 'created_at']
+        fields = ['id', 'author_name', 'author_photo', 'author_photo_srcset', 'text', 'rating', 'order', 'created_at']
     
     def get_author_photo(self, obj):
         return get_image_url(obj.author_photo, self.context.get('request'))
+    
+    def get_author_photo_srcset(self, obj):
+        return get_image_renditions(obj.author_photo, self.context.get('request'))
 
 
 class PromotionSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Promotion
-        fields = ['id', 'title', 'slug', 'description', 'image', 'start_date', 'end_date', 'order', 'created_at']
+        fields = ['id', 'title', 'slug', 'description', 'image', 'image_srcset', 'start_date', 'end_date', 'order', 'created_at']
     
     def get_image(self, obj):
         return get_image_url(obj.image, self.context.get('request'))
+    
+    def get_image_srcset(self, obj):
+        return get_image_renditions(obj.image, self.context.get('request'))
 
 
 class ArticleSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Article
-        fields = ['id', 'title', 'slug', 'content', 'short_description', 'image', 
+        fields = ['id', 'title', 'slug', 'content', 'short_description', 'image', 'image_srcset', 
                  'views_count', 'created_at', 'updated_at']
     
     def get_image(self, obj):
         return get_image_url(obj.image, self.context.get('request'))
+    
+    def get_image_srcset(self, obj):
+        return get_image_renditions(obj.image, self.context.get('request'))
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -300,11 +379,12 @@ class ContactSerializer(serializers.ModelSerializer):
 class MenuItemSerializer(serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     url = serializers.SerializerMethodField()
     
     class Meta:
         model = MenuItem
-        fields = ['id', 'item_type', 'title', 'image', 'url', 'content_page', 'parent', 'order', 'is_external', 'children']
+        fields = ['id', 'item_type', 'title', 'image', 'image_srcset', 'url', 'content_page', 'parent', 'order', 'is_external', 'children']
     
     def get_children(self, obj):
         children = obj.children.filter(is_active=True).order_by('order')
@@ -314,6 +394,10 @@ class MenuItemSerializer(serializers.ModelSerializer):
         """Возвращает полный URL изображения"""
         return get_image_url(obj.image, self.context.get('request'))
     
+    def get_image_srcset(self, obj):
+        """Возвращает адаптивные варианты изображения (srcset)"""
+        return get_image_renditions(obj.image, self.context.get('request'))
+    
     def get_url(self, obj):
         """Возвращает URL из content_page или из поля url"""
         if obj.content_page:
@@ -335,16 +419,20 @@ class MenuSerializer(serializers.ModelSerializer):
 
 class HeaderSettingsSerializer(serializers.ModelSerializer):
     logo_image = serializers.SerializerMethodField()
+    logo_image_srcset = serializers.SerializerMethodField()
     menu = serializers.SerializerMethodField()
     
     class Meta:
         model = HeaderSettings
-        fields = ['logo_text', 'logo_image', 'logo_url', 'logo_height', 'logo_width', 'logo_mobile_scale', 'header_height', 
+        fields = ['logo_text', 'logo_image', 'logo_image_srcset', 'logo_url', 'logo_height', 'logo_width', 'logo_mobile_scale', 'header_height', 
                  'show_menu', 'menu', 'show_phone', 'phone_text']
     
     def get_logo_image(self, obj):
         return get_image_url(obj.logo_image, self.context.get('request'))
     
+    def get_logo_image_srcset(self, obj):
+        return get_image_renditions(obj.logo_image, self.context.get('request'))
+    
     def get_menu(self, obj):
         """Возвращает меню, если оно выбрано, иначе возвращает меню по умолчанию"""
         if obj.menu:
@@ -367,13 +455,14 @@ class HeaderSettingsSerializer(serializers.ModelSerializer):
 
 class HeroSettingsSerializer(serializers.ModelSerializer):
     background_image = serializers.SerializerMethodField()
+    background_image_srcset = serializers.SerializerMethodField()
     button_quiz_slug = serializers.SerializerMethodField()
     button_booking_form_id = serializers.SerializerMethodField()
     
     class Meta:
         model = HeroSettings
         fields = ['title', 'subtitle', 'button_text', 'button_url', 'button_type', 'button_quiz_slug', 
-                  'button_booking_form_id', 'background_image', 'background_color',
+                  'button_booking_form_id', 'background_image', 'background_image_srcset', 'background_color',
                   'image_position', 'image_vertical_align', 'image_size', 'image_scale', 'show_overlay', 
                   'overlay_opacity', 'text_align', 'content_width', 'content_width_custom', 'height', 'is_active']
     
@@ -381,6 +470,10 @@ class HeroSettingsSerializer(serializers.ModelSerializer):
         """Возвращает полный URL фонового изображения"""
         return get_image_url(obj.background_image, self.context.get('request'))
     
+    def get_background_image_srcset(self, obj):
+        """Возвращает адаптивные варианты изображения (srcset)"""
+        return get_image_renditions(obj.background_image, self.context.get('request'))
+    
     def get_button_quiz_slug(self, obj):
         """Возвращает slug анкеты для кнопки, если она активна"""
         if obj.button_quiz and obj.button_quiz.is_active and obj.button_quiz.slug:
@@ -469,7 +562,9 @@ class SiteSettingsSerializer(serializers.ModelSerializer):
 
 class CatalogItemSerializer(serializers.ModelSerializer):
     card_image = serializers.SerializerMethodField()
+    card_image_srcset = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     button_booking_form_id = serializers.SerializerMethodField()
     button_quiz_slug = serializers.SerializerMethodField()
     url = serializers.SerializerMethodField()
@@ -481,7 +576,7 @@ class CatalogItemSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = CatalogItem
-        fields = ['id', 'title', 'card_description', 'description', 'card_image', 'image', 'image_align', 'image_size', 
+        fields = ['id', 'title', 'card_description', 'description', 'card_image', 'card_image_srcset', 'image', 'image_srcset', 'image_align', 'image_size', 
                  'image_position', 'image_target_width', 'image_target_height', 'has_own_page', 'slug', 'url', 'width',
                  'button_type', 'button_text', 'button_booking_form_id', 'button_quiz_slug', 
                  'button_url', 'video_url', 'video_width', 'video_height', 'gallery_page', 
@@ -511,10 +606,19 @@ class CatalogItemSerializer(serializers.ModelSerializer):
         image_field = obj.card_image if obj.card_image else obj.image
         return get_image_url(image_field, self.context.get('request'))
     
+    def get_card_image_srcset(self, obj):
+        """Возвращает адаптивные варианты изображения (srcset)"""
+        image_field = obj.card_image if obj.card_image else obj.image
+        return get_image_renditions(image_field, self.context.get('request'))
+    
     def get_image(self, obj):
         """Возвращает изображение для страницы"""
         return get_image_url(obj.image, self.context.get('request'))
     
+    def get_image_srcset(self, obj):
+        """Возвращает адаптивные варианты изображения (srcset)"""
+        return get_image_renditions(obj.image, self.context.get('request'))
+    
     def get_button_booking_form_id(self, obj):
         """Возвращает ID формы записи, если она активна"""
         if obj.button_booking_form and obj.button_booking_form.is_active:
@@ -585,18 +689,24 @@ class CatalogItemSerializer(serializers.ModelSerializer):
 
 class GalleryImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     video_file = serializers.SerializerMethodField()
     video_embed_url = serializers.SerializerMethodField()
     
     class Meta:
         model = GalleryImage
-        fields = ['id', 'content_type', 'image', 'video_file', 'video_url', 'video_embed_url', 'description', 'order']
+        fields = ['id', 'content_type', 'image', 'image_srcset', 'video_file', 'video_url', 'video_embed_url', 'description', 'order']
     
     def get_image(self, obj):
         if obj.content_type == 'image':
             return get_image_url(obj.image, self.context.get('request'))
         return None
     
+    def get_image_srcset(self, obj):
+        if obj.content_type == 'image':
+            return get_image_renditions(obj.image, self.context.get('request'))
+        return None
+    
     def get_video_file(self, obj):
         if obj.content_type == 'video' and obj.video_file:
             return get_image_url(obj.video_file, self.context.get('request'))
@@ -711,19 +821,23 @@ class HomePageBlockSerializer(serializers.ModelSerializer):
 
 class WelcomeBannerCardSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     button_booking_form_id = serializers.SerializerMethodField()
     button_quiz_slug = serializers.SerializerMethodField()
 
     class Meta:
         model = WelcomeBannerCard
         fields = [
-            'id', 'title', 'description', 'image', 'button_type', 'button_text',
+            'id', 'title', 'description', 'image', 'image_srcset', 'button_type', 'button_text',
             'button_url', 'button_booking_form_id', 'button_quiz_slug', 'order', 'is_active'
         ]
 
     def get_image(self, obj):
         return get_image_url(obj.image, self.context.get('request'))
 
+    def get_image_srcset(self, obj):
+        return get_image_renditions(obj.image, self.context.get('request'))
+
     def get_button_booking_form_id(self, obj):
         if obj.button_booking_form and obj.button_booking_form.is_active:
             return obj.button_booking_form.id
@@ -0,0 +1,135 @@
+import io
+import os
+import shutil
+import tempfile
+from PIL import Image
+from django.test import SimpleTestCase, TestCase, override_settings
+from .models import Article, unique_slug
+from .utils.thumbnails import (
+    MAX_THUMBNAIL_SIZE, get_thumbnail, is_allowed_size, thumbnail_name, thumbnail_signature, thumbnail_url
+)
+
+
+class UniqueSlugTests(TestCase):
+    """Подбор свободного slug"""
+    
+    def add_article(self, slug):
+        return Article.objects.create(title='Статья', slug=slug, content='Текст')
+    
+    def test_free_base_is_returned(self):
+        self.assertEqual(unique_slug(Article, 'novosti'), 'novosti')
+    
+    def test_smallest_free_number(self):
+        self.add_article('novosti')
+        self.add_article('novosti-1')
+        self.add_article('novosti-3')
+        
+        self.assertEqual(unique_slug(Article, 'novosti'), 'novosti-2')
+    
+    def test_single_query(self):
+        self.add_article('novosti')
+        
+        with self.assertNumQueries(1):
+            unique_slug(Article, 'novosti')
+    
+    def test_own_slug_is_not_taken(self):
+        article = self.add_article('novosti')
+        
+        self.assertEqual(unique_slug(Article, 'novosti', instance=article), 'novosti')
+    
+    def test_custom_separator(self):
+        self.add_article('novosti')
+        
+        self.assertEqual(unique_slug(Article, 'novosti', separator='_'), 'novosti_1')
+    
+    def test_long_base_fits_max_length(self):
+        max_length = Article._meta.get_field('slug').max_length
+        base = 'a' * (max_length + 10)
+        self.add_article(base[:max_length])
+        
+        slug = unique_slug(Article, base)
+        
+        self.assertEqual(slug, 'a' * (max_length - 2) + '-1')
+        self.assertLessEqual(len(slug), max_length)
+    
+    def test_save_assigns_unique_slug(self):
+        first = Article.objects.create(title='Новости', content='Текст')
+        second = Article.objects.create(title='Новости', content='Текст')
+        
+        self.assertNotEqual(first.slug, second.slug)
+        self.assertTrue(second.slug.startswith(first.slug))
+
+
+@override_settings(THUMBNAIL_SIZES={(100, 100)})
+class ThumbnailAccessTests(SimpleTestCase):
+    """Разрешенные размеры и подпись ссылок на миниатюры"""
+    
+    def test_listed_size_without_signature(self):
+        self.assertTrue(is_allowed_size('articles/a.jpg', 100, 100))
+    
+    def test_other_size_needs_signature(self):
+        signature = thumbnail_signature('articles/a.jpg', 300, 150)
+        
+        self.assertFalse(is_allowed_size('articles/a.jpg', 300, 150))
+        self.assertFalse(is_allowed_size('articles/a.jpg', 300, 150, 'bad'))
+        self.assertTrue(is_allowed_size('articles/a.jpg', 300, 150, signature))
+    
+    def test_signature_is_bound_to_path_and_size(self):
+        signature = thumbnail_signature('articles/a.jpg', 300, 150)
+        
+        self.assertFalse(is_allowed_size('articles/b.jpg', 300, 150, signature))
+        self.assertFalse(is_allowed_size('articles/a.jpg', 300, 151, signature))
+    
+    def test_size_limits_apply_to_signed_links(self):
+        size = MAX_THUMBNAIL_SIZE + 1
+        signature = thumbnail_signature('articles/a.jpg', size, 100)
+        
+        self.assertFalse(is_allowed_size('articles/a.jpg', size, 100, signature))
+        self.assertFalse(is_allowed_size('articles/a.jpg', 0, 100))
+    
+    def test_url_signs_only_unlisted_sizes(self):
+        self.assertEqual(thumbnail_url('articles/a.jpg', 100, 100), '/media-thumb/100x100/articles/a.jpg')
+        self.assertEqual(
+            thumbnail_url('articles/a.jpg', 300, 150),
+            f'/media-thumb/300x150/articles/a.jpg?s={thumbnail_signature("articles/a.jpg", 300, 150)}'
+        )
+    
+    def test_url_for_non_image_points_to_file(self):
+        self.assertEqual(thumbnail_url('icons/favicon.ico', 100, 100), '/media/icons/favicon.ico')
+    
+    def test_thumbnail_format(self):
+        self.assertEqual(thumbnail_name('articles/a.JPG', 100, 100), 'thumbs/100x100/articles/a.jpg')
+        self.assertEqual(thumbnail_name('articles/a.webp', 100, 100), 'thumbs/100x100/articles/a.png')
+
+
+class GetThumbnailTests(SimpleTestCase):
+    """Создание миниатюры на диске"""
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        os.makedirs(os.path.join(self.media_root, 'articles'))
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(buffer, 'JPEG')
+        with open(os.path.join(self.media_root, 'articles', 'a.jpg'), 'wb') as f:
+            f.write(buffer.getvalue())
+    
+    def test_creates_thumbnail_once(self):
+        name = get_thumbnail('articles/a.jpg', 100, 100)
+        
+        path = os.path.join(self.media_root, name)
+        with Image.open(path) as img:
+            self.assertLessEqual(img.width, 100)
+            self.assertLessEqual(img.height, 100)
+        modified = os.path.getmtime(path)
+        self.assertEqual(get_thumbnail('articles/a.jpg', 100, 100), name)
+        self.assertEqual(os.path.getmtime(path), modified)
+    
+    def test_missing_or_unsupported_source(self):
+        self.assertIsNone(get_thumbnail('articles/missing.jpg', 100, 100))
+        self.assertIsNone(get_thumbnail('articles/a.txt', 100, 100))
+        self.assertIsNone(get_thumbnail('thumbs/100x100/articles/a.jpg', 100, 100))
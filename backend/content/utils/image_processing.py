@@ -1,26 +1,446 @@
 """
 Утилиты для обработки и оптимизации изображений
+
+Конвейер обработки:
+- исходные байты декодируются один раз (decode_image);
+- все нужные варианты (профили IMAGE_PROFILES) строятся в памяти из одного
+  декодированного изображения (render_image);
+- каждый вариант записывается в хранилище один раз под именем из хеша
+  содержимого (hashed_name), поэтому одинаковые изображения в разных полях
+  ссылаются на один файл, а повторная запись того же результата не нужна;
+- из того же декодированного изображения строятся адаптивные варианты
+  (несколько ширин в WebP/JPEG, AVIF - если Pillow его поддерживает) для srcset,
+  их список хранится в ImageRenditionSet.
 """
+import hashlib
+import json
 import os
+import posixpath
 from io import BytesIO
 from PIL import Image
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+
+# Настройки для разных типов изображений
+IMAGE_PROFILES = {
+    'general': {
+        'max_width': 1920,
+        'max_height': 1920,
+        'quality': 85,
+        'format': 'JPEG'
+    },
+    'thumbnail': {
+        'max_width': 400,
+        'max_height': 400,
+        'quality': 80,
+        'format': 'JPEG'
+    },
+    'hero': {
+        'max_width': 2560,
+        'max_height': 1440,
+        'quality': 90,
+        'format': 'JPEG'
+    },
+    'avatar': {
+        'max_width': 400,
+        'max_height': 400,
+        'quality': 85,
+        'format': 'JPEG'
+    }
+}
+
+# Длина хеша в имени файла (16 hex-символов = 64 бита)
+HASH_NAME_LENGTH = 16
+
+# Ширины адаптивных вариантов; варианты не шире оптимизированного изображения не создаются
+RESPONSIVE_WIDTHS = (320, 640, 960, 1280)
+RESPONSIVE_QUALITY = 80
+RENDITIONS_DIR = 'renditions'
+RENDITION_SET_CACHE_TTL = 60 * 60 * 24
+# Отсутствие вариантов кэшируем ненадолго: их может создать другой процесс
+MISSING_RENDITION_SET_CACHE_TTL = 300
+
+# Расширения файлов, которые render_image дает для форматов
+FORMAT_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'AVIF': 'avif',
+}
+
+MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+}
+
+
+def _get_responsive_formats():
+    """Форматы адаптивных вариантов: AVIF (если Pillow умеет его записывать), WebP, JPEG"""
+    try:
+        import pillow_avif  # noqa: F401 - плагин регистрирует AVIF в Pillow
+    except ImportError:
+        pass
+    Image.init()
+    return tuple(format for format in ('AVIF', 'WEBP', 'JPEG') if format in Image.SAVE)
+
+
+RESPONSIVE_FORMATS = _get_responsive_formats()
+
+
+def get_profile(image_type):
+    """Настройки обработки для типа изображения (по умолчанию - 'general')"""
+    return IMAGE_PROFILES.get(image_type, IMAGE_PROFILES['general'])
+
+
+def profile_signature(image_type):
+    """
+    Подпись профиля обработки
+    
+    Меняется при изменении настроек профиля или адаптивных вариантов, поэтому
+    изображения, обработанные по старым настройкам, перестают считаться актуальными.
+    """
+    settings = [get_profile(image_type), RESPONSIVE_WIDTHS, RESPONSIVE_FORMATS, RESPONSIVE_QUALITY]
+    digest = hashlib.md5(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:8]
+    return f'{image_type}-{digest}'
+
+
+def image_fingerprint(name, image_type):
+    """
+    Отпечаток оптимизированного изображения: хеш содержимого и подпись профиля
+    
+    Хеш берется из имени файла (результат конвейера назван хешем содержимого),
+    поэтому проверка отпечатка не требует чтения файла.
+    """
+    stem = os.path.splitext(os.path.basename(name or ''))[0]
+    return f'{stem}:{profile_signature(image_type)}'
+
+
+def hashed_name(data, ext):
+    """Имя файла из хеша содержимого"""
+    return f'{hashlib.sha256(data).hexdigest()[:HASH_NAME_LENGTH]}.{ext}'
+
+
+def is_hashed_output(name, data):
+    """
+    Является ли файл результатом конвейера (имя совпадает с хешем содержимого)
+    
+    Такой файл уже оптимизирован: повторное перекодирование только ухудшит
+    качество и создаст новый файл.
+    """
+    base_name = os.path.basename(name or '')
+    ext = os.path.splitext(base_name)[1].lstrip('.')
+    return bool(ext) and base_name == hashed_name(data, ext)
+
+
+def read_field_data(image_field):
+    """Прочитать содержимое файла ImageField"""
+    image_field.open('rb')
+    try:
+        image_field.seek(0)
+        return image_field.read()
+    finally:
+        image_field.seek(0)
+
+
+def decode_image(data):
+    """Декодировать изображение из байтов (один раз на все варианты)"""
+    img = Image.open(BytesIO(data))
+    img.load()
+    return img
+
+
+def image_size(data):
+    """Размеры изображения по заголовку файла (без декодирования)"""
+    return Image.open(BytesIO(data)).size
+
+
+def _convert_mode(img, format):
+    """Привести режим изображения к поддерживаемому форматом"""
+    # Конвертируем RGBA в RGB для JPEG
+    if format == 'JPEG' and img.mode in ('RGBA', 'LA', 'P'):
+        # Создаем белый фон для прозрачных изображений
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        if img.mode == 'RGBA':
+            background.paste(img, mask=img.split()[-1])
+        else:
+            background.paste(img)
+        return background
+    if img.mode != 'RGB' and format == 'JPEG':
+        return img.convert('RGB')
+    return img
+
+
+def render_image(img, max_width=1920, max_height=1920, quality=85, format='JPEG'):
+    """
+    Построить вариант изображения в памяти
+    
+    Исходное изображение не изменяется, поэтому из одного декодированного
+    изображения можно построить несколько вариантов.
+    
+    Args:
+        img: Декодированное изображение PIL
+        max_width: максимальная ширина
+        max_height: максимальная высота
+        quality: качество (1-100)
+        format: формат выходного файла ('JPEG', 'PNG', 'WEBP')
+    
+    Returns:
+        tuple: (байты, расширение файла)
+    """
+    rendition = _convert_mode(img, format)
+    
+    # Изменяем размер если изображение слишком большое
+    width, height = rendition.size
+    if width > max_width or height > max_height:
+        if rendition is img:
+            # thumbnail изменяет изображение на месте
+            rendition = rendition.copy()
+        rendition.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+    
+    output = BytesIO()
+    
+    # Выбираем формат сохранения
+    if format == 'JPEG':
+        rendition.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        ext = 'jpg'
+    elif format == 'WEBP':
+        rendition.save(output, format='WEBP', quality=quality, method=6)
+        ext = 'webp'
+    elif format == 'AVIF':
+        rendition.save(output, format='AVIF', quality=quality)
+        ext = 'avif'
+    elif format == 'PNG':
+        # Для PNG используем оптимизацию
+        rendition.save(output, format='PNG', optimize=True)
+        ext = 'png'
+    else:
+        rendition.save(output, format=format, quality=quality)
+        ext = format.lower()
+    
+    return output.getvalue(), ext
+
+
+def store_rendition(image_field, data, ext, path=None):
+    """
+    Записать вариант в хранилище и привязать его к полю (без сохранения модели)
+    
+    Имя файла - хеш содержимого в каталоге upload_to поля. Если такой файл уже
+    есть, он переиспользуется без записи.
+    
+    Args:
+        image_field: Django ImageField (FieldFile)
+        data: байты варианта
+        ext: расширение файла
+        path: путь уже записанного варианта (чтобы другое поле сослалось на тот же файл)
+    
+    Returns:
+        str: путь файла в хранилище
+    """
+    storage = image_field.storage
+    if path is None:
+        path = image_field.field.generate_filename(image_field.instance, hashed_name(data, ext))
+        if not storage.exists(path):
+            path = storage.save(path, ContentFile(data))
+    
+    # То же, что делает FieldFile.save, но без повторной записи файла
+    image_field.name = path
+    setattr(image_field.instance, image_field.field.attname, path)
+    image_field._committed = True
+    return path
+
+
+def _rendition_cache_key(source_name):
+    return f'image_renditions:{hashlib.md5(source_name.encode()).hexdigest()}'
 
 
-def optimize_image(image_field, max_width=1920, max_height=1920, quality=85, format='JPEG'):
+def get_rendition_set(source_name):
+    """
+    Адаптивные варианты изображения (с кэшем)
+    
+    Returns:
+        dict: {'width', 'height', 'renditions': [{'name', 'type', 'width', 'height'}]}
+        или None, если варианты еще не созданы
+    """
+    from content.models import ImageRenditionSet
+    
+    if not source_name:
+        return None
+    cache_key = _rendition_cache_key(source_name)
+    rendition_set = cache.get(cache_key)
+    if rendition_set is None:
+        rendition_set = ImageRenditionSet.objects.filter(source=source_name).values(
+            'width', 'height', 'renditions'
+        ).first() or {}
+        cache.set(cache_key, rendition_set,
+                  RENDITION_SET_CACHE_TTL if rendition_set else MISSING_RENDITION_SET_CACHE_TTL)
+    return rendition_set or None
+
+
+def write_renditions(img, source_name, size, storage):
+    """
+    Записать адаптивные варианты оптимизированного изображения (без записи в БД)
+    
+    Для каждой ширины из RESPONSIVE_WIDTHS, меньшей ширины оптимизированного
+    изображения, изображение уменьшается один раз и кодируется во все
+    RESPONSIVE_FORMATS. Сам оптимизированный файл остается самым крупным
+    вариантом. Уже записанные варианты не перезаписываются.
+    
+    Args:
+        img: декодированное изображение PIL
+        source_name: путь оптимизированного изображения в хранилище
+        size: (ширина, высота) оптимизированного изображения
+        storage: хранилище файлов
+    
+    Returns:
+        dict: варианты в формате get_rendition_set
+    """
+    width, height = size
+    base = _convert_mode(img, 'JPEG')
+    stem = os.path.splitext(source_name)[0]
+    renditions = []
+    for rendition_width in RESPONSIVE_WIDTHS:
+        if rendition_width >= width:
+            break
+        rendition_size = (rendition_width, max(1, round(height * rendition_width / width)))
+        resized = base.resize(rendition_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for format in RESPONSIVE_FORMATS:
+            data, ext = render_image(resized, rendition_size[0], rendition_size[1], RESPONSIVE_QUALITY, format)
+            name = f'{RENDITIONS_DIR}/{stem}/{rendition_width}w.{ext}'
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(data))
+            renditions.append({
+                'name': name,
+                'type': MIME_TYPES[ext],
+                'width': rendition_size[0],
+                'height': rendition_size[1],
+            })
+    
+    return {'width': width, 'height': height, 'renditions': renditions}
+
+
+def save_rendition_sets(rendition_sets):
+    """
+    Сохранить списки адаптивных вариантов в БД и кэш
+    
+    Существующие записи обновляются одним bulk_update, новые создаются одним
+    bulk_create (INSERT ... ON CONFLICT с unique_fields не поддерживается MySQL).
+    
+    Args:
+        rendition_sets: {путь оптимизированного изображения: варианты}
+    """
+    from content.models import ImageRenditionSet
+    
+    if not rendition_sets:
+        return
+    
+    # Тот же список может параллельно создать другой процесс - тогда повторяем один раз
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing = {
+                    rendition_set.source: rendition_set
+                    for rendition_set in ImageRenditionSet.objects.select_for_update().filter(
+                        source__in=list(rendition_sets)
+                    )
+                }
+                now = timezone.now()
+                to_create = []
+                for source_name, values in rendition_sets.items():
+                    rendition_set = existing.get(source_name)
+                    if rendition_set is None:
+                        to_create.append(ImageRenditionSet(source=source_name, **values))
+                        continue
+                    for field, value in values.items():
+                        setattr(rendition_set, field, value)
+                    rendition_set.updated_at = now
+                
+                if existing:
+                    ImageRenditionSet.objects.bulk_update(
+                        existing.values(), ['width', 'height', 'renditions', 'updated_at'], batch_size=500
+                    )
+                if to_create:
+                    ImageRenditionSet.objects.bulk_create(to_create, batch_size=500)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+    
+    cache.set_many(
+        {_rendition_cache_key(source_name): rendition_set
+         for source_name, rendition_set in rendition_sets.items()},
+        RENDITION_SET_CACHE_TTL
+    )
+
+
+def generate_renditions(img, source_name, size, storage):
+    """Построить адаптивные варианты изображения и сохранить их список (см. write_renditions)"""
+    rendition_set = write_renditions(img, source_name, size, storage)
+    save_rendition_sets({source_name: rendition_set})
+    return rendition_set
+
+
+def process_image_data(data, targets):
+    """
+    Обработать исходное изображение для нескольких полей за одно декодирование
+    
+    Каждый профиль кодируется один раз, каждый результат записывается один раз:
+    поля с одинаковым профилем ссылаются на один файл.
+    
+    Args:
+        data: байты исходного изображения
+        targets: список пар (ImageField, тип изображения)
+    
+    Returns:
+        dict: {тип изображения: путь файла в хранилище}
+    """
+    img = decode_image(data)
+    renditions = {}
+    paths = {}
+    for image_field, image_type in targets:
+        profile = image_type if image_type in IMAGE_PROFILES else 'general'
+        if profile not in renditions:
+            renditions[profile] = render_image(img, **IMAGE_PROFILES[profile])
+        rendition_data, ext = renditions[profile]
+        if profile in paths:
+            store_rendition(image_field, rendition_data, ext, path=paths[profile])
+        else:
+            paths[profile] = store_rendition(image_field, rendition_data, ext)
+            generate_renditions(img, paths[profile], image_size(rendition_data), image_field.storage)
+        
+        # Поле модели с фоновой оптимизацией обработано ее профилем - сохраняем отпечаток,
+        # чтобы фоновая оптимизация его пропустила
+        instance = image_field.instance
+        if getattr(instance, 'IMAGE_FIELD', None) == image_field.field.name and instance.IMAGE_TYPE == profile:
+            instance.image_fingerprint = image_fingerprint(paths[profile], profile)
+    return paths
+
+
+def optimize_image(image_field, max_width=1920, max_height=1920, quality=85, format='JPEG', reencode=False):
     """
     Оптимизирует изображение для веб:
     - Изменяет размер если нужно
     - Сжимает с заданным качеством
     - Конвертирует в нужный формат
     
+    Результат сохраняется под именем из хеша содержимого, из того же
+    декодированного изображения строятся адаптивные варианты. Файл, который уже
+    является результатом конвейера, повторно не перекодируется, если не указан
+    reencode (нужен, когда файл обработан по старым настройкам профиля).
+    
     Args:
         image_field: Django ImageField
         max_width: максимальная ширина (по умолчанию 1920px)
         max_height: максимальная высота (по умолчанию 1920px)
         quality: качество JPEG (1-100, по умолчанию 85)
         format: формат выходного файла ('JPEG', 'PNG', 'WEBP')
+        reencode: перекодировать и файл, который уже является результатом конвейера
     
     Returns:
         True если обработка прошла успешно, False в противном случае
@@ -29,68 +449,25 @@ def optimize_image(image_field, max_width=1920, max_height=1920, quality=85, for
         return False
     
     try:
-        # Сохраняем текущую позицию файла
-        image_field.file.seek(0)
-        
-        # Открываем изображение
-        img = Image.open(image_field.file)
+        data = read_field_data(image_field)
+        if not reencode and is_hashed_output(image_field.name, data):
+            # Уже оптимизировано; досоздаем адаптивные варианты, если их нет
+            if get_rendition_set(image_field.name) is None:
+                generate_renditions(decode_image(data), image_field.name, image_size(data), image_field.storage)
+            return True
         
-        # Конвертируем RGBA в RGB для JPEG
-        if format == 'JPEG' and img.mode in ('RGBA', 'LA', 'P'):
-            # Создаем белый фон для прозрачных изображений
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            if img.mode == 'RGBA':
-                background.paste(img, mask=img.split()[-1])
-            else:
-                background.paste(img)
-            img = background
-        elif img.mode != 'RGB' and format == 'JPEG':
-            img = img.convert('RGB')
-        
-        # Получаем текущие размеры
-        width, height = img.size
-        
-        # Изменяем размер если изображение слишком большое
-        if width > max_width or height > max_height:
-            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-        
-        # Сохраняем в буфер
-        output = BytesIO()
-        
-        # Выбираем формат сохранения
-        if format == 'JPEG':
-            img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
-            ext = 'jpg'
-        elif format == 'WEBP':
-            img.save(output, format='WEBP', quality=quality, method=6)
-            ext = 'webp'
-        elif format == 'PNG':
-            # Для PNG используем оптимизацию
-            img.save(output, format='PNG', optimize=True)
-            ext = 'png'
-        else:
-            img.save(output, format=format, quality=quality)
-            ext = format.lower()
-        
-        # Получаем только имя файла без пути (чтобы избежать дублирования путей)
-        # image_field.name может содержать полный путь типа "logo/logo/logo/file.jpg"
-        # Нужно взять только имя файла, чтобы Django правильно применил upload_to
-        original_name = os.path.basename(image_field.name)  # Получаем только имя файла
-        file_name_without_ext = os.path.splitext(original_name)[0]  # Убираем расширение
-        new_file_name = f"{file_name_without_ext}.{ext}"  # Новое имя с правильным расширением
-        
-        # Сохраняем оптимизированное изображение
-        # Django автоматически добавит upload_to путь из модели
-        image_field.save(
-            new_file_name,
-            ContentFile(output.getvalue()),
-            save=False
+        img = decode_image(data)
+        rendition_data, ext = render_image(
+            img,
+            max_width=max_width,
+            max_height=max_height,
+            quality=quality,
+            format=format
         )
-        
+        path = store_rendition(image_field, rendition_data, ext)
+        generate_renditions(img, path, image_size(rendition_data), image_field.storage)
         return True
-        
+    
     except Exception as e:
         # В случае ошибки логируем и возвращаем False
         import traceback
@@ -99,51 +476,64 @@ def optimize_image(image_field, max_width=1920, max_height=1920, quality=85, for
         return False
 
 
-def process_uploaded_image(image_field, image_type='general'):
+def process_uploaded_image(image_field, image_type='general', reencode=False):
     """
     Обрабатывает загруженное изображение в зависимости от типа
     
     Args:
         image_field: Django ImageField
         image_type: тип изображения ('general', 'thumbnail', 'hero', 'avatar')
+        reencode: перекодировать и уже оптимизированный файл (см. optimize_image)
     
     Returns:
         Обработанное изображение
     """
-    # Настройки для разных типов изображений
-    settings = {
-        'general': {
-            'max_width': 1920,
-            'max_height': 1920,
-            'quality': 85,
-            'format': 'JPEG'
-        },
-        'thumbnail': {
-            'max_width': 400,
-            'max_height': 400,
-            'quality': 80,
-            'format': 'JPEG'
-        },
-        'hero': {
-            'max_width': 2560,
-            'max_height': 1440,
-            'quality': 90,
-            'format': 'JPEG'
-        },
-        'avatar': {
-            'max_width': 400,
-            'max_height': 400,
-            'quality': 85,
-            'format': 'JPEG'
-        }
-    }
+    return optimize_image(image_field, reencode=reencode, **get_profile(image_type))
+
+
+def reprocess_image_file(name, image_type, upload_to, storage=None, reencode=False):
+    """
+    Переобработать файл из хранилища по текущему профилю
+    
+    Работает только с файлами и не обращается к БД, поэтому может выполняться
+    в дочернем процессе (команда reprocess_images). Файл, который уже является
+    результатом конвейера и укладывается в профиль, не перекодируется повторно
+    (для него только досоздаются адаптивные варианты), если не указан reencode:
+    по файлу не видно, с каким качеством он закодирован, поэтому о смене
+    настроек профиля должен сообщить вызывающий код (по image_fingerprint).
     
-    config = settings.get(image_type, settings['general'])
-    return optimize_image(
-        image_field,
-        max_width=config['max_width'],
-        max_height=config['max_height'],
-        quality=config['quality'],
-        format=config['format']
+    Args:
+        name: путь исходного файла в хранилище
+        image_type: тип изображения ('general', 'thumbnail', 'hero', 'avatar')
+        upload_to: каталог для оптимизированного файла
+        storage: хранилище файлов (по умолчанию - default_storage)
+        reencode: перекодировать файл, даже если он уже результат конвейера
+    
+    Returns:
+        dict: {'name': путь оптимизированного файла, 'renditions': варианты}
+    """
+    from django.core.files.storage import default_storage
+    
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as source:
+        data = source.read()
+    
+    profile = get_profile(image_type)
+    img = decode_image(data)
+    fits_profile = (
+        name.endswith('.' + FORMAT_EXTENSIONS.get(profile['format'], profile['format'].lower()))
+        and img.width <= profile['max_width']
+        and img.height <= profile['max_height']
     )
-
+    if not reencode and fits_profile and is_hashed_output(name, data):
+        path, rendition_data = name, data
+    else:
+        rendition_data, ext = render_image(img, **profile)
+        path = storage.generate_filename(posixpath.join(upload_to, hashed_name(rendition_data, ext)))
+        if not storage.exists(path):
+            path = storage.save(path, ContentFile(rendition_data))
+    
+    return {
+        'name': path,
+        'renditions': write_renditions(img, path, image_size(rendition_data), storage),
+    }
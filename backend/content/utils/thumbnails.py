@@ -0,0 +1,118 @@
+"""
+Миниатюры изображений по запросу
+
+Миниатюра строится при первом обращении к /media-thumb/<ширина>x<высота>/<путь>,
+записывается в MEDIA_ROOT/thumbs/ и дальше отдается с диска. Размеры ограничены
+списком settings.THUMBNAIL_SIZES; миниатюры других размеров доступны только по
+ссылке с подписью (thumbnail_url подписывает ее сам).
+"""
+import os
+import posixpath
+import tempfile
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils._os import safe_join
+from .image_processing import decode_image, render_image
+
+THUMBS_DIR = 'thumbs'
+THUMBNAIL_QUALITY = 80
+# Предел размеров даже для подписанных ссылок
+MAX_THUMBNAIL_SIZE = 2000
+
+# Исходные форматы, в которых может быть прозрачность: миниатюры в PNG, остальные - в JPEG
+TRANSPARENT_EXTENSIONS = ('.png', '.gif', '.webp')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg') + TRANSPARENT_EXTENSIONS
+
+_signer = signing.Signer(salt='content.thumbnails')
+
+
+def _thumbnail_key(path, width, height):
+    return f'{width}x{height}/{path}'
+
+
+def thumbnail_signature(path, width, height):
+    """Подпись ссылки на миниатюру размера не из THUMBNAIL_SIZES"""
+    return _signer.signature(_thumbnail_key(path, width, height))
+
+
+def is_allowed_size(path, width, height, signature=None):
+    """Разрешен ли размер миниатюры: из списка THUMBNAIL_SIZES или по верной подписи"""
+    if not (0 < width <= MAX_THUMBNAIL_SIZE and 0 < height <= MAX_THUMBNAIL_SIZE):
+        return False
+    if (width, height) in settings.THUMBNAIL_SIZES:
+        return True
+    return bool(signature) and signing.constant_time_compare(
+        signature, thumbnail_signature(path, width, height)
+    )
+
+
+def thumbnail_url(name, width, height):
+    """
+    Ссылка на миниатюру файла из хранилища
+    
+    Для размеров не из THUMBNAIL_SIZES добавляется подпись. Для файлов, из
+    которых миниатюра не строится (например, .ico), возвращается ссылка на сам файл.
+    """
+    if posixpath.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+        return default_storage.url(name)
+    url = reverse('media_thumbnail', kwargs={'width': width, 'height': height, 'path': name})
+    if (width, height) not in settings.THUMBNAIL_SIZES:
+        url += f'?s={thumbnail_signature(name, width, height)}'
+    return url
+
+
+def thumbnail_name(path, width, height):
+    """Путь миниатюры в хранилище"""
+    stem, ext = posixpath.splitext(path)
+    thumbnail_ext = 'png' if ext.lower() in TRANSPARENT_EXTENSIONS else 'jpg'
+    return f'{THUMBS_DIR}/{width}x{height}/{stem}.{thumbnail_ext}'
+
+
+def get_thumbnail(path, width, height):
+    """
+    Путь миниатюры в хранилище; миниатюра создается, если ее еще нет
+    
+    Returns:
+        str: путь миниатюры или None, если исходный файл не найден или не
+        является изображением
+    
+    Raises:
+        SuspiciousFileOperation: путь выходит за пределы MEDIA_ROOT
+    """
+    if posixpath.splitext(path)[1].lower() not in IMAGE_EXTENSIONS or path.startswith(f'{THUMBS_DIR}/'):
+        return None
+    source_path = safe_join(settings.MEDIA_ROOT, path)
+    if not os.path.isfile(source_path):
+        return None
+    
+    name = thumbnail_name(path, width, height)
+    target_path = default_storage.path(name)
+    if os.path.exists(target_path):
+        return name
+    
+    with open(source_path, 'rb') as source:
+        img = decode_image(source.read())
+    data, _ = render_image(
+        img,
+        max_width=width,
+        max_height=height,
+        quality=THUMBNAIL_QUALITY,
+        format='PNG' if name.endswith('.png') else 'JPEG'
+    )
+    
+    # Пишем во временный файл и переименовываем, чтобы параллельный запрос
+    # не отдал недописанную миниатюру
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return name
@@ -2,8 +2,16 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+import logging
+import mimetypes
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from django.db import models
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
 from .models import (
     Contact, Branch,
     MenuItem, HeaderSettings, HeroSettings, FooterSettings, PrivacyPolicy, SiteSettings,
@@ -15,6 +23,12 @@ from .serializers import (
     FooterSettingsSerializer, PrivacyPolicySerializer, SiteSettingsSerializer,
     ContentPageSerializer, WelcomeBannerSerializer, CatalogItemSerializer, ServiceSerializer
 )
+from .utils.thumbnails import get_thumbnail, is_allowed_size
+
+logger = logging.getLogger(__name__)
+
+# Миниатюра не меняется, пока не изменится исходный файл (а он не перезаписывается)
+THUMBNAIL_CACHE_MAX_AGE = 60 * 60 * 24 * 30
 
 
 class ContactViewSet(viewsets.ReadOnlyModelViewSet):
@@ -419,3 +433,33 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'error': 'Неверный ID филиала'}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_safe
+def media_thumbnail(request, width, height, path):
+    """
+    Миниатюра изображения из MEDIA_ROOT (создается при первом запросе)
+    
+    Если задан THUMBNAIL_ACCEL_REDIRECT, файл отдает nginx по X-Accel-Redirect.
+    """
+    if not is_allowed_size(path, width, height, request.GET.get('s')):
+        raise Http404('Недопустимый размер миниатюры')
+    
+    try:
+        name = get_thumbnail(path, width, height)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    except Exception as e:
+        # Не удалось построить миниатюру (например, файл не декодируется) - отдаем исходный файл
+        logger.error(f'Ошибка создания миниатюры {width}x{height} для {path}: {str(e)}', exc_info=True)
+        return HttpResponseRedirect(default_storage.url(path))
+    if name is None:
+        raise Http404('Файл не найден')
+    
+    if settings.THUMBNAIL_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=mimetypes.guess_type(name)[0])
+        response['X-Accel-Redirect'] = settings.THUMBNAIL_ACCEL_REDIRECT.rstrip('/') + '/' + name
+    else:
+        response = FileResponse(default_storage.open(name, 'rb'))
+    patch_cache_control(response, public=True, max_age=THUMBNAIL_CACHE_MAX_AGE)
+    return response
@@ -1,7 +1,9 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from functools import lru_cache
 import base64
 import os
 import json
@@ -22,6 +24,33 @@ except ImportError:
     default_backend = None
 
 
+LEAD_STATUS_MAP_CACHE_KEY = 'crm_lead_status_map'
+LEAD_STATUS_MAP_CACHE_TTL = 3600
+
+
+@lru_cache(maxsize=4)
+def _derive_encryption_key(secret_key):
+    """
+    Ключ шифрования из SECRET_KEY
+    
+    PBKDF2 на 100000 итераций занимает десятки миллисекунд, поэтому ключ
+    вычисляется один раз на процесс, а не при каждой расшифровке поля.
+    """
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=b'crm_encryption_salt',
+        iterations=100000,
+        backend=default_backend()
+    )
+    return base64.urlsafe_b64encode(kdf.derive(secret_key))
+
+
+@lru_cache(maxsize=4)
+def _get_fernet(key):
+    return Fernet(key)
+
+
 def get_encryption_key():
     """Получить ключ шифрования из настроек или создать новый"""
     if not CRYPTOGRAPHY_AVAILABLE:
@@ -32,15 +61,7 @@ def get_encryption_key():
     key = getattr(settings, 'CRM_ENCRYPTION_KEY', None)
     if not key:
         # Используем SECRET_KEY для генерации ключа шифрования
-        secret_key = settings.SECRET_KEY.encode()
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'crm_encryption_salt',
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(secret_key))
+        key = _derive_encryption_key(settings.SECRET_KEY.encode())
     else:
         if isinstance(key, str):
             key = key.encode()
@@ -55,7 +76,7 @@ def encrypt_field(value):
         # Если cryptography не установлена, возвращаем значение как есть (для миграций)
         return value
     try:
-        f = Fernet(get_encryption_key())
+        f = _get_fernet(get_encryption_key())
         encrypted = f.encrypt(value.encode() if isinstance(value, str) else value)
         return base64.urlsafe_b64encode(encrypted).decode()
     except Exception as e:
@@ -70,7 +91,7 @@ def decrypt_field(encrypted_value):
         # Если cryptography не установлена, возвращаем значение как есть (для миграций)
         return encrypted_value
     try:
-        f = Fernet(get_encryption_key())
+        f = _get_fernet(get_encryption_key())
         decoded = base64.urlsafe_b64decode(encrypted_value.encode())
         decrypted = f.decrypt(decoded)
         return decrypted.decode()
@@ -108,6 +129,28 @@ class LeadStatus(models.Model):
         return self.name
 
 
+def get_lead_status_map():
+    """
+    Кэшированная карта статусов лидов: код -> {'id', 'name'}
+    
+    Если одним кодом помечено несколько статусов, берется первый по порядку
+    сортировки (как LeadStatus.objects.filter(code=...).first()).
+    Кэш сбрасывается сигналами при изменении статусов.
+    """
+    status_map = cache.get(LEAD_STATUS_MAP_CACHE_KEY)
+    if status_map is None:
+        status_map = {}
+        for status_id, code, name in LeadStatus.objects.values_list('id', 'code', 'name'):
+            status_map.setdefault(code, {'id': status_id, 'name': name})
+        cache.set(LEAD_STATUS_MAP_CACHE_KEY, status_map, LEAD_STATUS_MAP_CACHE_TTL)
+    return status_map
+
+
+def invalidate_lead_status_map():
+    """Сбросить кэш карты статусов лидов"""
+    cache.delete(LEAD_STATUS_MAP_CACHE_KEY)
+
+
 class Lead(models.Model):
     """Лид - потенциальный клиент"""
     # Связи с источниками
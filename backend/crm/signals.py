@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -186,3 +186,10 @@ def create_lead_from_quiz_submission(sender, instance, created, **kwargs):
     
     return lead
 
+
+@receiver(post_save, sender='crm.LeadStatus')
+@receiver(post_delete, sender='crm.LeadStatus')
+def reset_lead_status_map(sender, **kwargs):
+    """Сбросить кэш карты статусов лидов при изменении статусов"""
+    from .models import invalidate_lead_status_map
+    invalidate_lead_status_map()
@@ -4,7 +4,9 @@ from django.utils.html import format_html
 from django.utils import timezone
 from .models import (
     MoyKlassSettings, MoyKlassSyncLog, MoyKlassRequestLog,
-    MoyKlassIntegration, MoyKlassFieldMapping
+    MoyKlassIntegration, MoyKlassFieldMapping, MoyKlassSyncCursor,
+    MoyKlassStudent, MoyKlassPayment, MoyKlassBooking, MoyKlassWebhookEvent,
+    MoyKlassPendingLead, MoyKlassGroup, MoyKlassLesson, MoyKlassStaff
 )
 
 
@@ -119,7 +121,10 @@ class MoyKlassSettingsAdmin(admin.ModelAdmin):
             'fields': (
                 'auto_sync_enabled',
                 'sync_interval_minutes',
-                'last_sync_at'
+                'last_sync_at',
+                'sync_concurrency',
+                'api_rate_limit',
+                'api_max_in_flight'
             ),
             'description': 'Настройки автоматической синхронизации данных'
         }),
@@ -314,6 +319,135 @@ class MoyKlassSyncLogAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(MoyKlassSyncCursor)
+class MoyKlassSyncCursorAdmin(admin.ModelAdmin):
+    """Админка для курсоров инкрементальной синхронизации"""
+    
+    list_display = ['entity', 'synced_until', 'last_records_count', 'last_full_sync_at', 'updated_at']
+    readonly_fields = ['entity', 'synced_until', 'last_records_count', 'last_full_sync_at', 'updated_at']
+    actions = ['reset_cursor']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def reset_cursor(self, request, queryset):
+        """Сбрасывает курсор, чтобы следующий запуск выполнил полную синхронизацию"""
+        updated = queryset.update(synced_until=None)
+        self.message_user(
+            request,
+            f'✓ Сброшено курсоров: {updated}. Следующая синхронизация будет полной.',
+            level='SUCCESS'
+        )
+    reset_cursor.short_description = 'Сбросить курсор (полная синхронизация при следующем запуске)'
+
+
+class MoyKlassMirrorAdmin(admin.ModelAdmin):
+    """Базовая админка для локальных копий данных MoyKlass (только просмотр)"""
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MoyKlassStudent)
+class MoyKlassStudentAdmin(MoyKlassMirrorAdmin):
+    list_display = ['moyklass_id', 'name', 'phone', 'email', 'remote_updated_at', 'synced_at']
+    search_fields = ['=moyklass_id', 'name', 'phone', 'email']
+    list_filter = ['status_id']
+
+
+@admin.register(MoyKlassPayment)
+class MoyKlassPaymentAdmin(MoyKlassMirrorAdmin):
+    list_display = ['moyklass_id', 'student_moyklass_id', 'amount', 'date', 'operation_type', 'synced_at']
+    search_fields = ['=moyklass_id', '=student_moyklass_id', 'comment']
+    list_filter = ['operation_type', 'date']
+
+
+@admin.register(MoyKlassBooking)
+class MoyKlassBookingAdmin(MoyKlassMirrorAdmin):
+    list_display = ['moyklass_id', 'student_moyklass_id', 'group_moyklass_id', 'status_id', 'remote_created_at', 'synced_at']
+    search_fields = ['=moyklass_id', '=student_moyklass_id', '=group_moyklass_id']
+    list_filter = ['status_id']
+
+
+@admin.register(MoyKlassGroup)
+class MoyKlassGroupAdmin(MoyKlassMirrorAdmin):
+    list_display = ['moyklass_id', 'name', 'filial_id', 'status', 'max_students', 'synced_at']
+    search_fields = ['=moyklass_id', 'name']
+    list_filter = ['filial_id', 'status']
+
+
+@admin.register(MoyKlassLesson)
+class MoyKlassLessonAdmin(MoyKlassMirrorAdmin):
+    list_display = ['moyklass_id', 'date', 'begin_time', 'group_moyklass_id', 'filial_id', 'booked_count', 'free_seats', 'synced_at']
+    search_fields = ['=moyklass_id', '=group_moyklass_id', 'topic']
+    list_filter = ['filial_id', 'date']
+
+
+@admin.register(MoyKlassStaff)
+class MoyKlassStaffAdmin(MoyKlassMirrorAdmin):
+    list_display = ['moyklass_id', 'name', 'is_active', 'synced_at']
+    search_fields = ['=moyklass_id', 'name']
+    list_filter = ['is_active']
+
+
+@admin.register(MoyKlassWebhookEvent)
+class MoyKlassWebhookEventAdmin(admin.ModelAdmin):
+    """Админка для очереди вебхуков MoyKlass"""
+    
+    list_display = ['event_type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type', 'received_at']
+    readonly_fields = [
+        'event_type', 'dedup_key', 'payload', 'status', 'attempts',
+        'error_message', 'received_at', 'processed_at'
+    ]
+    search_fields = ['event_type', 'dedup_key', 'error_message']
+    actions = ['requeue_events']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def requeue_events(self, request, queryset):
+        """Возвращает выбранные вебхуки в очередь"""
+        from .webhooks import process_pending_events_async
+        
+        updated = queryset.exclude(status='pending').update(status='pending', attempts=0, error_message='')
+        process_pending_events_async()
+        self.message_user(request, f'✓ Возвращено в очередь: {updated}', level='SUCCESS')
+    requeue_events.short_description = 'Обработать повторно'
+
+
+@admin.register(MoyKlassPendingLead)
+class MoyKlassPendingLeadAdmin(admin.ModelAdmin):
+    """Админка для очереди повторной отправки лидов"""
+    
+    list_display = ['__str__', 'source', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = [
+        'source', 'student_data', 'tags', 'status', 'attempts', 'next_attempt_at',
+        'last_error', 'moyklass_id', 'delivery_unknown', 'created_at', 'sent_at'
+    ]
+    search_fields = ['source', 'last_error']
+    actions = ['send_now']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def send_now(self, request, queryset):
+        """Отправляет выбранные лиды без ожидания следующей попытки"""
+        from .leads import push_pending_leads
+        
+        queryset.exclude(status='sent').update(status='pending', next_attempt_at=timezone.now())
+        results = push_pending_leads(limit=queryset.count())
+        self.message_user(
+            request,
+            f'Отправлено: {results["sent"]}, отложено: {results["retry"]}, не удалось: {results["failed"]}'
+        )
+    send_now.short_description = 'Отправить сейчас'
+
+
 @admin.register(MoyKlassRequestLog)
 class MoyKlassRequestLogAdmin(admin.ModelAdmin):
     """Админка для логов запросов к API"""
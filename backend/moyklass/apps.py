@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MoyklassConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'moyklass'
+    
+    def ready(self):
+        """Подключаем сигналы при запуске приложения"""
+        import moyklass.signals  # noqa
@@ -2,12 +2,25 @@
 Клиент для работы с API MoyKlass
 Документация: https://api.moyklass.com/
 """
+import logging
 import requests
 import time
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Callable, Iterator, Optional, List, Type
 from django.utils import timezone
 from django.conf import settings
 from .models import MoyKlassSettings, MoyKlassRequestLog
+from .mapping import normalize_phone
+from .fetcher import PageFetcher
+from .records import StudentRecord, PaymentRecord, BookingRecord, GroupRecord, LessonRecord
+from .transport import (
+    circuit_breaker, get_rate_limiter, get_in_flight_semaphore, get_session, parse_retry_after
+)
+
+logger = logging.getLogger(__name__)
+
+# Кэш ID тегов по названию (в нижнем регистре), общий для процесса
+TAG_CACHE_TTL = 600
+_tag_ids_cache = {'ids': {}, 'expires_at': 0.0}
 
 
 class MoyKlassAPIError(Exception):
@@ -15,12 +28,30 @@ class MoyKlassAPIError(Exception):
     pass
 
 
+class MoyKlassUnavailableError(MoyKlassAPIError):
+    """API MoyKlass временно недоступен (сеть, 5xx, лимиты) - запрос стоит повторить позже"""
+    pass
+
+
+class MoyKlassTimeoutError(MoyKlassUnavailableError):
+    """Запрос отправлен, но ответ не получен вовремя - API мог его выполнить"""
+    pass
+
+
 class MoyKlassClient:
     """Клиент для работы с API MoyKlass"""
     
     BASE_URL = 'https://api.moyklass.com'
     API_VERSION = 'v1'
     
+    # (подключение, чтение): недоступный сервер не должен держать поток 30 секунд
+    TIMEOUT = (5, 30)
+    # Сколько ждать свободного слота для запроса, прежде чем отказаться
+    IN_FLIGHT_WAIT_SECONDS = 5
+    # Повторы при 429, если Retry-After не больше MAX_RETRY_AFTER секунд
+    MAX_RATE_LIMIT_RETRIES = 2
+    MAX_RETRY_AFTER = 10
+    
     def __init__(self, settings_instance: Optional[MoyKlassSettings] = None):
         """
         Инициализация клиента
@@ -41,6 +72,8 @@ class MoyKlassClient:
         
         if not self.settings.api_key:
             raise MoyKlassAPIError('API ключ не настроен')
+        
+        self.base_url = getattr(settings, 'MOYKLASS_API_URL', self.BASE_URL).rstrip('/')
     
     def _get_access_token(self) -> str:
         """Получает действительный токен доступа"""
@@ -53,13 +86,12 @@ class MoyKlassClient:
     
     def _refresh_token(self) -> str:
         """Получает новый токен доступа"""
-        url = f'{self.BASE_URL}/{self.API_VERSION}/company/auth/getToken'
+        url = f'{self.base_url}/{self.API_VERSION}/company/auth/getToken'
         
-        response = requests.post(
-            url,
-            json={'apiKey': self.settings.api_key},
-            timeout=10
-        )
+        try:
+            response = self._send('POST', url, json={'apiKey': self.settings.api_key})
+        except requests.exceptions.RequestException as e:
+            raise MoyKlassUnavailableError(f'Ошибка получения токена: {str(e)}')
         
         self._log_request('POST', url, {'apiKey': '***'}, response)
         
@@ -104,7 +136,7 @@ class MoyKlassClient:
             Ответ API в виде словаря
         """
         token = self._get_access_token()
-        url = f'{self.BASE_URL}/{self.API_VERSION}/{endpoint.lstrip("/")}'
+        url = f'{self.base_url}/{self.API_VERSION}/{endpoint.lstrip("/")}'
         
         headers = {
             'x-access-token': token,
@@ -114,14 +146,7 @@ class MoyKlassClient:
         start_time = time.time()
         
         try:
-            response = requests.request(
-                method,
-                url,
-                json=data,
-                params=params,
-                headers=headers,
-                timeout=30
-            )
+            response = self._send(method, url, json=data, params=params, headers=headers)
             
             duration_ms = (time.time() - start_time) * 1000
             
@@ -130,14 +155,7 @@ class MoyKlassClient:
                 token = self._refresh_token()
                 headers['x-access-token'] = token
                 
-                response = requests.request(
-                    method,
-                    url,
-                    json=data,
-                    params=params,
-                    headers=headers,
-                    timeout=30
-                )
+                response = self._send(method, url, json=data, params=params, headers=headers)
                 
                 duration_ms = (time.time() - start_time) * 1000
             
@@ -158,6 +176,8 @@ class MoyKlassClient:
                     self._log_request(method, endpoint, data, response, duration_ms, error_detail)
                 
                 error_msg = f'Ошибка API: {error_detail} (статус {response.status_code})'
+                if response.status_code >= 500:
+                    raise MoyKlassUnavailableError(error_msg)
                 raise MoyKlassAPIError(error_msg)
             
             # Логируем успешный запрос
@@ -175,7 +195,69 @@ class MoyKlassClient:
             duration_ms = (time.time() - start_time) * 1000
             if self.settings.log_requests:
                 self._log_request(method, endpoint, data, None, duration_ms, str(e))
-            raise MoyKlassAPIError(f'Ошибка запроса к API: {str(e)}')
+            if isinstance(e, requests.exceptions.ReadTimeout):
+                raise MoyKlassTimeoutError(f'Нет ответа от API: {str(e)}')
+            raise MoyKlassUnavailableError(f'Ошибка запроса к API: {str(e)}')
+    
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Отправляет HTTP запрос с учетом ограничений процесса
+        
+        - отклоняет запрос сразу, если предохранитель разомкнут;
+        - ограничивает число одновременных запросов и частоту запросов;
+        - при 429 ждет Retry-After и повторяет, при долгой паузе - размыкает предохранитель.
+        
+        Raises:
+            MoyKlassUnavailableError: API недоступен или лимиты исчерпаны
+            requests.exceptions.RequestException: сетевая ошибка
+        """
+        if not circuit_breaker.allow():
+            raise MoyKlassUnavailableError(
+                f'API MoyKlass временно недоступен, повтор через '
+                f'{int(circuit_breaker.seconds_until_retry())} сек'
+            )
+        
+        try:
+            return self._send_limited(method, url, **kwargs)
+        finally:
+            # Если запрос был пробным и результат не учтен (например, не дождались
+            # семафора), следующий поток должен получить право на пробу
+            circuit_breaker.release_trial()
+    
+    def _send_limited(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Отправляет HTTP запрос с ограничением одновременных запросов и частоты"""
+        semaphore = get_in_flight_semaphore(self.settings.api_max_in_flight)
+        if not semaphore.acquire(timeout=self.IN_FLIGHT_WAIT_SECONDS):
+            raise MoyKlassUnavailableError('Превышен лимит одновременных запросов к API MoyKlass')
+        
+        rate_limiter = get_rate_limiter(self.settings.api_rate_limit)
+        try:
+            for attempt in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+                rate_limiter.wait()
+                try:
+                    response = get_session().request(method, url, timeout=self.TIMEOUT, **kwargs)
+                except requests.exceptions.RequestException:
+                    circuit_breaker.record_failure()
+                    raise
+                
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(response, default=2 ** attempt)
+                    logger.warning(f'MoyKlass вернул 429 для {method} {url}, Retry-After: {retry_after} сек')
+                    rate_limiter.pause(retry_after)
+                    if attempt < self.MAX_RATE_LIMIT_RETRIES and retry_after <= self.MAX_RETRY_AFTER:
+                        continue
+                    circuit_breaker.record_failure(open_for=retry_after)
+                    raise MoyKlassUnavailableError(
+                        f'Превышен лимит запросов к API MoyKlass, повтор через {int(retry_after)} сек'
+                    )
+                
+                if response.status_code >= 500:
+                    circuit_breaker.record_failure()
+                else:
+                    circuit_breaker.record_success()
+                return response
+        finally:
+            semaphore.release()
     
     def _log_request(
         self,
@@ -263,6 +345,22 @@ class MoyKlassClient:
         """Получает информацию об ученике"""
         return self._make_request('GET', f'/company/users/{student_id}')
     
+    def find_student_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """
+        Ищет ученика/лида по телефону
+        
+        Args:
+            phone: Нормализованный телефон (только цифры)
+        
+        Returns:
+            Первый ученик с точно совпадающим телефоном или None
+        """
+        response = self.get_students(per_page=20, filters={'phone': phone})
+        for student in response.get('data', []):
+            if normalize_phone(student.get('phone')) == phone:
+                return student
+        return None
+    
     def create_student(self, data: Dict[str, Any], tags: Optional[List[str]] = None, is_lead: bool = True) -> Dict[str, Any]:
         """
         Создает нового ученика/лида
@@ -275,37 +373,16 @@ class MoyKlassClient:
         # Удаляем теги из data, если они там есть (добавим отдельно)
         data_without_tags = {k: v for k, v in data.items() if k != 'tags'}
         
-        # Дополнительная нормализация телефона перед отправкой
+        # Телефон из плана маппинга уже нормализован - normalize_phone вернет его сразу
         if 'phone' in data_without_tags:
-            phone = str(data_without_tags['phone']).strip()
-            # Удаляем все нецифровые символы
-            phone_digits = ''.join(filter(str.isdigit, phone))
+            phone_digits = normalize_phone(data_without_tags['phone'])
             if phone_digits:
-                # Проверяем длину
-                if len(phone_digits) < 10:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.warning(
-                        f'Телефон слишком короткий перед отправкой в MoyKlass: "{phone_digits}" '
-                        f'(длина {len(phone_digits)}, требуется 10-15). Исходное значение: "{phone}"'
-                    )
-                elif len(phone_digits) > 15:
-                    phone_digits = phone_digits[:15]
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.warning(f'Телефон обрезан до 15 цифр: "{phone_digits}"')
-                
                 data_without_tags['phone'] = phone_digits
             else:
                 # Если не удалось нормализовать, удаляем поле, чтобы не отправлять некорректные данные
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f'Не удалось нормализовать телефон "{phone}", поле будет удалено из запроса')
                 data_without_tags.pop('phone', None)
         
         # Логируем данные перед отправкой
-        import logging
-        logger = logging.getLogger(__name__)
         logger.debug(f'Отправка данных в MoyKlass для создания лида: {data_without_tags}')
         
         # Создаем пользователя (без тегов)
@@ -318,8 +395,6 @@ class MoyKlassClient:
                 self.add_tags_to_student(result['id'], tags)
             except Exception as e:
                 # Логируем, но не прерываем выполнение
-                import logging
-                logger = logging.getLogger(__name__)
                 logger.warning(f'Не удалось добавить теги к лиду {result["id"]}: {str(e)}')
         
         return result
@@ -395,24 +470,43 @@ class MoyKlassClient:
         Returns:
             ID тега или None, если не удалось найти/создать
         """
+        key = tag_name.lower()
+        
+        # Тег из настроек уже знает свой ID
+        if self.settings.website_tag_id and key == (self.settings.website_tag_name or '').lower():
+            return self.settings.website_tag_id
+        
+        # ID тегов кэшируются на уровне процесса, чтобы не запрашивать список тегов на каждый лид
+        if time.monotonic() < _tag_ids_cache['expires_at'] and key in _tag_ids_cache['ids']:
+            return _tag_ids_cache['ids'][key]
+        
         # Сначала пытаемся найти существующий тег
         tags = self.get_tags()
+        tag_ids = {}
         for tag in tags:
             if isinstance(tag, dict):
-                tag_id = tag.get('id')
                 tag_name_from_api = tag.get('name') or tag.get('title')
-                if tag_name_from_api and tag_name_from_api.lower() == tag_name.lower():
-                    return tag_id
+                if tag_name_from_api and tag.get('id'):
+                    tag_ids[tag_name_from_api.lower()] = tag.get('id')
             elif isinstance(tag, str):
                 # Если API возвращает просто строки, ищем по названию
-                if tag.lower() == tag_name.lower():
+                if tag.lower() == key:
                     # Не можем вернуть ID, если API не предоставляет его
                     return None
         
+        if tags:
+            _tag_ids_cache['ids'] = tag_ids
+            _tag_ids_cache['expires_at'] = time.monotonic() + TAG_CACHE_TTL
+        
+        if key in tag_ids:
+            return tag_ids[key]
+        
         # Если тег не найден, пытаемся создать его
         try:
             result = self._make_request('POST', '/company/tags', data={'name': tag_name})
             if isinstance(result, dict):
+                if result.get('id'):
+                    _tag_ids_cache['ids'][key] = result['id']
                 return result.get('id')
         except Exception as e:
             import logging
@@ -529,10 +623,14 @@ class MoyKlassClient:
     def get_staff(
         self,
         page: int = 1,
-        per_page: int = 50
+        per_page: int = 50,
+        filters: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Получает список сотрудников"""
         params = {'page': page, 'perPage': per_page}
+        if filters:
+            params.update(filters)
+        
         return self._make_request('GET', '/company/staff', params=params)
     
     def get_staff_member(self, staff_id: int) -> Dict[str, Any]:
@@ -557,4 +655,101 @@ class MoyKlassClient:
     def get_lesson(self, lesson_id: int) -> Dict[str, Any]:
         """Получает информацию о занятии"""
         return self._make_request('GET', f'/company/lessons/{lesson_id}')
-
+    
+    # ==================== ПОТОКОВЫЙ ОБХОД СПИСКОВ ====================
+    
+    def _iter_records(
+        self,
+        fetch_page: Callable[..., Dict[str, Any]],
+        filters: Optional[Dict[str, Any]],
+        per_page: int,
+        prefetch: int,
+        record_type: Optional[Type] = None
+    ) -> Iterator[Any]:
+        """
+        Лениво отдает записи всех страниц списка
+        
+        В памяти одновременно находятся только загружаемые заранее страницы
+        (не больше prefetch), поэтому обход не зависит от размера аккаунта.
+        """
+        pages = PageFetcher(fetch_page, per_page=per_page, filters=filters, max_workers=prefetch)
+        for response in pages:
+            for record in response.get('data', []):
+                yield record_type.from_api(record) if record_type else record
+    
+    def iter_students(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        per_page: int = 50,
+        prefetch: int = 1,
+        compact: bool = False
+    ) -> Iterator[Any]:
+        """
+        Потоково обходит всех учеников/лидов
+        
+        Args:
+            filters: Дополнительные фильтры
+            per_page: Количество записей на странице
+            prefetch: Сколько страниц загружать заранее параллельно (1 - по очереди)
+            compact: Отдавать StudentRecord вместо полного словаря API
+        """
+        return self._iter_records(
+            self.get_students, filters, per_page, prefetch, StudentRecord if compact else None
+        )
+    
+    def iter_payments(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        per_page: int = 50,
+        prefetch: int = 1,
+        compact: bool = False
+    ) -> Iterator[Any]:
+        """Потоково обходит все платежи (параметры как у iter_students, компактная запись - PaymentRecord)"""
+        return self._iter_records(
+            self.get_payments, filters, per_page, prefetch, PaymentRecord if compact else None
+        )
+    
+    def iter_bookings(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        per_page: int = 50,
+        prefetch: int = 1,
+        compact: bool = False
+    ) -> Iterator[Any]:
+        """Потоково обходит все записи в группы (компактная запись - BookingRecord)"""
+        return self._iter_records(
+            self.get_bookings, filters, per_page, prefetch, BookingRecord if compact else None
+        )
+    
+    def iter_groups(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        per_page: int = 50,
+        prefetch: int = 1,
+        compact: bool = False
+    ) -> Iterator[Any]:
+        """Потоково обходит все группы (компактная запись - GroupRecord)"""
+        return self._iter_records(
+            self.get_groups, filters, per_page, prefetch, GroupRecord if compact else None
+        )
+    
+    def iter_lessons(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        per_page: int = 50,
+        prefetch: int = 1,
+        compact: bool = False
+    ) -> Iterator[Any]:
+        """Потоково обходит все занятия (компактная запись - LessonRecord)"""
+        return self._iter_records(
+            self.get_lessons, filters, per_page, prefetch, LessonRecord if compact else None
+        )
+    
+    def iter_staff(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        per_page: int = 50,
+        prefetch: int = 1
+    ) -> Iterator[Dict[str, Any]]:
+        """Потоково обходит всех сотрудников"""
+        return self._iter_records(self.get_staff, filters, per_page, prefetch)
@@ -0,0 +1,110 @@
+"""
+Параллельная загрузка страниц из API MoyKlass
+
+Первая страница загружается синхронно. Как только из нее становится известно
+общее количество страниц, следующие страницы запрашиваются заранее в пуле потоков
+с ограничением числа одновременных запросов. Страницы отдаются строго по порядку.
+"""
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+from django.db import connections
+from config.rate_limit import RateLimiter
+
+
+def get_total_pages(response: Dict[str, Any], per_page: int) -> Optional[int]:
+    """
+    Определяет общее количество страниц по ответу API
+    
+    Returns:
+        Количество страниц или None, если API его не сообщил
+    """
+    pagination = response.get('pagination') or {}
+    if pagination.get('totalPages'):
+        return int(pagination['totalPages'])
+    
+    total_items = (
+        pagination.get('total')
+        or pagination.get('totalItems')
+        or (response.get('stats') or {}).get('totalItems')
+    )
+    if total_items:
+        return math.ceil(int(total_items) / per_page)
+    
+    return None
+
+
+class PageFetcher:
+    """Итератор по страницам ответа API с упреждающей параллельной загрузкой"""
+    
+    def __init__(
+        self,
+        fetch_page: Callable[..., Dict[str, Any]],
+        per_page: int = 50,
+        filters: Optional[Dict[str, Any]] = None,
+        max_workers: int = 4,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        """
+        Args:
+            fetch_page: Метод клиента для загрузки страницы (get_students, get_payments, ...)
+            per_page: Количество записей на странице
+            filters: Фильтры API
+            max_workers: Максимум одновременных запросов к API
+            rate_limiter: Дополнительный ограничитель частоты запросов
+                          (общие лимиты API применяются в MoyKlassClient)
+        """
+        self.fetch_page = fetch_page
+        self.per_page = per_page
+        self.filters = filters or {}
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = rate_limiter or RateLimiter()
+    
+    def _fetch(self, page: int) -> Dict[str, Any]:
+        self.rate_limiter.wait()
+        return self.fetch_page(page=page, per_page=self.per_page, filters=self.filters)
+    
+    def _fetch_in_thread(self, page: int) -> Dict[str, Any]:
+        try:
+            return self._fetch(page)
+        finally:
+            # Клиент пишет логи запросов в БД, закрываем соединение рабочего потока
+            connections.close_all()
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        first = self._fetch(1)
+        yield first
+        
+        if not first.get('data'):
+            return
+        
+        total_pages = get_total_pages(first, self.per_page)
+        
+        if total_pages is None or self.max_workers == 1:
+            # Общее количество неизвестно - идем последовательно по hasNext
+            response, page = first, 1
+            while (response.get('pagination') or {}).get('hasNext', False):
+                page += 1
+                response = self._fetch(page)
+                if not response.get('data'):
+                    return
+                yield response
+            return
+        
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='moyklass-fetch')
+        pending = deque()
+        next_page = 2
+        try:
+            while next_page <= total_pages or pending:
+                # Держим в работе не больше max_workers страниц
+                while next_page <= total_pages and len(pending) < self.max_workers:
+                    pending.append(pool.submit(self._fetch_in_thread, next_page))
+                    next_page += 1
+                
+                response = pending.popleft().result()
+                if not response.get('data'):
+                    return
+                yield response
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,230 @@
+"""
+Отправка лидов в MoyKlass
+
+Лиды из форм записи и анкет не отправляются в потоке обработки заявки:
+они сохраняются в очередь MoyKlassPendingLead, а фоновый поток процесса
+собирает их в пачки (окно LEAD_BATCH_WINDOW секунд или LEAD_BATCH_SIZE лидов)
+и отправляет через общую HTTP-сессию клиента. ID тегов определяются один раз
+и кэшируются, поэтому список тегов не запрашивается для каждого лида.
+
+Если API MoyKlass недоступен, лиды остаются в очереди и отправляются позже
+с экспоненциальной задержкой (фоновым потоком или командой push_moyklass_leads).
+Результат отправки сохраняется для каждого лида. Если ответ на создание лида
+не пришел (таймаут чтения), перед повтором лид ищется в MoyKlass по телефону,
+чтобы не создать его дважды.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import MoyKlassPendingLead
+from .client import MoyKlassClient, MoyKlassAPIError, MoyKlassTimeoutError, MoyKlassUnavailableError
+from .mapping import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 10
+
+# Окно накопления пачки и ее максимальный размер
+LEAD_BATCH_WINDOW = 2.0
+LEAD_BATCH_SIZE = 20
+
+# На время отправки лид "арендуется": другой процесс не возьмет его,
+# а если процесс упадет, лид снова станет доступен по истечении аренды
+CLAIM_LEASE = timedelta(minutes=5)
+
+# Сколько фоновый поток ждет новых лидов, прежде чем завершиться
+PUSHER_IDLE_SECONDS = 60
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальная задержка между попытками: 1, 2, 4 ... 60 минут"""
+    return timedelta(minutes=min(2 ** max(attempts - 1, 0), 60))
+
+
+def submit_lead(
+    student_data: Dict[str, Any],
+    tags: Optional[List[str]] = None,
+    source: str = ''
+) -> MoyKlassPendingLead:
+    """Ставит лид в очередь на отправку и будит фоновую отправку пачкой"""
+    lead = MoyKlassPendingLead.objects.create(
+        source=source[:300],
+        student_data=student_data,
+        tags=tags or [],
+    )
+    transaction.on_commit(lead_pusher.notify)
+    return lead
+
+
+def _claim(leads: List[MoyKlassPendingLead]) -> List[MoyKlassPendingLead]:
+    """Захватывает лиды для отправки, пропуская уже взятые другим процессом"""
+    now = timezone.now()
+    claimed = []
+    for lead in leads:
+        updated = MoyKlassPendingLead.objects.filter(
+            pk=lead.pk, status='pending', next_attempt_at__lte=now
+        ).update(next_attempt_at=now + CLAIM_LEASE)
+        if updated:
+            claimed.append(lead)
+    return claimed
+
+
+def find_delivered_lead(client: MoyKlassClient, lead: MoyKlassPendingLead) -> Optional[Dict[str, Any]]:
+    """
+    Ищет в MoyKlass лид, созданный попыткой, которая не дождалась ответа
+    
+    Без телефона искать не по чему - такой лид будет отправлен повторно.
+    Теги на найденного ученика добавляются, так как до них прошлая попытка не дошла.
+    """
+    phone = normalize_phone(lead.student_data.get('phone'))
+    if not phone:
+        logger.warning(f'Лид {lead.id} без телефона отправляется повторно после таймаута')
+        return None
+    
+    student = client.find_student_by_phone(phone)
+    if student and lead.tags:
+        try:
+            client.add_tags_to_student(student['id'], lead.tags)
+        except MoyKlassAPIError as e:
+            logger.warning(f'Не удалось добавить теги к лиду {student["id"]}: {str(e)}')
+    return student
+
+
+def push_pending_leads(limit: int = LEAD_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Отправляет пачку лидов, для которых подошло время отправки
+    
+    Returns:
+        Словарь со счетчиками sent, retry, failed
+    """
+    results = {'sent': 0, 'retry': 0, 'failed': 0}
+    
+    leads = _claim(list(
+        MoyKlassPendingLead.objects
+        .filter(status='pending', next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at', 'id')[:limit]
+    ))
+    if not leads:
+        return results
+    
+    try:
+        client = MoyKlassClient()
+    except MoyKlassAPIError as e:
+        logger.warning(f'Очередь лидов MoyKlass не обработана: {str(e)}')
+        MoyKlassPendingLead.objects.filter(pk__in=[lead.pk for lead in leads]).update(
+            next_attempt_at=timezone.now() + get_retry_delay(1)
+        )
+        results['retry'] += len(leads)
+        return results
+    
+    for index, lead in enumerate(leads):
+        lead.attempts += 1
+        try:
+            result = find_delivered_lead(client, lead) if lead.delivery_unknown else None
+            if result:
+                logger.info(f'Лид {lead.id} уже создан в MoyKlass прошлой попыткой: ID={result.get("id")}')
+            else:
+                result = client.create_student(lead.student_data, tags=lead.tags)
+            lead.status = 'sent'
+            lead.moyklass_id = result.get('id')
+            lead.sent_at = timezone.now()
+            lead.last_error = ''
+            lead.delivery_unknown = False
+            results['sent'] += 1
+            logger.info(
+                f'Создан лид в MoyKlass: ID={lead.moyklass_id}, '
+                f'Имя={lead.student_data.get("name", "Не указано")}, '
+                f'Источник={lead.source}'
+            )
+        except MoyKlassUnavailableError as e:
+            # API недоступен - откладываем этот и все оставшиеся лиды пачки
+            if isinstance(e, MoyKlassTimeoutError):
+                # Лид мог быть создан - перед повтором проверим по телефону
+                lead.delivery_unknown = True
+            retry_at = timezone.now() + get_retry_delay(lead.attempts)
+            for pending in leads[index:]:
+                pending.next_attempt_at = retry_at
+                pending.last_error = str(e)
+                pending.save(update_fields=['attempts', 'next_attempt_at', 'last_error', 'delivery_unknown'])
+            results['retry'] += len(leads) - index
+            logger.warning(f'MoyKlass недоступен, отправка {len(leads) - index} лидов отложена: {str(e)}')
+            break
+        except MoyKlassAPIError as e:
+            lead.last_error = str(e)
+            if lead.attempts >= MAX_ATTEMPTS:
+                lead.status = 'failed'
+                results['failed'] += 1
+            else:
+                lead.next_attempt_at = timezone.now() + get_retry_delay(lead.attempts)
+                results['retry'] += 1
+            logger.error(f'Ошибка создания лида в MoyKlass (ID в очереди {lead.id}): {str(e)}')
+        lead.save()
+    
+    return results
+
+
+def drain_pending_leads(batch_size: int = LEAD_BATCH_SIZE) -> Dict[str, int]:
+    """Отправляет пачки, пока в очереди есть лиды, готовые к отправке"""
+    totals = {'sent': 0, 'retry': 0, 'failed': 0}
+    while True:
+        results = push_pending_leads(batch_size)
+        for key, value in results.items():
+            totals[key] += value
+        if not any(results.values()) or results['retry']:
+            # Очередь пуста или API недоступен - остаток отправится позже
+            return totals
+
+
+class LeadPusher:
+    """Фоновый поток процесса, отправляющий лиды пачками"""
+    
+    def __init__(self, window: float = LEAD_BATCH_WINDOW, batch_size: int = LEAD_BATCH_SIZE):
+        self.window = window
+        self.batch_size = batch_size
+        self._condition = threading.Condition()
+        self._waiting = 0
+        self._thread: Optional[threading.Thread] = None
+    
+    def notify(self):
+        """Сообщает о новом лиде в очереди"""
+        with self._condition:
+            self._waiting += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='moyklass-lead-pusher', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+    
+    def _wait_for_batch(self) -> bool:
+        """Ждет первый лид, затем копит пачку до окна или размера пачки"""
+        with self._condition:
+            if not self._waiting:
+                self._condition.wait(timeout=PUSHER_IDLE_SECONDS)
+            if not self._waiting:
+                self._thread = None
+                return False
+            
+            deadline = time.monotonic() + self.window
+            while self._waiting < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(timeout=remaining)
+            self._waiting = 0
+            return True
+    
+    def _run(self):
+        try:
+            while self._wait_for_batch():
+                try:
+                    drain_pending_leads(self.batch_size)
+                except Exception as e:
+                    logger.error(f'Ошибка отправки лидов в MoyKlass: {str(e)}', exc_info=True)
+        finally:
+            connection.close()
+
+
+lead_pusher = LeadPusher()
@@ -0,0 +1,151 @@
+"""
+Команда для замера производительности интеграции с MoyKlass
+
+Измеряет задержку создания лидов (MoyKlassClient.create_student) и скорость
+синхронизации (записей в секунду). Предназначена для локальной заглушки API:
+
+    python manage.py benchmark_moyklass --stub
+    python manage.py benchmark_moyklass --stub --latency 100 --error-429 0.05 --leads 200 --concurrency 4
+    python manage.py benchmark_moyklass --stub --students 20000 --sync
+    python manage.py benchmark_moyklass --url http://127.0.0.1:8765
+
+--sync записывает данные заглушки в локальные копии (MoyKlassStudent и др.)
+и сдвигает курсоры синхронизации - запускайте его только на локальной базе.
+"""
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from moyklass.models import MoyKlassSettings
+from moyklass.client import MoyKlassClient, MoyKlassAPIError
+from moyklass.sync import MoyKlassSync
+from moyklass.stub_server import start_stub_server
+from .moyklass_stub_server import add_stub_arguments, stub_config_from_options
+
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Замеряет задержку создания лидов и скорость синхронизации MoyKlass (на заглушке API)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Адрес API (по умолчанию: MOYKLASS_API_URL)')
+        parser.add_argument('--stub', action='store_true', help='Запустить заглушку API в этом процессе')
+        parser.add_argument('--leads', type=int, default=50, help='Количество создаваемых лидов (по умолчанию: 50)')
+        parser.add_argument('--concurrency', type=int, default=1, help='Потоков при создании лидов (по умолчанию: 1)')
+        parser.add_argument('--sync', action='store_true', help='Замерить полную синхронизацию (пишет в локальную базу)')
+        parser.add_argument('--log-requests', action='store_true', help='Писать логи запросов в БД, как в рабочем режиме')
+        parser.add_argument('--force', action='store_true', help='Разрешить запуск не на локальном адресе')
+        add_stub_arguments(parser)
+    
+    def handle(self, *args, **options):
+        moyklass_settings = MoyKlassSettings.objects.first()
+        if not moyklass_settings:
+            raise CommandError('Настройки MoyKlass не найдены. Создайте их в админке.')
+        
+        server = None
+        if options['stub']:
+            server = start_stub_server(config=stub_config_from_options(options))
+            host, port = server.server_address[:2]
+            url = f'http://{host}:{port}'
+        else:
+            url = options['url'] or django_settings.MOYKLASS_API_URL
+        
+        if urlparse(url).hostname not in LOCAL_HOSTS and not options['force']:
+            raise CommandError(f'{url} - не локальный адрес. Бенчмарк создает лиды; используйте --stub или --force.')
+        
+        # Токен рабочего API сохраняется и восстанавливается после замера
+        original_token = (moyklass_settings.access_token, moyklass_settings.token_expires_at)
+        moyklass_settings.access_token = ''
+        moyklass_settings.token_expires_at = None
+        moyklass_settings.is_active = True
+        moyklass_settings.log_requests = options['log_requests']
+        
+        self.stdout.write(f'API: {url}')
+        try:
+            with override_settings(MOYKLASS_API_URL=url):
+                if options['leads']:
+                    self._benchmark_leads(moyklass_settings, options['leads'], options['concurrency'])
+                if options['sync']:
+                    self._benchmark_sync(moyklass_settings)
+        finally:
+            moyklass_settings.access_token, moyklass_settings.token_expires_at = original_token
+            moyklass_settings.save(update_fields=['access_token', 'token_expires_at'])
+            if server:
+                server.shutdown()
+                server.server_close()
+                self.stdout.write(
+                    f'Заглушка: запросов {server.state.requests}, внедренных ошибок {server.state.injected_errors}'
+                )
+    
+    def _benchmark_leads(self, moyklass_settings, count, concurrency):
+        client = MoyKlassClient(moyklass_settings)
+        tags = [moyklass_settings.website_tag_name or 'Сайт']
+        
+        def create(index):
+            started = time.perf_counter()
+            try:
+                client.create_student({'name': f'Бенчмарк {index}', 'phone': f'7900{index:07d}'}, tags=tags)
+                return time.perf_counter() - started, None
+            except MoyKlassAPIError as e:
+                return time.perf_counter() - started, str(e)
+            finally:
+                if concurrency > 1:
+                    connection.close()
+        
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(create, range(count)))
+        else:
+            results = [create(index) for index in range(count)]
+        elapsed = time.perf_counter() - started
+        
+        latencies = [duration * 1000 for duration, error in results if not error]
+        errors = [error for _, error in results if error]
+        
+        self.stdout.write(self.style.SUCCESS(f'\nСоздание лидов ({count}, потоков: {concurrency}):'))
+        self.stdout.write(
+            f'  Успешно: {len(latencies)}, ошибок: {len(errors)}\n'
+            f'  Задержка, мс: p50 {statistics.median(latencies) if latencies else 0:.1f}, '
+            f'p95 {percentile(latencies, 95):.1f}, max {max(latencies, default=0):.1f}\n'
+            f'  Пропускная способность: {count / elapsed:.1f} лидов/с'
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f'  Первая ошибка: {errors[0]}'))
+    
+    def _benchmark_sync(self, moyklass_settings):
+        sync = MoyKlassSync(moyklass_settings)
+        self.stdout.write(self.style.SUCCESS(f'\nПолная синхронизация (параллельно страниц: {moyklass_settings.sync_concurrency}):'))
+        
+        for entity, sync_entity in (
+            ('students', sync.sync_students),
+            ('payments', sync.sync_payments),
+            ('bookings', sync.sync_bookings),
+        ):
+            started = time.perf_counter()
+            try:
+                results = sync_entity(full=True)
+            except MoyKlassAPIError as e:
+                self.stdout.write(self.style.ERROR(f'  {entity}: ошибка API: {e}'))
+                continue
+            elapsed = time.perf_counter() - started
+            
+            if results.get('skipped'):
+                self.stdout.write(f'  {entity}: пропущено ({results.get("message")})')
+                continue
+            self.stdout.write(
+                f'  {entity}: {results["processed"]} записей за {elapsed:.2f} с '
+                f'({results["processed"] / elapsed if elapsed else 0:.0f} записей/с), ошибок: {results["errors"]}'
+            )
@@ -0,0 +1,69 @@
+"""
+Команда для запуска локальной заглушки API MoyKlass
+
+Использование:
+    python manage.py moyklass_stub_server
+    python manage.py moyklass_stub_server --port 8765 --latency 80 --students 50000 --error-429 0.05
+
+Клиент направляется на заглушку переменной окружения:
+    MOYKLASS_API_URL=http://127.0.0.1:8765
+"""
+from django.core.management.base import BaseCommand
+from moyklass.stub_server import StubConfig, make_stub_server
+
+
+def add_stub_arguments(parser):
+    """Параметры заглушки (общие с benchmark_moyklass)"""
+    parser.add_argument('--latency', type=float, default=50, help='Задержка ответа, мс (по умолчанию: 50)')
+    parser.add_argument('--jitter', type=float, default=0, help='Случайная добавка к задержке, мс')
+    parser.add_argument('--max-per-page', type=int, default=100, help='Максимальный размер страницы (по умолчанию: 100)')
+    parser.add_argument('--students', type=int, default=1000, help='Количество учеников (по умолчанию: 1000)')
+    parser.add_argument('--payments', type=int, default=1000, help='Количество платежей (по умолчанию: 1000)')
+    parser.add_argument('--bookings', type=int, default=1000, help='Количество записей (по умолчанию: 1000)')
+    parser.add_argument('--error-401', type=float, default=0, help='Доля ответов 401 (0..1)')
+    parser.add_argument('--error-429', type=float, default=0, help='Доля ответов 429 (0..1)')
+    parser.add_argument('--error-5xx', type=float, default=0, help='Доля ответов 503 (0..1)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After для 429, с (по умолчанию: 1)')
+    parser.add_argument('--token-ttl', type=int, default=3600, help='Время жизни токена, с (по умолчанию: 3600)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed генератора данных')
+
+
+def stub_config_from_options(options) -> StubConfig:
+    return StubConfig(
+        latency_ms=options['latency'],
+        jitter_ms=options['jitter'],
+        max_per_page=options['max_per_page'],
+        students=options['students'],
+        payments=options['payments'],
+        bookings=options['bookings'],
+        error_401_rate=options['error_401'],
+        error_429_rate=options['error_429'],
+        error_5xx_rate=options['error_5xx'],
+        retry_after=options['retry_after'],
+        token_ttl=options['token_ttl'],
+        seed=options['seed'],
+    )
+
+
+class Command(BaseCommand):
+    help = 'Запускает локальную заглушку API MoyKlass для нагрузочной проверки'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес (по умолчанию: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8765, help='Порт (по умолчанию: 8765)')
+        add_stub_arguments(parser)
+    
+    def handle(self, *args, **options):
+        server = make_stub_server(options['host'], options['port'], stub_config_from_options(options))
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f'Заглушка MoyKlass запущена: http://{host}:{port}'))
+        self.stdout.write(f'Для клиента: MOYKLASS_API_URL=http://{host}:{port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(
+                f'Запросов: {server.state.requests}, внедренных ошибок: {server.state.injected_errors}'
+            )
@@ -0,0 +1,51 @@
+"""
+Команда для обработки очереди вебхуков MoyKlass
+
+Вебхуки обычно обрабатываются в фоне сразу после получения. Команда разбирает
+то, что осталось в очереди (например, после перезапуска сервера), и может
+работать постоянно или запускаться из cron.
+
+Использование:
+    python manage.py process_moyklass_webhooks
+    python manage.py process_moyklass_webhooks --loop --interval 10
+"""
+import time
+from django.core.management.base import BaseCommand
+from moyklass.webhooks import drain_queue
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь вебхуков MoyKlass'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Количество вебхуков в одной пачке (по умолчанию: 100)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проверяя очередь с интервалом --interval'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=10,
+            help='Интервал проверки очереди в секундах в режиме --loop (по умолчанию: 10)'
+        )
+    
+    def handle(self, *args, **options):
+        while True:
+            results = drain_queue(options['batch_size'])
+            if any(results.values()):
+                self.stdout.write(
+                    f'Обработано: {results["processed"]}, '
+                    f'пропущено: {results["ignored"]}, '
+                    f'ошибок: {results["errors"]}'
+                )
+            
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
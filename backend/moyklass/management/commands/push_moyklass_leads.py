@@ -0,0 +1,29 @@
+"""
+Команда для повторной отправки лидов, которые не удалось сразу передать в MoyKlass
+
+Использование (например, из cron раз в минуту):
+    python manage.py push_moyklass_leads
+    python manage.py push_moyklass_leads --limit 100
+"""
+from django.core.management.base import BaseCommand
+from moyklass.leads import push_pending_leads
+
+
+class Command(BaseCommand):
+    help = 'Повторно отправляет лиды из очереди в MoyKlass'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=50,
+            help='Максимум лидов за один запуск (по умолчанию: 50)'
+        )
+    
+    def handle(self, *args, **options):
+        results = push_pending_leads(options['limit'])
+        self.stdout.write(
+            f'Отправлено: {results["sent"]}, '
+            f'отложено: {results["retry"]}, '
+            f'не удалось отправить: {results["failed"]}'
+        )
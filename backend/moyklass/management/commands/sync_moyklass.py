@@ -5,7 +5,10 @@
     python manage.py sync_moyklass --type students
     python manage.py sync_moyklass --type payments
     python manage.py sync_moyklass --type bookings
+    python manage.py sync_moyklass --type groups   # группы и сотрудники для расписания
+    python manage.py sync_moyklass --type lessons  # предстоящие занятия со свободными местами
     python manage.py sync_moyklass --all
+    python manage.py sync_moyklass --all --full
 """
 from django.core.management.base import BaseCommand, CommandError
 from moyklass.models import MoyKlassSettings
@@ -28,6 +31,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Синхронизировать все включенные типы данных'
         )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Полная синхронизация: загрузить все записи, а не только измененные с прошлого запуска'
+        )
     
     def handle(self, *args, **options):
         settings = MoyKlassSettings.objects.first()
@@ -39,11 +47,13 @@ class Command(BaseCommand):
             raise CommandError('Интеграция MoyKlass неактивна. Включите её в админке.')
         
         sync = MoyKlassSync(settings)
+        full = options['full']
         
         try:
             if options['all']:
-                self.stdout.write('Начинаю полную синхронизацию...')
-                results = sync.sync_all()
+                mode = 'полную' if full else 'инкрементальную'
+                self.stdout.write(f'Начинаю {mode} синхронизацию всех данных...')
+                results = sync.sync_all(full=full)
                 
                 self.stdout.write(
                     self.style.SUCCESS(
@@ -60,13 +70,15 @@ class Command(BaseCommand):
                 self.stdout.write(f'Начинаю синхронизацию {sync_type}...')
                 
                 if sync_type == 'students':
-                    results = sync.sync_students()
+                    results = sync.sync_students(full=full)
                 elif sync_type == 'payments':
-                    results = sync.sync_payments()
+                    results = sync.sync_payments(full=full)
                 elif sync_type == 'bookings':
-                    results = sync.sync_bookings()
+                    results = sync.sync_bookings(full=full)
+                elif sync_type == 'groups':
+                    results = sync.sync_groups()
                 else:
-                    raise CommandError(f'Синхронизация {sync_type} еще не реализована')
+                    results = sync.sync_lessons()
                 
                 if results.get('skipped'):
                     self.stdout.write(
@@ -75,7 +87,7 @@ class Command(BaseCommand):
                 else:
                     self.stdout.write(
                         self.style.SUCCESS(
-                            f'\nСинхронизация {sync_type} завершена:\n'
+                            f'\nСинхронизация {sync_type} завершена ({results.get("mode")}):\n'
                             f'  Обработано: {results.get("processed", 0)}\n'
                             f'  Создано: {results.get("created", 0)}\n'
                             f'  Обновлено: {results.get("updated", 0)}\n'
@@ -0,0 +1,159 @@
+"""
+Скомпилированные планы маппинга полей формы/анкеты на поля MoyKlass
+
+План строится один раз для версии интеграции (MoyKlassIntegration.updated_at)
+и кэшируется в процессе. Формирование данных лида - один проход по маппингам
+с поиском по заранее построенному индексу ключей формы.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MissingRequiredFieldError(Exception):
+    """Обязательное поле маппинга не заполнено - лид не создается"""
+    
+    def __init__(self, moyklass_field: str, source_field_name: str):
+        self.moyklass_field = moyklass_field
+        self.source_field_name = source_field_name
+        super().__init__(f'Обязательное поле {moyklass_field} не заполнено (поле источника: {source_field_name})')
+
+
+def normalize_phone(value: Any) -> str:
+    """
+    Нормализует телефон для MoyKlass (требуется ^[0-9]{10,15}$)
+    
+    Returns:
+        Только цифры (не больше 15) или пустая строка, если цифр нет
+    """
+    phone = str(value or '').strip()
+    if phone.isdigit() and 10 <= len(phone) <= 15:
+        return phone
+    
+    phone_digits = ''.join(filter(str.isdigit, phone))
+    if not phone_digits:
+        if phone:
+            logger.warning(f'Не удалось нормализовать телефон из значения: "{phone}"')
+        return ''
+    
+    if len(phone_digits) < 10:
+        logger.warning(
+            f'Телефон слишком короткий: "{phone_digits}" (длина {len(phone_digits)}, требуется 10-15)'
+        )
+    elif len(phone_digits) > 15:
+        logger.warning(
+            f'Телефон слишком длинный: "{phone_digits}" (длина {len(phone_digits)}, требуется 10-15), обрезаем до 15'
+        )
+        phone_digits = phone_digits[:15]
+    
+    return phone_digits
+
+
+# Преобразования значений по полю MoyKlass (остальные поля передаются как есть)
+FIELD_TRANSFORMS: Dict[str, Callable[[Any], Any]] = {
+    'phone': normalize_phone,
+}
+
+
+class MappingStep(NamedTuple):
+    moyklass_field: str
+    source_key: str
+    source_key_lower: str
+    label: str
+    is_required: bool
+    default_value: str
+    transform: Optional[Callable[[Any], Any]]
+
+
+class MappingPlan:
+    """Скомпилированный маппинг полей одной интеграции"""
+    
+    __slots__ = ('integration_id', 'version', 'steps')
+    
+    def __init__(self, integration_id: int, version, steps: List[MappingStep]):
+        self.integration_id = integration_id
+        self.version = version
+        self.steps = steps
+    
+    def build(self, source_data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Формирует данные лида из данных формы/анкеты
+        
+        Returns:
+            Кортеж (данные лида без комментария, строки комментария из маппингов)
+        
+        Raises:
+            MissingRequiredFieldError: обязательное поле не заполнено
+        """
+        source_data = source_data or {}
+        # Регистронезависимый индекс ключей строится один раз на заявку
+        lower_index = {str(key).lower(): value for key, value in source_data.items()}
+        
+        student_data = {}
+        comment_parts = []
+        
+        for step in self.steps:
+            value = source_data.get(step.source_key)
+            if not value:
+                value = lower_index.get(step.source_key_lower)
+            if not value and step.default_value:
+                value = step.default_value
+            
+            if not value:
+                if step.is_required:
+                    raise MissingRequiredFieldError(step.moyklass_field, step.source_key)
+                continue
+            
+            if step.moyklass_field == 'comment':
+                comment_parts.append(f'{step.label}: {value}')
+                continue
+            
+            if step.transform:
+                value = step.transform(value)
+                if not value:
+                    continue
+            
+            student_data[step.moyklass_field] = value
+        
+        return student_data, comment_parts
+
+
+_plans: Dict[int, MappingPlan] = {}
+_plans_lock = threading.Lock()
+
+
+def compile_plan(integration) -> MappingPlan:
+    """Строит план маппинга для интеграции (один запрос к БД)"""
+    steps = [
+        MappingStep(
+            moyklass_field=mapping.moyklass_field,
+            source_key=mapping.source_field_name,
+            source_key_lower=mapping.source_field_name.lower(),
+            label=mapping.source_field_label or mapping.source_field_name,
+            is_required=mapping.is_required,
+            default_value=mapping.default_value,
+            transform=FIELD_TRANSFORMS.get(mapping.moyklass_field),
+        )
+        for mapping in integration.field_mappings.all().order_by('order', 'id')
+    ]
+    return MappingPlan(integration.id, integration.updated_at, steps)
+
+
+def get_mapping_plan(integration) -> MappingPlan:
+    """
+    Возвращает план маппинга из кэша процесса
+    
+    Версией служит integration.updated_at, который обновляется при любом
+    изменении маппингов (moyklass.signals), поэтому устаревший план
+    не используется ни в одном процессе.
+    """
+    plan = _plans.get(integration.id)
+    if plan is not None and plan.version == integration.updated_at:
+        return plan
+    
+    plan = compile_plan(integration)
+    with _plans_lock:
+        _plans[integration.id] = plan
+    return plan
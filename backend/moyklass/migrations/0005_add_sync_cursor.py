@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0004_add_website_tag_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoyKlassSyncCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('students', 'Ученики'), ('payments', 'Платежи'), ('bookings', 'Записи')], max_length=20, unique=True, verbose_name='Тип данных')),
+                ('synced_until', models.DateTimeField(blank=True, help_text='Момент начала последней успешной синхронизации. Следующий запуск запросит только записи, измененные после него.', null=True, verbose_name='Синхронизировано до')),
+                ('last_full_sync_at', models.DateTimeField(blank=True, null=True, verbose_name='Последняя полная синхронизация')),
+                ('last_records_count', models.IntegerField(default=0, verbose_name='Записей за последний запуск')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Курсор синхронизации',
+                'verbose_name_plural': 'Курсоры синхронизации',
+                'ordering': ['entity'],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:17
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0005_add_sync_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moyklasssettings',
+            name='api_rate_limit',
+            field=models.FloatField(default=5, help_text='Не отправлять к API MoyKlass больше указанного числа запросов в секунду', validators=[django.core.validators.MinValueValidator(0.5), django.core.validators.MaxValueValidator(50)], verbose_name='Лимит запросов в секунду'),
+        ),
+        migrations.AddField(
+            model_name='moyklasssettings',
+            name='sync_concurrency',
+            field=models.IntegerField(default=4, help_text='Сколько страниц загружать из API одновременно. 1 - последовательная загрузка', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(10)], verbose_name='Параллельных запросов при синхронизации'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0006_add_sync_concurrency_settings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoyKlassBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('moyklass_id', models.BigIntegerField(unique=True, verbose_name='ID в MoyKlass')),
+                ('student_moyklass_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='ID ученика в MoyKlass')),
+                ('group_moyklass_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='ID группы в MoyKlass')),
+                ('status_id', models.IntegerField(blank=True, null=True, verbose_name='ID статуса записи')),
+                ('remote_created_at', models.DateTimeField(blank=True, null=True, verbose_name='Создана в MoyKlass')),
+                ('remote_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Изменена в MoyKlass')),
+                ('raw_data', models.JSONField(blank=True, default=dict, verbose_name='Данные из API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Запись MoyKlass',
+                'verbose_name_plural': 'Записи MoyKlass',
+                'ordering': ['-remote_created_at', '-moyklass_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MoyKlassPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('moyklass_id', models.BigIntegerField(unique=True, verbose_name='ID в MoyKlass')),
+                ('student_moyklass_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='ID ученика в MoyKlass')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Сумма')),
+                ('date', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Дата платежа')),
+                ('operation_type', models.CharField(blank=True, max_length=50, verbose_name='Тип операции')),
+                ('comment', models.TextField(blank=True, verbose_name='Комментарий')),
+                ('raw_data', models.JSONField(blank=True, default=dict, verbose_name='Данные из API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Платеж MoyKlass',
+                'verbose_name_plural': 'Платежи MoyKlass',
+                'ordering': ['-date', '-moyklass_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MoyKlassStudent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('moyklass_id', models.BigIntegerField(unique=True, verbose_name='ID в MoyKlass')),
+                ('name', models.CharField(blank=True, max_length=300, verbose_name='Имя')),
+                ('phone', models.CharField(blank=True, db_index=True, max_length=20, verbose_name='Телефон')),
+                ('email', models.CharField(blank=True, max_length=254, verbose_name='Email')),
+                ('status_id', models.IntegerField(blank=True, null=True, verbose_name='ID статуса клиента')),
+                ('remote_created_at', models.DateTimeField(blank=True, null=True, verbose_name='Создан в MoyKlass')),
+                ('remote_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Изменен в MoyKlass')),
+                ('raw_data', models.JSONField(blank=True, default=dict, verbose_name='Данные из API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Ученик MoyKlass',
+                'verbose_name_plural': 'Ученики MoyKlass',
+                'ordering': ['-remote_updated_at', '-moyklass_id'],
+            },
+        ),
+    ]
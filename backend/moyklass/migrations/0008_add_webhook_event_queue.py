@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0007_add_mirror_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoyKlassWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(blank=True, max_length=100, verbose_name='Тип события')),
+                ('dedup_key', models.CharField(help_text='ID события или хэш тела запроса. Повторная доставка того же вебхука не создает новую запись', max_length=150, unique=True, verbose_name='Ключ дедупликации')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Данные события')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает обработки'), ('processed', 'Обработан'), ('ignored', 'Пропущен'), ('error', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Попыток обработки')),
+                ('error_message', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Получено')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Обработано')),
+            ],
+            options={
+                'verbose_name': 'Вебхук MoyKlass',
+                'verbose_name_plural': 'Вебхуки MoyKlass',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['status', 'id'], name='moyklass_mo_status_2a34bc_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:21
+
+import django.core.validators
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0008_add_webhook_event_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moyklasssettings',
+            name='api_max_in_flight',
+            field=models.IntegerField(default=4, help_text='Максимум одновременных запросов к API в одном процессе. Если API отвечает медленно, лишние запросы отклоняются и ставятся в очередь на повтор', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)], verbose_name='Одновременных запросов к API'),
+        ),
+        migrations.CreateModel(
+            name='MoyKlassPendingLead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(blank=True, max_length=300, verbose_name='Источник')),
+                ('student_data', models.JSONField(default=dict, verbose_name='Данные лида')),
+                ('tags', models.JSONField(blank=True, default=list, verbose_name='Теги')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлен'), ('failed', 'Не удалось отправить')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Попыток отправки')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('moyklass_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID в MoyKlass')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Отправлено')),
+            ],
+            options={
+                'verbose_name': 'Лид в очереди на отправку',
+                'verbose_name_plural': 'Лиды в очереди на отправку',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='moyklass_mo_status_4d31f4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0009_add_transport_limits_and_pending_leads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoyKlassGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('moyklass_id', models.BigIntegerField(unique=True, verbose_name='ID в MoyKlass')),
+                ('name', models.CharField(blank=True, max_length=300, verbose_name='Название')),
+                ('course_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID программы')),
+                ('filial_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='ID филиала')),
+                ('status', models.CharField(blank=True, max_length=50, verbose_name='Статус')),
+                ('max_students', models.IntegerField(blank=True, null=True, verbose_name='Мест в группе')),
+                ('teacher_ids', models.JSONField(blank=True, default=list, verbose_name='ID преподавателей')),
+                ('raw_data', models.JSONField(blank=True, default=dict, verbose_name='Данные из API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Группа MoyKlass',
+                'verbose_name_plural': 'Группы MoyKlass',
+                'ordering': ['name', 'moyklass_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MoyKlassStaff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('moyklass_id', models.BigIntegerField(unique=True, verbose_name='ID в MoyKlass')),
+                ('name', models.CharField(blank=True, max_length=300, verbose_name='Имя')),
+                ('filial_ids', models.JSONField(blank=True, default=list, verbose_name='ID филиалов')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Работает')),
+                ('raw_data', models.JSONField(blank=True, default=dict, verbose_name='Данные из API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Сотрудник MoyKlass',
+                'verbose_name_plural': 'Сотрудники MoyKlass',
+                'ordering': ['name', 'moyklass_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MoyKlassLesson',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('moyklass_id', models.BigIntegerField(unique=True, verbose_name='ID в MoyKlass')),
+                ('group_moyklass_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='ID группы в MoyKlass')),
+                ('filial_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID филиала')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('begin_time', models.TimeField(blank=True, null=True, verbose_name='Начало')),
+                ('end_time', models.TimeField(blank=True, null=True, verbose_name='Окончание')),
+                ('room_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID аудитории')),
+                ('status', models.IntegerField(blank=True, null=True, verbose_name='Статус')),
+                ('topic', models.CharField(blank=True, max_length=300, verbose_name='Тема')),
+                ('teacher_ids', models.JSONField(blank=True, default=list, verbose_name='ID преподавателей')),
+                ('booked_count', models.IntegerField(default=0, verbose_name='Записано')),
+                ('max_students', models.IntegerField(blank=True, null=True, verbose_name='Мест')),
+                ('free_seats', models.IntegerField(blank=True, help_text='Пусто, если количество мест в группе не ограничено', null=True, verbose_name='Свободных мест')),
+                ('raw_data', models.JSONField(blank=True, default=dict, verbose_name='Данные из API')),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Занятие MoyKlass',
+                'verbose_name_plural': 'Занятия MoyKlass',
+                'ordering': ['date', 'begin_time', 'moyklass_id'],
+                'indexes': [models.Index(fields=['filial_id', 'date'], name='moyklass_mo_filial__0c3ab9_idx'), models.Index(fields=['date', 'begin_time'], name='moyklass_mo_date_9eb793_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0010_add_schedule_mirror'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moyklasssettings',
+            name='schedule_synced_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Расписание синхронизировано'),
+        ),
+    ]
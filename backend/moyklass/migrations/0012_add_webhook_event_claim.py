@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0011_add_schedule_synced_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moyklasswebhookevent',
+            name='claim_token',
+            field=models.CharField(blank=True, db_index=True, help_text='Токен обработчика, который применяет событие. Пусто - событие свободно', max_length=32, verbose_name='Захвачено обработчиком'),
+        ),
+        migrations.AddField(
+            model_name='moyklasswebhookevent',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Захвачено'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moyklass', '0012_add_webhook_event_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moyklasspendinglead',
+            name='delivery_unknown',
+            field=models.BooleanField(default=False, help_text='Последняя попытка не дождалась ответа: перед повтором лид ищется в MoyKlass по телефону', verbose_name='Результат отправки неизвестен'),
+        ),
+    ]
@@ -5,6 +5,9 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 
+WEBHOOK_ENABLED_CACHE_KEY = 'moyklass_webhook_enabled'
+
+
 class MoyKlassSettings(models.Model):
     """Настройки интеграции с MoyKlass CRM"""
     
@@ -52,6 +55,25 @@ class MoyKlassSettings(models.Model):
     sync_bookings = models.BooleanField('Синхронизировать записи', default=True)
     sync_groups = models.BooleanField('Синхронизировать группы', default=False)
     sync_lessons = models.BooleanField('Синхронизировать занятия', default=False)
+    sync_concurrency = models.IntegerField(
+        'Параллельных запросов при синхронизации',
+        default=4,
+        validators=[MinValueValidator(1), MaxValueValidator(10)],
+        help_text='Сколько страниц загружать из API одновременно. 1 - последовательная загрузка'
+    )
+    api_rate_limit = models.FloatField(
+        'Лимит запросов в секунду',
+        default=5,
+        validators=[MinValueValidator(0.5), MaxValueValidator(50)],
+        help_text='Не отправлять к API MoyKlass больше указанного числа запросов в секунду'
+    )
+    api_max_in_flight = models.IntegerField(
+        'Одновременных запросов к API',
+        default=4,
+        validators=[MinValueValidator(1), MaxValueValidator(20)],
+        help_text='Максимум одновременных запросов к API в одном процессе. '
+                  'Если API отвечает медленно, лишние запросы отклоняются и ставятся в очередь на повтор'
+    )
     
     # Настройки вебхуков
     webhook_enabled = models.BooleanField(
@@ -86,6 +108,9 @@ class MoyKlassSettings(models.Model):
         help_text='ID тега в MoyKlass (заполняется автоматически при выборе тега)'
     )
     
+    # Версия кэша расписания: меняется после каждой синхронизации групп и занятий
+    schedule_synced_at = models.DateTimeField('Расписание синхронизировано', null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField('Создано', auto_now_add=True)
     updated_at = models.DateTimeField('Обновлено', auto_now=True)
     
@@ -100,6 +125,19 @@ class MoyKlassSettings(models.Model):
         # Разрешаем только одну запись настроек
         self.pk = 1
         super().save(*args, **kwargs)
+        from django.core.cache import cache
+        cache.delete(WEBHOOK_ENABLED_CACHE_KEY)
+    
+    @classmethod
+    def webhooks_enabled(cls):
+        """Включены ли вебхуки (кэшируется, чтобы не читать настройки на каждый вебхук)"""
+        from django.core.cache import cache
+        enabled = cache.get(WEBHOOK_ENABLED_CACHE_KEY)
+        if enabled is None:
+            settings = cls.objects.only('webhook_enabled').first()
+            enabled = bool(settings and settings.webhook_enabled)
+            cache.set(WEBHOOK_ENABLED_CACHE_KEY, enabled, 60)
+        return enabled
     
     def is_token_valid(self):
         """Проверяет, действителен ли токен"""
@@ -335,3 +373,422 @@ class MoyKlassFieldMapping(models.Model):
     def __str__(self):
         source_name = self.source_field_label or self.source_field_name
         return f'{self.get_moyklass_field_display()} ← {source_name}'
+
+
+class MoyKlassSyncCursor(models.Model):
+    """Курсор инкрементальной синхронизации для одного типа данных"""
+    
+    ENTITY_CHOICES = [
+        ('students', 'Ученики'),
+        ('payments', 'Платежи'),
+        ('bookings', 'Записи'),
+    ]
+    
+    entity = models.CharField('Тип данных', max_length=20, choices=ENTITY_CHOICES, unique=True)
+    synced_until = models.DateTimeField(
+        'Синхронизировано до',
+        null=True,
+        blank=True,
+        help_text='Момент начала последней успешной синхронизации. Следующий запуск запросит только записи, измененные после него.'
+    )
+    last_full_sync_at = models.DateTimeField('Последняя полная синхронизация', null=True, blank=True)
+    last_records_count = models.IntegerField('Записей за последний запуск', default=0)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Курсор синхронизации'
+        verbose_name_plural = 'Курсоры синхронизации'
+        ordering = ['entity']
+    
+    def __str__(self):
+        return f'{self.get_entity_display()}: {self.synced_until or "полная синхронизация"}'
+
+
+def _digits(value) -> str:
+    """Оставляет в значении только цифры (для телефонов)"""
+    return ''.join(filter(str.isdigit, str(value or '')))
+
+
+def _parse_datetime(value):
+    """Разбирает дату/время из ответа API MoyKlass"""
+    from django.utils.dateparse import parse_datetime, parse_date
+    from datetime import datetime, time as dt_time
+    
+    if not value:
+        return None
+    parsed = parse_datetime(str(value).replace('Z', '+00:00'))
+    if parsed is None:
+        day = parse_date(str(value))
+        if day is None:
+            return None
+        parsed = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class MoyKlassStudent(models.Model):
+    """Локальная копия ученика/лида из MoyKlass"""
+    
+    UPSERT_FIELDS = ['name', 'phone', 'email', 'status_id', 'remote_created_at', 'remote_updated_at', 'raw_data', 'synced_at']
+    
+    moyklass_id = models.BigIntegerField('ID в MoyKlass', unique=True)
+    name = models.CharField('Имя', max_length=300, blank=True)
+    phone = models.CharField('Телефон', max_length=20, blank=True, db_index=True)
+    email = models.CharField('Email', max_length=254, blank=True)
+    status_id = models.IntegerField('ID статуса клиента', null=True, blank=True)
+    remote_created_at = models.DateTimeField('Создан в MoyKlass', null=True, blank=True)
+    remote_updated_at = models.DateTimeField('Изменен в MoyKlass', null=True, blank=True)
+    raw_data = models.JSONField('Данные из API', default=dict, blank=True)
+    synced_at = models.DateTimeField('Синхронизировано', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Ученик MoyKlass'
+        verbose_name_plural = 'Ученики MoyKlass'
+        ordering = ['-remote_updated_at', '-moyklass_id']
+    
+    def __str__(self):
+        return f'{self.name or "Без имени"} ({self.moyklass_id})'
+    
+    @classmethod
+    def from_api(cls, data):
+        """Создает (несохраненный) объект из записи API /company/users"""
+        return cls(
+            moyklass_id=data['id'],
+            name=(data.get('name') or '')[:300],
+            phone=_digits(data.get('phone'))[:20],
+            email=(data.get('email') or '')[:254],
+            status_id=data.get('clientStateId'),
+            remote_created_at=_parse_datetime(data.get('createdAt')),
+            remote_updated_at=_parse_datetime(data.get('updatedAt')),
+            raw_data=data,
+            synced_at=timezone.now(),
+        )
+    
+    @classmethod
+    def find_by_phone(cls, phone):
+        """Ищет учеников по телефону в любом формате"""
+        digits = _digits(phone)
+        if not digits:
+            return cls.objects.none()
+        # Российские номера могут быть записаны через 8, 7 или без кода страны
+        variants = {digits}
+        if len(digits) >= 10:
+            variants.update({digits[-10:], '7' + digits[-10:], '8' + digits[-10:]})
+        return cls.objects.filter(phone__in=variants)
+
+
+class MoyKlassPayment(models.Model):
+    """Локальная копия платежа из MoyKlass"""
+    
+    UPSERT_FIELDS = ['student_moyklass_id', 'amount', 'date', 'operation_type', 'comment', 'raw_data', 'synced_at']
+    
+    moyklass_id = models.BigIntegerField('ID в MoyKlass', unique=True)
+    student_moyklass_id = models.BigIntegerField('ID ученика в MoyKlass', null=True, blank=True, db_index=True)
+    amount = models.DecimalField('Сумма', max_digits=12, decimal_places=2, default=0)
+    date = models.DateTimeField('Дата платежа', null=True, blank=True, db_index=True)
+    operation_type = models.CharField('Тип операции', max_length=50, blank=True)
+    comment = models.TextField('Комментарий', blank=True)
+    raw_data = models.JSONField('Данные из API', default=dict, blank=True)
+    synced_at = models.DateTimeField('Синхронизировано', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Платеж MoyKlass'
+        verbose_name_plural = 'Платежи MoyKlass'
+        ordering = ['-date', '-moyklass_id']
+    
+    def __str__(self):
+        return f'Платеж {self.moyklass_id}: {self.amount}'
+    
+    @classmethod
+    def from_api(cls, data):
+        """Создает (несохраненный) объект из записи API /company/payments"""
+        return cls(
+            moyklass_id=data['id'],
+            student_moyklass_id=data.get('userId'),
+            amount=data.get('summa') or 0,
+            date=_parse_datetime(data.get('date') or data.get('createdAt')),
+            operation_type=str(data.get('optype') or '')[:50],
+            comment=data.get('comment') or '',
+            raw_data=data,
+            synced_at=timezone.now(),
+        )
+
+
+class MoyKlassBooking(models.Model):
+    """Локальная копия записи в группу из MoyKlass"""
+    
+    UPSERT_FIELDS = ['student_moyklass_id', 'group_moyklass_id', 'status_id', 'remote_created_at', 'remote_updated_at', 'raw_data', 'synced_at']
+    
+    moyklass_id = models.BigIntegerField('ID в MoyKlass', unique=True)
+    student_moyklass_id = models.BigIntegerField('ID ученика в MoyKlass', null=True, blank=True, db_index=True)
+    group_moyklass_id = models.BigIntegerField('ID группы в MoyKlass', null=True, blank=True, db_index=True)
+    status_id = models.IntegerField('ID статуса записи', null=True, blank=True)
+    remote_created_at = models.DateTimeField('Создана в MoyKlass', null=True, blank=True)
+    remote_updated_at = models.DateTimeField('Изменена в MoyKlass', null=True, blank=True)
+    raw_data = models.JSONField('Данные из API', default=dict, blank=True)
+    synced_at = models.DateTimeField('Синхронизировано', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Запись MoyKlass'
+        verbose_name_plural = 'Записи MoyKlass'
+        ordering = ['-remote_created_at', '-moyklass_id']
+    
+    def __str__(self):
+        return f'Запись {self.moyklass_id} (ученик {self.student_moyklass_id}, группа {self.group_moyklass_id})'
+    
+    @classmethod
+    def from_api(cls, data):
+        """Создает (несохраненный) объект из записи API /company/bookings"""
+        return cls(
+            moyklass_id=data['id'],
+            student_moyklass_id=data.get('userId'),
+            group_moyklass_id=data.get('classId') or data.get('groupId'),
+            status_id=data.get('statusId'),
+            remote_created_at=_parse_datetime(data.get('createdAt')),
+            remote_updated_at=_parse_datetime(data.get('updatedAt')),
+            raw_data=data,
+            synced_at=timezone.now(),
+        )
+
+
+def _parse_date(value):
+    """Разбирает дату (YYYY-MM-DD) из ответа API MoyKlass"""
+    from django.utils.dateparse import parse_date
+    
+    if not value:
+        return None
+    return parse_date(str(value)[:10])
+
+
+def _parse_time(value):
+    """Разбирает время (HH:MM) из ответа API MoyKlass"""
+    from django.utils.dateparse import parse_time
+    
+    if not value:
+        return None
+    return parse_time(str(value))
+
+
+class MoyKlassGroup(models.Model):
+    """Локальная копия группы из MoyKlass (для расписания на сайте)"""
+    
+    UPSERT_FIELDS = ['name', 'course_id', 'filial_id', 'status', 'max_students', 'teacher_ids', 'raw_data', 'synced_at']
+    
+    moyklass_id = models.BigIntegerField('ID в MoyKlass', unique=True)
+    name = models.CharField('Название', max_length=300, blank=True)
+    course_id = models.BigIntegerField('ID программы', null=True, blank=True)
+    filial_id = models.BigIntegerField('ID филиала', null=True, blank=True, db_index=True)
+    status = models.CharField('Статус', max_length=50, blank=True)
+    max_students = models.IntegerField('Мест в группе', null=True, blank=True)
+    teacher_ids = models.JSONField('ID преподавателей', default=list, blank=True)
+    raw_data = models.JSONField('Данные из API', default=dict, blank=True)
+    synced_at = models.DateTimeField('Синхронизировано', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Группа MoyKlass'
+        verbose_name_plural = 'Группы MoyKlass'
+        ordering = ['name', 'moyklass_id']
+    
+    def __str__(self):
+        return self.name or f'Группа {self.moyklass_id}'
+    
+    @classmethod
+    def from_api(cls, data):
+        """Создает (несохраненный) объект из записи API /company/groups"""
+        return cls(
+            moyklass_id=data['id'],
+            name=(data.get('name') or '')[:300],
+            course_id=data.get('courseId'),
+            filial_id=data.get('filialId'),
+            status=str(data.get('status') or '')[:50],
+            max_students=data.get('maxStudents'),
+            teacher_ids=list(data.get('teacherIds') or []),
+            raw_data=data,
+            synced_at=timezone.now(),
+        )
+
+
+class MoyKlassLesson(models.Model):
+    """Локальная копия предстоящего занятия из MoyKlass со свободными местами"""
+    
+    UPSERT_FIELDS = [
+        'group_moyklass_id', 'filial_id', 'date', 'begin_time', 'end_time', 'room_id', 'status',
+        'topic', 'teacher_ids', 'booked_count', 'max_students', 'free_seats', 'raw_data', 'synced_at'
+    ]
+    
+    moyklass_id = models.BigIntegerField('ID в MoyKlass', unique=True)
+    group_moyklass_id = models.BigIntegerField('ID группы в MoyKlass', null=True, blank=True, db_index=True)
+    filial_id = models.BigIntegerField('ID филиала', null=True, blank=True)
+    date = models.DateField('Дата')
+    begin_time = models.TimeField('Начало', null=True, blank=True)
+    end_time = models.TimeField('Окончание', null=True, blank=True)
+    room_id = models.BigIntegerField('ID аудитории', null=True, blank=True)
+    status = models.IntegerField('Статус', null=True, blank=True)
+    topic = models.CharField('Тема', max_length=300, blank=True)
+    teacher_ids = models.JSONField('ID преподавателей', default=list, blank=True)
+    booked_count = models.IntegerField('Записано', default=0)
+    max_students = models.IntegerField('Мест', null=True, blank=True)
+    free_seats = models.IntegerField(
+        'Свободных мест',
+        null=True,
+        blank=True,
+        help_text='Пусто, если количество мест в группе не ограничено'
+    )
+    raw_data = models.JSONField('Данные из API', default=dict, blank=True)
+    synced_at = models.DateTimeField('Синхронизировано', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Занятие MoyKlass'
+        verbose_name_plural = 'Занятия MoyKlass'
+        ordering = ['date', 'begin_time', 'moyklass_id']
+        indexes = [
+            models.Index(fields=['filial_id', 'date']),
+            models.Index(fields=['date', 'begin_time']),
+        ]
+    
+    def __str__(self):
+        return f'Занятие {self.moyklass_id} ({self.date} {self.begin_time or ""})'
+    
+    @classmethod
+    def from_api(cls, data):
+        """Создает (несохраненный) объект из записи API /company/lessons (с includeRecords)"""
+        lesson_date = _parse_date(data.get('date'))
+        if lesson_date is None:
+            raise ValueError(f'Занятие {data["id"]} без даты')
+        return cls(
+            moyklass_id=data['id'],
+            group_moyklass_id=data.get('classId') or data.get('groupId'),
+            filial_id=data.get('filialId'),
+            date=lesson_date,
+            begin_time=_parse_time(data.get('beginTime')),
+            end_time=_parse_time(data.get('endTime')),
+            room_id=data.get('roomId'),
+            status=data.get('status'),
+            topic=(data.get('topic') or '')[:300],
+            teacher_ids=list(data.get('teacherIds') or []),
+            booked_count=len(data.get('records') or []),
+            max_students=data.get('maxStudents'),
+            raw_data=data,
+            synced_at=timezone.now(),
+        )
+    
+    def set_capacity(self, group_max_students=None):
+        """Рассчитывает свободные места (вместимость занятия или группы минус записанные)"""
+        self.max_students = self.max_students or group_max_students
+        self.free_seats = max(0, self.max_students - self.booked_count) if self.max_students else None
+
+
+class MoyKlassStaff(models.Model):
+    """Локальная копия сотрудника (преподавателя) из MoyKlass"""
+    
+    UPSERT_FIELDS = ['name', 'filial_ids', 'is_active', 'raw_data', 'synced_at']
+    
+    moyklass_id = models.BigIntegerField('ID в MoyKlass', unique=True)
+    name = models.CharField('Имя', max_length=300, blank=True)
+    filial_ids = models.JSONField('ID филиалов', default=list, blank=True)
+    is_active = models.BooleanField('Работает', default=True)
+    raw_data = models.JSONField('Данные из API', default=dict, blank=True)
+    synced_at = models.DateTimeField('Синхронизировано', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Сотрудник MoyKlass'
+        verbose_name_plural = 'Сотрудники MoyKlass'
+        ordering = ['name', 'moyklass_id']
+    
+    def __str__(self):
+        return self.name or f'Сотрудник {self.moyklass_id}'
+    
+    @classmethod
+    def from_api(cls, data):
+        """Создает (несохраненный) объект из записи API /company/staff"""
+        return cls(
+            moyklass_id=data['id'],
+            name=(data.get('name') or '')[:300],
+            filial_ids=list(data.get('filials') or data.get('filialIds') or []),
+            is_active=bool(data.get('active', True)),
+            raw_data=data,
+            synced_at=timezone.now(),
+        )
+
+
+class MoyKlassWebhookEvent(models.Model):
+    """Входящий вебхук MoyKlass, ожидающий обработки"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает обработки'),
+        ('processed', 'Обработан'),
+        ('ignored', 'Пропущен'),
+        ('error', 'Ошибка'),
+    ]
+    
+    event_type = models.CharField('Тип события', max_length=100, blank=True)
+    dedup_key = models.CharField(
+        'Ключ дедупликации',
+        max_length=150,
+        unique=True,
+        help_text='ID события или хэш тела запроса. Повторная доставка того же вебхука не создает новую запись'
+    )
+    payload = models.JSONField('Данные события', default=dict, blank=True)
+    status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField('Попыток обработки', default=0)
+    error_message = models.TextField('Ошибка', blank=True)
+    claim_token = models.CharField(
+        'Захвачено обработчиком',
+        max_length=32,
+        blank=True,
+        db_index=True,
+        help_text='Токен обработчика, который применяет событие. Пусто - событие свободно'
+    )
+    claimed_at = models.DateTimeField('Захвачено', null=True, blank=True)
+    received_at = models.DateTimeField('Получено', auto_now_add=True)
+    processed_at = models.DateTimeField('Обработано', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Вебхук MoyKlass'
+        verbose_name_plural = 'Вебхуки MoyKlass'
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f'{self.event_type or "Событие"} - {self.get_status_display()} ({self.received_at})'
+
+
+class MoyKlassPendingLead(models.Model):
+    """Лид из формы или анкеты в очереди на отправку в MoyKlass (отправляется пачками, с повторами)"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sent', 'Отправлен'),
+        ('failed', 'Не удалось отправить'),
+    ]
+    
+    source = models.CharField('Источник', max_length=300, blank=True)
+    student_data = models.JSONField('Данные лида', default=dict)
+    tags = models.JSONField('Теги', default=list, blank=True)
+    status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField('Попыток отправки', default=0)
+    next_attempt_at = models.DateTimeField('Следующая попытка', default=timezone.now)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    moyklass_id = models.BigIntegerField('ID в MoyKlass', null=True, blank=True)
+    delivery_unknown = models.BooleanField(
+        'Результат отправки неизвестен',
+        default=False,
+        help_text='Последняя попытка не дождалась ответа: перед повтором лид ищется в MoyKlass по телефону'
+    )
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Отправлено', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Лид в очереди на отправку'
+        verbose_name_plural = 'Лиды в очереди на отправку'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        name = self.student_data.get('name') or 'Без имени'
+        return f'{name} - {self.get_status_display()}'
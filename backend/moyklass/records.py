@@ -0,0 +1,125 @@
+"""
+Компактные записи API MoyKlass
+
+Используются при потоковом обходе больших списков (MoyKlassClient.iter_*),
+когда полный словарь ответа API не нужен: кортеж с нужными полями занимает
+в разы меньше памяти. Даты передаются как есть (строки API), без разбора.
+"""
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+def _ids(value) -> Tuple[int, ...]:
+    """Приводит список ID из ответа API к кортежу"""
+    return tuple(value or ())
+
+
+class StudentRecord(NamedTuple):
+    id: int
+    name: str
+    phone: str
+    email: str
+    status_id: Optional[int]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+    
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> 'StudentRecord':
+        return cls(
+            data['id'],
+            data.get('name') or '',
+            data.get('phone') or '',
+            data.get('email') or '',
+            data.get('clientStateId'),
+            data.get('createdAt'),
+            data.get('updatedAt'),
+        )
+
+
+class PaymentRecord(NamedTuple):
+    id: int
+    student_id: Optional[int]
+    amount: float
+    date: Optional[str]
+    operation_type: str
+    comment: str
+    
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> 'PaymentRecord':
+        return cls(
+            data['id'],
+            data.get('userId'),
+            data.get('summa') or 0,
+            data.get('date') or data.get('createdAt'),
+            str(data.get('optype') or ''),
+            data.get('comment') or '',
+        )
+
+
+class BookingRecord(NamedTuple):
+    id: int
+    student_id: Optional[int]
+    group_id: Optional[int]
+    status_id: Optional[int]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+    
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> 'BookingRecord':
+        return cls(
+            data['id'],
+            data.get('userId'),
+            data.get('classId') or data.get('groupId'),
+            data.get('statusId'),
+            data.get('createdAt'),
+            data.get('updatedAt'),
+        )
+
+
+class GroupRecord(NamedTuple):
+    id: int
+    name: str
+    course_id: Optional[int]
+    filial_id: Optional[int]
+    status: str
+    begin_date: Optional[str]
+    max_students: Optional[int]
+    teacher_ids: Tuple[int, ...]
+    
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> 'GroupRecord':
+        return cls(
+            data['id'],
+            data.get('name') or '',
+            data.get('courseId'),
+            data.get('filialId'),
+            str(data.get('status') or ''),
+            data.get('beginDate'),
+            data.get('maxStudents'),
+            _ids(data.get('teacherIds')),
+        )
+
+
+class LessonRecord(NamedTuple):
+    id: int
+    group_id: Optional[int]
+    date: Optional[str]
+    begin_time: Optional[str]
+    end_time: Optional[str]
+    room_id: Optional[int]
+    status: Optional[int]
+    topic: str
+    teacher_ids: Tuple[int, ...]
+    
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> 'LessonRecord':
+        return cls(
+            data['id'],
+            data.get('classId') or data.get('groupId'),
+            data.get('date'),
+            data.get('beginTime'),
+            data.get('endTime'),
+            data.get('roomId'),
+            data.get('status'),
+            data.get('topic') or '',
+            _ids(data.get('teacherIds')),
+        )
@@ -0,0 +1,103 @@
+"""
+Расписание MoyKlass для страниц записи
+
+Группы, предстоящие занятия и преподаватели периодически синхронизируются
+в локальные таблицы (MoyKlassSync.sync_groups / sync_lessons), а страницы сайта
+читают расписание только из них. Ответы кэшируются; после каждой синхронизации
+версия кэша меняется, и все сохраненные ответы сразу становятся неактуальными.
+Версия хранится в БД (MoyKlassSettings.schedule_synced_at), а не в кэше:
+синхронизация обычно идет в отдельном процессе (cron, команда), а локальный
+кэш у каждого процесса свой.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+from django.core.cache import cache
+from django.utils import timezone
+from .models import MoyKlassGroup, MoyKlassLesson, MoyKlassSettings, MoyKlassStaff
+
+# На сколько дней вперед синхронизируются и отдаются занятия
+SCHEDULE_DAYS_AHEAD = 30
+
+SCHEDULE_CACHE_TTL = 300
+
+
+def get_schedule_version() -> int:
+    """Версия кэша расписания - время последней синхронизации расписания"""
+    synced_at = MoyKlassSettings.objects.filter(pk=1).values_list('schedule_synced_at', flat=True).first()
+    return int(synced_at.timestamp() * 1000000) if synced_at else 0
+
+
+def invalidate_schedule_cache():
+    """Сбрасывает кэш расписания во всех процессах (вызывается после синхронизации)"""
+    MoyKlassSettings.objects.filter(pk=1).update(schedule_synced_at=timezone.now())
+
+
+def build_schedule(
+    filial_id: Optional[int],
+    date_from: date,
+    date_to: date,
+    only_free: bool = False
+) -> Dict[str, Any]:
+    """Собирает расписание из локальных таблиц (три запроса к БД)"""
+    lessons = MoyKlassLesson.objects.filter(date__gte=date_from, date__lte=date_to)
+    groups = MoyKlassGroup.objects.all()
+    if filial_id:
+        lessons = lessons.filter(filial_id=filial_id)
+        groups = groups.filter(filial_id=filial_id)
+    if only_free:
+        # Занятия без ограничения мест (free_seats пусто) тоже доступны для записи
+        lessons = lessons.exclude(free_seats=0)
+    
+    lessons = list(lessons.values(
+        'moyklass_id', 'group_moyklass_id', 'date', 'begin_time', 'end_time',
+        'topic', 'teacher_ids', 'max_students', 'free_seats'
+    ))
+    group_names = dict(groups.values_list('moyklass_id', 'name'))
+    
+    staff_names = {}
+    teachers = []
+    for staff in MoyKlassStaff.objects.filter(is_active=True).values('moyklass_id', 'name', 'filial_ids'):
+        staff_names[staff['moyklass_id']] = staff['name']
+        if not filial_id or filial_id in staff['filial_ids']:
+            teachers.append({'id': staff['moyklass_id'], 'name': staff['name']})
+    
+    return {
+        'filial_id': filial_id,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'lessons': [
+            {
+                'id': lesson['moyklass_id'],
+                'group_id': lesson['group_moyklass_id'],
+                'group_name': group_names.get(lesson['group_moyklass_id'], ''),
+                'date': lesson['date'].isoformat(),
+                'begin_time': lesson['begin_time'].strftime('%H:%M') if lesson['begin_time'] else None,
+                'end_time': lesson['end_time'].strftime('%H:%M') if lesson['end_time'] else None,
+                'topic': lesson['topic'],
+                'teachers': [staff_names[t] for t in lesson['teacher_ids'] if t in staff_names],
+                'max_students': lesson['max_students'],
+                'free_seats': lesson['free_seats'],
+            }
+            for lesson in lessons
+        ],
+        'teachers': teachers,
+    }
+
+
+def get_schedule(
+    filial_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    only_free: bool = False
+) -> Dict[str, Any]:
+    """Возвращает расписание из кэша (при промахе - из локальных таблиц)"""
+    today = timezone.localdate()
+    date_from = max(date_from or today, today)
+    date_to = min(date_to or today + timedelta(days=SCHEDULE_DAYS_AHEAD), today + timedelta(days=SCHEDULE_DAYS_AHEAD))
+    
+    key = f'moyklass_schedule:{get_schedule_version()}:{filial_id or 0}:{date_from}:{date_to}:{int(only_free)}'
+    schedule = cache.get(key)
+    if schedule is None:
+        schedule = build_schedule(filial_id, date_from, date_to, only_free)
+        cache.set(key, schedule, SCHEDULE_CACHE_TTL)
+    return schedule
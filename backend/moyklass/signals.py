@@ -0,0 +1,17 @@
+"""
+Сигналы модуля MoyKlass
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import MoyKlassIntegration, MoyKlassFieldMapping
+
+
+@receiver(post_save, sender=MoyKlassFieldMapping)
+@receiver(post_delete, sender=MoyKlassFieldMapping)
+def bump_integration_version(sender, instance, **kwargs):
+    """
+    Обновляет updated_at интеграции при изменении маппинга,
+    чтобы скомпилированные планы маппинга (moyklass.mapping) пересобрались
+    """
+    MoyKlassIntegration.objects.filter(pk=instance.integration_id).update(updated_at=timezone.now())
@@ -0,0 +1,332 @@
+"""
+Локальная заглушка API MoyKlass для нагрузочной проверки
+
+Имитирует эндпоинты, которые использует MoyKlassClient: получение токена,
+ученики, теги, платежи, записи, группы, занятия и сотрудники. Задержка ответа,
+размер страницы, объем данных и доля ошибок 401/429/5xx настраиваются.
+Данные генерируются детерминированно (по seed) и хранятся в памяти.
+
+Запуск: python manage.py moyklass_stub_server (см. также benchmark_moyklass)
+"""
+import json
+import random
+import secrets
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = '/v1/company'
+
+
+class StubConfig:
+    """Параметры поведения заглушки"""
+    
+    def __init__(
+        self,
+        latency_ms: float = 50,
+        jitter_ms: float = 0,
+        max_per_page: int = 100,
+        students: int = 1000,
+        payments: int = 1000,
+        bookings: int = 1000,
+        groups: int = 20,
+        lessons: int = 200,
+        staff: int = 10,
+        error_401_rate: float = 0,
+        error_429_rate: float = 0,
+        error_5xx_rate: float = 0,
+        retry_after: int = 1,
+        token_ttl: int = 3600,
+        seed: int = 1
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.max_per_page = max_per_page
+        self.dataset = {
+            'users': students,
+            'payments': payments,
+            'bookings': bookings,
+            'groups': groups,
+            'lessons': lessons,
+            'staff': staff,
+        }
+        self.error_401_rate = error_401_rate
+        self.error_429_rate = error_429_rate
+        self.error_5xx_rate = error_5xx_rate
+        self.retry_after = retry_after
+        self.token_ttl = token_ttl
+        self.seed = seed
+
+
+class StubState:
+    """Данные и счетчики заглушки (общие для всех потоков сервера)"""
+    
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+        self.tokens: Dict[str, float] = {}
+        self.tags: List[Dict[str, Any]] = [{'id': 1, 'name': 'Сайт'}]
+        self.requests = 0
+        self.injected_errors = 0
+        self.collections = self._generate()
+        self.next_user_id = len(self.collections['users']) + 1
+    
+    def _generate(self) -> Dict[str, List[Dict[str, Any]]]:
+        rnd = random.Random(self.config.seed)
+        size = self.config.dataset
+        now = datetime.now(dt_timezone.utc).replace(microsecond=0)
+        today = date.today()
+        
+        def stamp(days_ago: int) -> str:
+            return (now - timedelta(days=days_ago)).isoformat().replace('+00:00', 'Z')
+        
+        users = [
+            {
+                'id': i,
+                'name': f'Ученик {i}',
+                'phone': f'79{rnd.randint(0, 999999999):09d}',
+                'email': f'student{i}@example.com',
+                'clientStateId': rnd.randint(1, 5),
+                'createdAt': stamp(rnd.randint(30, 900)),
+                'updatedAt': stamp(rnd.randint(0, 30)),
+            }
+            for i in range(1, size['users'] + 1)
+        ]
+        staff = [
+            {'id': i, 'name': f'Преподаватель {i}', 'filials': [1 + i % 2], 'active': True}
+            for i in range(1, size['staff'] + 1)
+        ]
+        groups = [
+            {
+                'id': i,
+                'name': f'Группа {i}',
+                'courseId': 1 + i % 5,
+                'filialId': 1 + i % 2,
+                'status': 'opened',
+                'beginDate': today.isoformat(),
+                'maxStudents': rnd.choice([8, 10, 12]),
+                'teacherIds': [1 + i % max(size['staff'], 1)],
+            }
+            for i in range(1, size['groups'] + 1)
+        ]
+        lessons = []
+        for i in range(1, size['lessons'] + 1):
+            group = groups[i % len(groups)] if groups else {'id': None, 'filialId': 1, 'teacherIds': []}
+            lessons.append({
+                'id': i,
+                'classId': group['id'],
+                'filialId': group['filialId'],
+                'date': (today + timedelta(days=i % 30)).isoformat(),
+                'beginTime': f'{9 + i % 10:02d}:00',
+                'endTime': f'{10 + i % 10:02d}:00',
+                'status': 0,
+                'teacherIds': group['teacherIds'],
+                'records': [{'userId': rnd.randint(1, max(size['users'], 1))} for _ in range(rnd.randint(0, 10))],
+            })
+        payments = [
+            {
+                'id': i,
+                'userId': rnd.randint(1, max(size['users'], 1)),
+                'summa': rnd.choice([1500, 3000, 4500, 12000]),
+                'date': stamp(rnd.randint(0, 365)),
+                'optype': 'income',
+                'comment': '',
+            }
+            for i in range(1, size['payments'] + 1)
+        ]
+        bookings = [
+            {
+                'id': i,
+                'userId': rnd.randint(1, max(size['users'], 1)),
+                'classId': rnd.randint(1, max(size['groups'], 1)),
+                'statusId': 1,
+                'createdAt': stamp(rnd.randint(30, 365)),
+                'updatedAt': stamp(rnd.randint(0, 30)),
+            }
+            for i in range(1, size['bookings'] + 1)
+        ]
+        return {
+            'users': users,
+            'payments': payments,
+            'bookings': bookings,
+            'groups': groups,
+            'lessons': lessons,
+            'staff': staff,
+        }
+    
+    def count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+    
+    def issue_token(self) -> Tuple[str, float]:
+        token = secrets.token_hex(16)
+        expires_at = time.time() + self.config.token_ttl
+        with self.lock:
+            self.tokens[token] = expires_at
+        return token, expires_at
+    
+    def token_valid(self, token: Optional[str]) -> bool:
+        with self.lock:
+            return bool(token) and self.tokens.get(token, 0) > time.time()
+    
+    def create_user(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            user = dict(data, id=self.next_user_id)
+            self.next_user_id += 1
+            self.collections['users'].append(user)
+        return user
+    
+    def create_tag(self, name: str) -> Dict[str, Any]:
+        with self.lock:
+            tag = {'id': len(self.tags) + 1, 'name': name}
+            self.tags.append(tag)
+        return tag
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов заглушки"""
+    
+    state: StubState = None
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+    
+    def _delay(self):
+        config = self.state.config
+        delay = config.latency_ms + (self.state.random.uniform(0, config.jitter_ms) if config.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+    
+    def _inject_error(self) -> bool:
+        """Возвращает случайную ошибку 429/5xx, если она выпала"""
+        config = self.state.config
+        if self.state.roll(config.error_429_rate):
+            self.state.count('injected_errors')
+            self._send_json(429, {'message': 'Too many requests'}, {'Retry-After': str(config.retry_after)})
+            return True
+        if self.state.roll(config.error_5xx_rate):
+            self.state.count('injected_errors')
+            self._send_json(503, {'message': 'Service unavailable'})
+            return True
+        return False
+    
+    def _handle(self, method: str):
+        self.state.count('requests')
+        body = self._read_json() if method in ('POST', 'PUT') else {}
+        self._delay()
+        
+        url = urlparse(self.path)
+        if not url.path.startswith(API_PREFIX):
+            return self._send_json(404, {'message': 'Not found'})
+        path = url.path[len(API_PREFIX):].strip('/')
+        
+        if self._inject_error():
+            return
+        
+        if path == 'auth/getToken' and method == 'POST':
+            if not body.get('apiKey'):
+                return self._send_json(400, {'message': 'apiKey is required'})
+            token, expires_at = self.state.issue_token()
+            expires = datetime.fromtimestamp(expires_at, dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+            return self._send_json(200, {'accessToken': token, 'expiresAt': expires})
+        
+        if not self.state.token_valid(self.headers.get('x-access-token')) or self.state.roll(self.state.config.error_401_rate):
+            return self._send_json(401, {'message': 'Unauthorized'})
+        
+        parts = path.split('/')
+        if path == 'userTags' and method == 'GET':
+            return self._send_json(200, list(self.state.tags))
+        if path == 'tags' and method == 'POST':
+            return self._send_json(200, self.state.create_tag(body.get('name') or ''))
+        if path == 'users' and method == 'POST':
+            if not body.get('name'):
+                return self._send_json(400, {'message': 'name is required'})
+            return self._send_json(200, self.state.create_user(body))
+        if len(parts) == 3 and parts[0] == 'users' and parts[2] == 'tags' and method == 'POST':
+            return self._send_json(200, {'id': int(parts[1]), 'tags': body.get('tags', [])})
+        if path == 'company' or path == '':
+            return self._send_json(200, {'id': 1, 'name': 'MoyKlass stub'})
+        
+        collection = self.state.collections.get(parts[0])
+        if collection is None:
+            return self._send_json(404, {'message': 'Not found'})
+        if len(parts) == 2 and method == 'GET':
+            record = next((item for item in collection if str(item['id']) == parts[1]), None)
+            if record is None:
+                return self._send_json(404, {'message': 'Not found'})
+            return self._send_json(200, record)
+        if len(parts) == 1 and method == 'GET':
+            return self._send_json(200, self._paginate(collection, parse_qs(url.query)))
+        return self._send_json(405, {'message': 'Method not allowed'})
+    
+    def _paginate(self, collection: List[Dict[str, Any]], query: Dict[str, List[str]]) -> Dict[str, Any]:
+        per_page = min(int((query.get('perPage') or ['50'])[0]), self.state.config.max_per_page)
+        page = max(int((query.get('page') or ['1'])[0]), 1)
+        total = len(collection)
+        total_pages = max(1, -(-total // per_page))
+        items = collection[(page - 1) * per_page:page * per_page]
+        return {
+            'data': items,
+            'pagination': {
+                'page': page,
+                'perPage': per_page,
+                'total': total,
+                'totalPages': total_pages,
+                'hasNext': page < total_pages,
+            },
+        }
+    
+    def do_GET(self):
+        self._handle('GET')
+    
+    def do_POST(self):
+        self._handle('POST')
+    
+    def do_PUT(self):
+        self._handle('PUT')
+
+
+def make_stub_server(host: str = '127.0.0.1', port: int = 8765, config: Optional[StubConfig] = None) -> ThreadingHTTPServer:
+    """Создает (не запуская) HTTP-сервер заглушки; port=0 - любой свободный порт"""
+    state = StubState(config or StubConfig())
+    handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, config: Optional[StubConfig] = None) -> ThreadingHTTPServer:
+    """Запускает заглушку в фоновом потоке и возвращает сервер (адрес - server.server_address)"""
+    server = make_stub_server(host, port, config)
+    thread = threading.Thread(target=server.serve_forever, name='moyklass-stub', daemon=True)
+    thread.start()
+    return server
@@ -2,16 +2,97 @@
 Модуль синхронизации данных с MoyKlass CRM
 """
 import time
-from typing import Dict, Any, Optional
+from datetime import timedelta
+from typing import Dict, Any, Optional, Callable, Iterator, Tuple
 from django.utils import timezone
-from django.db import transaction
-from .models import MoyKlassSettings, MoyKlassSyncLog
+from django.db import IntegrityError, transaction
+from .models import (
+    MoyKlassSettings, MoyKlassSyncLog, MoyKlassSyncCursor,
+    MoyKlassStudent, MoyKlassPayment, MoyKlassBooking,
+    MoyKlassGroup, MoyKlassLesson, MoyKlassStaff
+)
 from .client import MoyKlassClient, MoyKlassAPIError
+from .schedule import SCHEDULE_DAYS_AHEAD, invalidate_schedule_cache
+
+
+# Фильтр API, по которому запрашиваются только измененные записи.
+# MoyKlass принимает интервал дат в виде массива [от, до] в формате YYYY-MM-DD.
+INCREMENTAL_FILTERS = {
+    'students': 'updatedAt',
+    'payments': 'createdAt',
+    'bookings': 'updatedAt',
+}
+
+# Локальные таблицы, в которые сохраняются синхронизированные записи
+MIRROR_MODELS = {
+    'students': MoyKlassStudent,
+    'payments': MoyKlassPayment,
+    'bookings': MoyKlassBooking,
+}
+
+# Запас при инкрементальной синхронизации, чтобы не потерять записи,
+# измененные во время предыдущего запуска
+CURSOR_OVERLAP = timedelta(minutes=5)
+
+
+def upsert_mirror_records(model, objects) -> Tuple[int, int]:
+    """
+    Сохраняет пачку записей в локальную таблицу: существующие - одним bulk_update,
+    новые - одним bulk_create
+    
+    INSERT ... ON CONFLICT UPDATE не используется: MySQL не поддерживает его
+    с указанием уникальных полей.
+    
+    Args:
+        model: Модель локальной копии (MoyKlassStudent, MoyKlassPayment, MoyKlassBooking)
+        objects: Несохраненные объекты модели
+    
+    Returns:
+        Кортеж (создано, обновлено)
+    """
+    if not objects:
+        return 0, 0
+    
+    # Дубликаты внутри пачки (запись могла измениться между страницами) - оставляем последнюю
+    unique_objects = list({obj.moyklass_id: obj for obj in objects}.values())
+    
+    # Параллельная синхронизация (например, вебхук) может успеть создать ту же запись -
+    # тогда повторяем один раз: она уже попадет в обновляемые
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing = dict(
+                    model.objects.select_for_update()
+                    .filter(moyklass_id__in=[obj.moyklass_id for obj in unique_objects])
+                    .values_list('moyklass_id', 'pk')
+                )
+                to_update = []
+                to_create = []
+                for obj in unique_objects:
+                    obj.pk = existing.get(obj.moyklass_id)
+                    if obj.pk:
+                        to_update.append(obj)
+                    else:
+                        to_create.append(obj)
+                
+                if to_update:
+                    model.objects.bulk_update(to_update, model.UPSERT_FIELDS)
+                if to_create:
+                    model.objects.bulk_create(to_create)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+    
+    return len(to_create), len(to_update)
 
 
 class MoyKlassSync:
     """Класс для синхронизации данных с MoyKlass"""
     
+    PER_PAGE = 50
+    UPSERT_BATCH_SIZE = 500
+    
     def __init__(self, settings: Optional[MoyKlassSettings] = None):
         if settings:
             self.settings = settings
@@ -22,20 +103,53 @@ class MoyKlassSync:
         
         self.client = MoyKlassClient(self.settings)
     
-    def sync_students(self, log: Optional[MoyKlassSyncLog] = None) -> Dict[str, Any]:
+    def _get_incremental_filters(self, entity: str, cursor: MoyKlassSyncCursor) -> Dict[str, Any]:
+        """Формирует фильтры API для получения записей, измененных после курсора"""
+        if not cursor.synced_until:
+            return {}
+        
+        since = timezone.localtime(cursor.synced_until - CURSOR_OVERLAP)
+        until = timezone.localtime(timezone.now())
+        return {
+            f'{INCREMENTAL_FILTERS[entity]}[]': [
+                since.strftime('%Y-%m-%d'),
+                until.strftime('%Y-%m-%d'),
+            ]
+        }
+    
+    def _upsert_batch(self, model, objects, results: Dict[str, Any]):
+        """Сохраняет пачку записей и обновляет счетчики созданных/обновленных"""
+        created, updated = upsert_mirror_records(model, objects)
+        results['created'] += created
+        results['updated'] += updated
+    
+    def _sync_entity(
+        self,
+        entity: str,
+        iter_records: Callable[..., Iterator[Dict[str, Any]]],
+        log: Optional[MoyKlassSyncLog] = None,
+        full: bool = False
+    ) -> Dict[str, Any]:
         """
-        Синхронизирует учеников/лидов
+        Постранично загружает записи одного типа и обновляет курсор синхронизации
         
         Args:
+            entity: Тип данных (students, payments, bookings)
+            iter_records: Потоковый метод клиента (iter_students, iter_payments, ...)
             log: Лог синхронизации для записи результатов
+            full: Полная синхронизация (игнорировать курсор)
         
         Returns:
             Словарь с результатами синхронизации
         """
-        if not self.settings.sync_students:
-            return {'skipped': True, 'message': 'Синхронизация учеников отключена'}
+        cursor, _ = MoyKlassSyncCursor.objects.get_or_create(entity=entity)
+        run_started_at = timezone.now()
+        
+        full = full or not cursor.synced_until
+        filters = {} if full else self._get_incremental_filters(entity, cursor)
         
         results = {
+            'mode': 'full' if full else 'incremental',
             'processed': 0,
             'created': 0,
             'updated': 0,
@@ -43,40 +157,36 @@ class MoyKlassSync:
             'error_messages': []
         }
         
+        records = iter_records(
+            filters=filters,
+            per_page=self.PER_PAGE,
+            prefetch=self.settings.sync_concurrency
+        )
+        
+        model = MIRROR_MODELS[entity]
+        batch = []
+        
         try:
-            page = 1
-            per_page = 50
-            
-            while True:
-                response = self.client.get_students(page=page, per_page=per_page)
-                students = response.get('data', [])
+            for record in records:
+                try:
+                    results['processed'] += 1
+                    batch.append(model.from_api(record))
+                except Exception as e:
+                    results['errors'] += 1
+                    results['error_messages'].append(str(e))
                 
-                if not students:
-                    break
-                
-                for student_data in students:
-                    try:
-                        results['processed'] += 1
-                        # Здесь можно добавить логику сохранения в локальную БД
-                        # Например, создать модель Student и синхронизировать данные
-                        # student, created = Student.objects.update_or_create(
-                        #     moyklass_id=student_data['id'],
-                        #     defaults={...}
-                        # )
-                        # if created:
-                        #     results['created'] += 1
-                        # else:
-                        #     results['updated'] += 1
-                    except Exception as e:
-                        results['errors'] += 1
-                        results['error_messages'].append(str(e))
-                
-                # Проверяем, есть ли еще страницы
-                pagination = response.get('pagination', {})
-                if not pagination.get('hasNext', False):
-                    break
-                
-                page += 1
+                if len(batch) >= self.UPSERT_BATCH_SIZE:
+                    self._upsert_batch(model, batch, results)
+                    batch = []
+            
+            self._upsert_batch(model, batch, results)
+            
+            # Курсор сдвигается только после успешного прохода всех страниц
+            cursor.synced_until = run_started_at
+            cursor.last_records_count = results['processed']
+            if full:
+                cursor.last_full_sync_at = run_started_at
+            cursor.save()
             
             if log:
                 log.records_processed = results['processed']
@@ -88,7 +198,7 @@ class MoyKlassSync:
                 log.save()
             
             return results
-            
+        
         except MoyKlassAPIError as e:
             if log:
                 log.status = 'error'
@@ -96,12 +206,29 @@ class MoyKlassSync:
                 log.save()
             raise
     
-    def sync_payments(self, log: Optional[MoyKlassSyncLog] = None) -> Dict[str, Any]:
+    def sync_students(self, log: Optional[MoyKlassSyncLog] = None, full: bool = False) -> Dict[str, Any]:
+        """
+        Синхронизирует учеников/лидов
+        
+        Args:
+            log: Лог синхронизации для записи результатов
+            full: Полная синхронизация вместо инкрементальной
+        
+        Returns:
+            Словарь с результатами синхронизации
+        """
+        if not self.settings.sync_students:
+            return {'skipped': True, 'message': 'Синхронизация учеников отключена'}
+        
+        return self._sync_entity('students', self.client.iter_students, log, full)
+    
+    def sync_payments(self, log: Optional[MoyKlassSyncLog] = None, full: bool = False) -> Dict[str, Any]:
         """
         Синхронизирует платежи
         
         Args:
             log: Лог синхронизации для записи результатов
+            full: Полная синхронизация вместо инкрементальной
         
         Returns:
             Словарь с результатами синхронизации
@@ -109,63 +236,15 @@ class MoyKlassSync:
         if not self.settings.sync_payments:
             return {'skipped': True, 'message': 'Синхронизация платежей отключена'}
         
-        results = {
-            'processed': 0,
-            'created': 0,
-            'updated': 0,
-            'errors': 0,
-            'error_messages': []
-        }
-        
-        try:
-            page = 1
-            per_page = 50
-            
-            while True:
-                response = self.client.get_payments(page=page, per_page=per_page)
-                payments = response.get('data', [])
-                
-                if not payments:
-                    break
-                
-                for payment_data in payments:
-                    try:
-                        results['processed'] += 1
-                        # Здесь можно добавить логику сохранения платежей
-                    except Exception as e:
-                        results['errors'] += 1
-                        results['error_messages'].append(str(e))
-                
-                pagination = response.get('pagination', {})
-                if not pagination.get('hasNext', False):
-                    break
-                
-                page += 1
-            
-            if log:
-                log.records_processed = results['processed']
-                log.records_created = results['created']
-                log.records_updated = results['updated']
-                log.records_errors = results['errors']
-                if results['error_messages']:
-                    log.error_message = '\n'.join(results['error_messages'][:10])
-                log.save()
-            
-            return results
-            
-        except MoyKlassAPIError as e:
-            if log:
-                log.status = 'error'
-                log.error_message = str(e)
-                log.save()
-            raise
+        return self._sync_entity('payments', self.client.iter_payments, log, full)
     
-    def sync_bookings(self, log: Optional[MoyKlassSyncLog] = None) -> Dict[str, Any]:
+    def sync_bookings(self, log: Optional[MoyKlassSyncLog] = None, full: bool = False) -> Dict[str, Any]:
         """
         Синхронизирует записи в группы
         
         Args:
             log: Лог синхронизации для записи результатов
+            full: Полная синхронизация вместо инкрементальной
         
         Returns:
             Словарь с результатами синхронизации
@@ -173,60 +252,165 @@ class MoyKlassSync:
         if not self.settings.sync_bookings:
             return {'skipped': True, 'message': 'Синхронизация записей отключена'}
         
+        return self._sync_entity('bookings', self.client.iter_bookings, log, full)
+    
+    def _sync_snapshot(
+        self,
+        model,
+        records: Iterator[Dict[str, Any]],
+        results: Dict[str, Any],
+        scope: Optional[Dict[str, Any]] = None,
+        prepare: Optional[Callable[[Any], None]] = None
+    ):
+        """
+        Полностью обновляет локальную копию данных одного типа
+        
+        Записи, которых не оказалось в ответе API (в пределах scope), удаляются:
+        все полученные записи при сохранении получают новое synced_at.
+        
+        Args:
+            model: Модель локальной копии
+            records: Записи API
+            results: Счетчики результатов синхронизации
+            scope: Фильтр локальных записей, которые должны были прийти в ответе
+            prepare: Доработка объекта перед сохранением
+        """
+        run_started_at = timezone.now()
+        batch = []
+        
+        for record in records:
+            try:
+                results['processed'] += 1
+                obj = model.from_api(record)
+                if prepare:
+                    prepare(obj)
+                batch.append(obj)
+            except Exception as e:
+                results['errors'] += 1
+                results['error_messages'].append(str(e))
+            
+            if len(batch) >= self.UPSERT_BATCH_SIZE:
+                self._upsert_batch(model, batch, results)
+                batch = []
+        
+        self._upsert_batch(model, batch, results)
+        results['deleted'] += model.objects.filter(
+            synced_at__lt=run_started_at, **(scope or {})
+        ).delete()[0]
+    
+    def _run_schedule_sync(self, sync: Callable[[Dict[str, Any]], None], log: Optional[MoyKlassSyncLog]) -> Dict[str, Any]:
+        """Выполняет синхронизацию данных расписания, пишет лог и сбрасывает кэш расписания"""
         results = {
+            'mode': 'full',
             'processed': 0,
             'created': 0,
             'updated': 0,
+            'deleted': 0,
             'errors': 0,
             'error_messages': []
         }
         
         try:
-            page = 1
-            per_page = 50
-            
-            while True:
-                response = self.client.get_bookings(page=page, per_page=per_page)
-                bookings = response.get('data', [])
-                
-                if not bookings:
-                    break
-                
-                for booking_data in bookings:
-                    try:
-                        results['processed'] += 1
-                        # Здесь можно добавить логику сохранения записей
-                    except Exception as e:
-                        results['errors'] += 1
-                        results['error_messages'].append(str(e))
-                
-                pagination = response.get('pagination', {})
-                if not pagination.get('hasNext', False):
-                    break
-                
-                page += 1
-            
-            if log:
-                log.records_processed = results['processed']
-                log.records_created = results['created']
-                log.records_updated = results['updated']
-                log.records_errors = results['errors']
-                if results['error_messages']:
-                    log.error_message = '\n'.join(results['error_messages'][:10])
-                log.save()
-            
-            return results
-            
+            sync(results)
         except MoyKlassAPIError as e:
             if log:
                 log.status = 'error'
                 log.error_message = str(e)
                 log.save()
             raise
+        
+        invalidate_schedule_cache()
+        
+        if log:
+            log.records_processed = results['processed']
+            log.records_created = results['created']
+            log.records_updated = results['updated']
+            log.records_errors = results['errors']
+            if results['error_messages']:
+                log.error_message = '\n'.join(results['error_messages'][:10])
+            log.save()
+        
+        return results
+    
+    def sync_groups(self, log: Optional[MoyKlassSyncLog] = None) -> Dict[str, Any]:
+        """
+        Синхронизирует группы и сотрудников для расписания
+        
+        Args:
+            log: Лог синхронизации для записи результатов
+        
+        Returns:
+            Словарь с результатами синхронизации
+        """
+        if not self.settings.sync_groups:
+            return {'skipped': True, 'message': 'Синхронизация групп отключена'}
+        
+        prefetch = self.settings.sync_concurrency
+        
+        def sync(results):
+            self._sync_snapshot(
+                MoyKlassStaff,
+                self.client.iter_staff(per_page=self.PER_PAGE, prefetch=prefetch),
+                results
+            )
+            self._sync_snapshot(
+                MoyKlassGroup,
+                self.client.iter_groups(per_page=self.PER_PAGE, prefetch=prefetch),
+                results
+            )
+        
+        return self._run_schedule_sync(sync, log)
+    
+    def sync_lessons(self, log: Optional[MoyKlassSyncLog] = None) -> Dict[str, Any]:
+        """
+        Синхронизирует занятия на SCHEDULE_DAYS_AHEAD дней вперед со свободными местами
+        
+        Вместимость берется из занятия или (если не задана) из группы,
+        поэтому группы стоит синхронизировать до занятий.
+        
+        Args:
+            log: Лог синхронизации для записи результатов
+        
+        Returns:
+            Словарь с результатами синхронизации
+        """
+        if not self.settings.sync_lessons:
+            return {'skipped': True, 'message': 'Синхронизация занятий отключена'}
+        
+        today = timezone.localdate()
+        until = today + timedelta(days=SCHEDULE_DAYS_AHEAD)
+        group_capacity = dict(
+            MoyKlassGroup.objects.filter(max_students__isnull=False).values_list('moyklass_id', 'max_students')
+        )
+        
+        def prepare(lesson):
+            lesson.set_capacity(group_capacity.get(lesson.group_moyklass_id))
+        
+        def sync(results):
+            records = self.client.iter_lessons(
+                filters={
+                    'date[]': [today.strftime('%Y-%m-%d'), until.strftime('%Y-%m-%d')],
+                    'includeRecords': 'true',
+                },
+                per_page=self.PER_PAGE,
+                prefetch=self.settings.sync_concurrency
+            )
+            self._sync_snapshot(
+                MoyKlassLesson, records, results,
+                scope={'date__gte': today, 'date__lte': until},
+                prepare=prepare
+            )
+            # Прошедшие занятия в расписании не нужны
+            results['deleted'] += MoyKlassLesson.objects.filter(date__lt=today).delete()[0]
+        
+        return self._run_schedule_sync(sync, log)
     
-    def sync_all(self) -> Dict[str, Any]:
+    def sync_all(self, full: bool = False) -> Dict[str, Any]:
         """
-        Выполняет полную синхронизацию всех включенных типов данных
+        Выполняет синхронизацию всех включенных типов данных
+        
+        Args:
+            full: Полная синхронизация вместо инкрементальной
         
         Returns:
             Словарь с результатами синхронизации
@@ -244,6 +428,8 @@ class MoyKlassSync:
             'students': {},
             'payments': {},
             'bookings': {},
+            'groups': {},
+            'lessons': {},
             'total_processed': 0,
             'total_created': 0,
             'total_updated': 0,
@@ -258,7 +444,7 @@ class MoyKlassSync:
                     status='success'
                 )
                 student_log.save()
-                results['students'] = self.sync_students(student_log)
+                results['students'] = self.sync_students(student_log, full=full)
                 results['total_processed'] += results['students'].get('processed', 0)
                 results['total_created'] += results['students'].get('created', 0)
                 results['total_updated'] += results['students'].get('updated', 0)
@@ -271,7 +457,7 @@ class MoyKlassSync:
                     status='success'
                 )
                 payment_log.save()
-                results['payments'] = self.sync_payments(payment_log)
+                results['payments'] = self.sync_payments(payment_log, full=full)
                 results['total_processed'] += results['payments'].get('processed', 0)
                 results['total_created'] += results['payments'].get('created', 0)
                 results['total_updated'] += results['payments'].get('updated', 0)
@@ -284,12 +470,27 @@ class MoyKlassSync:
                     status='success'
                 )
                 booking_log.save()
-                results['bookings'] = self.sync_bookings(booking_log)
+                results['bookings'] = self.sync_bookings(booking_log, full=full)
                 results['total_processed'] += results['bookings'].get('processed', 0)
                 results['total_created'] += results['bookings'].get('created', 0)
                 results['total_updated'] += results['bookings'].get('updated', 0)
                 results['total_errors'] += results['bookings'].get('errors', 0)
             
+            # Синхронизируем расписание: группы до занятий (нужна вместимость групп)
+            for entity, sync_entity in (('groups', self.sync_groups), ('lessons', self.sync_lessons)):
+                if not getattr(self.settings, f'sync_{entity}'):
+                    continue
+                entity_log = MoyKlassSyncLog(
+                    sync_type=entity,
+                    status='success'
+                )
+                entity_log.save()
+                results[entity] = sync_entity(entity_log)
+                results['total_processed'] += results[entity].get('processed', 0)
+                results['total_created'] += results[entity].get('created', 0)
+                results['total_updated'] += results[entity].get('updated', 0)
+                results['total_errors'] += results[entity].get('errors', 0)
+            
             # Обновляем общий лог
             log.records_processed = results['total_processed']
             log.records_created = results['total_created']
@@ -308,7 +509,7 @@ class MoyKlassSync:
             self.settings.save(update_fields=['last_sync_at'])
             
             return results
-            
+        
         except Exception as e:
             log.status = 'error'
             log.error_message = str(e)
@@ -316,4 +517,3 @@ class MoyKlassSync:
             log.duration_seconds = time.time() - start_time
             log.save()
             raise
-
@@ -1,3 +1,324 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from .client import MoyKlassClient, MoyKlassTimeoutError, MoyKlassUnavailableError
+from .leads import push_pending_leads
+from .mapping import MappingPlan, MappingStep, MissingRequiredFieldError, normalize_phone
+from .models import MoyKlassPendingLead, MoyKlassSettings, MoyKlassStudent, MoyKlassWebhookEvent
+from .sync import upsert_mirror_records
+from .transport import CircuitBreaker
+from .webhooks import CLAIM_TIMEOUT, claim_pending_events, process_pending_events
 
-# Create your tests here.
+
+class UpsertMirrorRecordsTests(TestCase):
+    """Сохранение пачки записей в локальную таблицу (upsert_mirror_records)"""
+    
+    def test_creates_new_and_updates_existing(self):
+        MoyKlassStudent.objects.create(moyklass_id=1, name='Старое имя')
+        
+        created, updated = upsert_mirror_records(MoyKlassStudent, [
+            MoyKlassStudent(moyklass_id=1, name='Новое имя'),
+            MoyKlassStudent(moyklass_id=2, name='Новый ученик'),
+        ])
+        
+        self.assertEqual((created, updated), (1, 1))
+        self.assertEqual(
+            dict(MoyKlassStudent.objects.values_list('moyklass_id', 'name')),
+            {1: 'Новое имя', 2: 'Новый ученик'}
+        )
+    
+    def test_last_duplicate_in_batch_wins(self):
+        created, updated = upsert_mirror_records(MoyKlassStudent, [
+            MoyKlassStudent(moyklass_id=1, name='Первая версия'),
+            MoyKlassStudent(moyklass_id=1, name='Последняя версия'),
+        ])
+        
+        self.assertEqual((created, updated), (1, 0))
+        self.assertEqual(MoyKlassStudent.objects.get(moyklass_id=1).name, 'Последняя версия')
+    
+    def test_empty_batch(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(upsert_mirror_records(MoyKlassStudent, []), (0, 0))
+    
+    def test_retries_once_on_concurrent_insert(self):
+        bulk_create = MoyKlassStudent.objects.bulk_create
+        calls = []
+        
+        def flaky_bulk_create(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 1:
+                raise IntegrityError('UNIQUE constraint failed: moyklass_id')
+            return bulk_create(objs, *args, **kwargs)
+        
+        with mock.patch.object(MoyKlassStudent.objects, 'bulk_create', side_effect=flaky_bulk_create):
+            created, updated = upsert_mirror_records(MoyKlassStudent, [MoyKlassStudent(moyklass_id=1, name='А')])
+        
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((created, updated), (1, 0))
+        self.assertTrue(MoyKlassStudent.objects.filter(moyklass_id=1).exists())
+    
+    def test_second_integrity_error_is_raised(self):
+        with mock.patch.object(MoyKlassStudent.objects, 'bulk_create', side_effect=IntegrityError('dup')):
+            with self.assertRaises(IntegrityError):
+                upsert_mirror_records(MoyKlassStudent, [MoyKlassStudent(moyklass_id=1, name='А')])
+
+
+class WebhookQueueTests(TestCase):
+    """Захват и применение очереди вебхуков"""
+    
+    def add_event(self, key, data, event='user_changed'):
+        return MoyKlassWebhookEvent.objects.create(
+            event_type=event, dedup_key=key, payload={'event': event, 'data': data}
+        )
+    
+    def test_applies_claimed_batch(self):
+        event = self.add_event('1', {'id': 1, 'name': 'Иван', 'updatedAt': '2026-01-02T10:00:00'})
+        
+        results = process_pending_events()
+        
+        self.assertEqual(results, {'processed': 1, 'ignored': 0, 'errors': 0})
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts, event.claim_token), ('processed', 1, ''))
+        self.assertEqual(MoyKlassStudent.objects.get(moyklass_id=1).name, 'Иван')
+    
+    def test_head_claimed_by_other_worker_is_not_applied(self):
+        first = self.add_event('1', {'id': 1, 'name': 'Старое'})
+        self.add_event('2', {'id': 1, 'name': 'Новое'})
+        MoyKlassWebhookEvent.objects.filter(pk=first.pk).update(claim_token='other', claimed_at=timezone.now())
+        
+        self.assertEqual(claim_pending_events(), [])
+        self.assertEqual(process_pending_events(), {'processed': 0, 'ignored': 0, 'errors': 0})
+        self.assertFalse(MoyKlassStudent.objects.exists())
+        # Захват, отмененный из-за чужих событий, не остается висеть
+        self.assertEqual(MoyKlassWebhookEvent.objects.filter(claim_token='').count(), 1)
+    
+    def test_abandoned_claim_is_taken_over(self):
+        event = self.add_event('1', {'id': 1, 'name': 'Иван'})
+        MoyKlassWebhookEvent.objects.filter(pk=event.pk).update(
+            claim_token='dead', claimed_at=timezone.now() - CLAIM_TIMEOUT - timedelta(minutes=1)
+        )
+        
+        self.assertEqual([e.pk for e in claim_pending_events()], [event.pk])
+    
+    def test_stale_update_does_not_overwrite_newer_record(self):
+        MoyKlassStudent.objects.create(
+            moyklass_id=1, name='Свежее', remote_updated_at=timezone.now()
+        )
+        event = self.add_event('1', {'id': 1, 'name': 'Устаревшее', 'updatedAt': '2020-01-01T00:00:00'})
+        
+        results = process_pending_events()
+        
+        self.assertEqual(results['processed'], 1)
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'processed')
+        self.assertEqual(MoyKlassStudent.objects.get(moyklass_id=1).name, 'Свежее')
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """Состояния предохранителя API"""
+    
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('moyklass.transport.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    
+    def open_breaker(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+    
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.seconds_until_retry(), 60)
+    
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        
+        self.assertFalse(self.breaker.is_open)
+    
+    def test_single_trial_after_timeout(self):
+        self.open_breaker()
+        self.now += 60
+        
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+    
+    def test_trial_success_closes(self):
+        self.open_breaker()
+        self.now += 60
+        self.breaker.allow()
+        self.breaker.record_success()
+        
+        self.assertFalse(self.breaker.is_open)
+        self.assertTrue(self.breaker.allow())
+    
+    def test_trial_failure_reopens(self):
+        self.open_breaker()
+        self.now += 60
+        self.breaker.allow()
+        self.breaker.record_failure()
+        
+        self.assertFalse(self.breaker.allow())
+        self.now += 60
+        self.assertTrue(self.breaker.allow())
+    
+    def test_retry_after_opens_immediately(self):
+        self.breaker.record_failure(open_for=5)
+        
+        self.assertFalse(self.breaker.allow())
+        self.now += 5
+        self.assertTrue(self.breaker.allow())
+    
+    def test_released_trial_can_be_taken_again(self):
+        self.open_breaker()
+        self.now += 60
+        self.breaker.allow()
+        self.breaker.release_trial()
+        
+        self.assertTrue(self.breaker.allow())
+    
+    def test_trial_timed_out_on_semaphore_is_released(self):
+        self.open_breaker()
+        self.now += 60
+        client = MoyKlassClient(MoyKlassSettings(is_active=True, api_key='key'))
+        semaphore = mock.Mock()
+        semaphore.acquire.return_value = False
+        
+        with mock.patch('moyklass.client.circuit_breaker', self.breaker), \
+                mock.patch('moyklass.client.get_in_flight_semaphore', return_value=semaphore):
+            with self.assertRaises(MoyKlassUnavailableError):
+                client._send('GET', 'https://api.moyklass.com/v1/company/users')
+        
+        self.assertTrue(self.breaker.allow())
+
+
+class NormalizePhoneTests(SimpleTestCase):
+    """Нормализация телефона для MoyKlass"""
+    
+    def test_keeps_valid_digits(self):
+        self.assertEqual(normalize_phone('79001234567'), '79001234567')
+    
+    def test_strips_formatting(self):
+        self.assertEqual(normalize_phone('+7 (900) 123-45-67'), '79001234567')
+    
+    def test_truncates_long_number(self):
+        self.assertEqual(normalize_phone('1234567890123456789'), '123456789012345')
+    
+    def test_empty_without_digits(self):
+        self.assertEqual(normalize_phone('нет телефона'), '')
+        self.assertEqual(normalize_phone(None), '')
+
+
+class MappingPlanTests(SimpleTestCase):
+    """Формирование данных лида по скомпилированному маппингу"""
+    
+    def step(self, moyklass_field, source_key, label='', is_required=False, default_value='', transform=None):
+        return MappingStep(
+            moyklass_field=moyklass_field,
+            source_key=source_key,
+            source_key_lower=source_key.lower(),
+            label=label or source_key,
+            is_required=is_required,
+            default_value=default_value,
+            transform=transform,
+        )
+    
+    def test_maps_fields_case_insensitively(self):
+        plan = MappingPlan(1, None, [
+            self.step('name', 'Name'),
+            self.step('phone', 'phone', transform=normalize_phone),
+        ])
+        
+        student_data, comment_parts = plan.build({'name': 'Иван', 'PHONE': '+7 900 123-45-67'})
+        
+        self.assertEqual(student_data, {'name': 'Иван', 'phone': '79001234567'})
+        self.assertEqual(comment_parts, [])
+    
+    def test_comment_fields_and_defaults(self):
+        plan = MappingPlan(1, None, [
+            self.step('comment', 'course', label='Курс'),
+            self.step('comment', 'source', label='Источник', default_value='Сайт'),
+        ])
+        
+        student_data, comment_parts = plan.build({'course': 'Python'})
+        
+        self.assertEqual(student_data, {})
+        self.assertEqual(comment_parts, ['Курс: Python', 'Источник: Сайт'])
+    
+    def test_empty_after_transform_is_skipped(self):
+        plan = MappingPlan(1, None, [self.step('phone', 'phone', transform=normalize_phone)])
+        
+        self.assertEqual(plan.build({'phone': 'не указан'}), ({}, []))
+    
+    def test_missing_required_field(self):
+        plan = MappingPlan(1, None, [self.step('name', 'name', is_required=True)])
+        
+        with self.assertRaises(MissingRequiredFieldError) as error:
+            plan.build({})
+        self.assertEqual(error.exception.moyklass_field, 'name')
+
+
+class PushPendingLeadsTests(TestCase):
+    """Отправка очереди лидов без дублей после таймаута"""
+    
+    def setUp(self):
+        self.client_mock = mock.Mock()
+        patcher = mock.patch('moyklass.leads.MoyKlassClient', return_value=self.client_mock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lead = MoyKlassPendingLead.objects.create(
+            student_data={'name': 'Иван', 'phone': '79001234567'}, tags=['Сайт']
+        )
+    
+    def make_due(self):
+        MoyKlassPendingLead.objects.filter(pk=self.lead.pk).update(next_attempt_at=timezone.now())
+    
+    def test_timeout_marks_delivery_unknown(self):
+        self.client_mock.create_student.side_effect = MoyKlassTimeoutError('read timeout')
+        
+        self.assertEqual(push_pending_leads()['retry'], 1)
+        self.lead.refresh_from_db()
+        self.assertTrue(self.lead.delivery_unknown)
+        self.assertEqual(self.lead.status, 'pending')
+    
+    def test_retry_after_timeout_finds_created_lead(self):
+        self.client_mock.create_student.side_effect = MoyKlassTimeoutError('read timeout')
+        push_pending_leads()
+        self.make_due()
+        self.client_mock.find_student_by_phone.return_value = {'id': 42, 'phone': '79001234567'}
+        
+        self.assertEqual(push_pending_leads()['sent'], 1)
+        self.client_mock.find_student_by_phone.assert_called_once_with('79001234567')
+        self.assertEqual(self.client_mock.create_student.call_count, 1)
+        self.client_mock.add_tags_to_student.assert_called_once_with(42, ['Сайт'])
+        self.lead.refresh_from_db()
+        self.assertEqual((self.lead.status, self.lead.moyklass_id, self.lead.delivery_unknown), ('sent', 42, False))
+    
+    def test_retry_after_timeout_creates_when_not_found(self):
+        self.client_mock.create_student.side_effect = [MoyKlassTimeoutError('read timeout'), {'id': 7}]
+        push_pending_leads()
+        self.make_due()
+        self.client_mock.find_student_by_phone.return_value = None
+        
+        self.assertEqual(push_pending_leads()['sent'], 1)
+        self.assertEqual(self.client_mock.create_student.call_count, 2)
+        self.lead.refresh_from_db()
+        self.assertEqual(self.lead.moyklass_id, 7)
+    
+    def test_connection_error_does_not_look_up(self):
+        self.client_mock.create_student.side_effect = [MoyKlassUnavailableError('connection refused'), {'id': 7}]
+        push_pending_leads()
+        self.make_due()
+        
+        push_pending_leads()
+        self.client_mock.find_student_by_phone.assert_not_called()
@@ -0,0 +1,134 @@
+"""
+Общие для процесса ограничения запросов к API MoyKlass
+
+- RateLimiter (config.rate_limit): не больше N запросов в секунду
+- семафор одновременных запросов: при недоступности API потоки не копятся в ожидании
+- CircuitBreaker: после серии ошибок запросы на время отклоняются сразу
+- общая HTTP-сессия с пулом соединений
+"""
+import email.utils
+import threading
+import time
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from config.rate_limit import RateLimiter
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешнего API
+    
+    После failure_threshold ошибок подряд размыкается на reset_timeout секунд:
+    запросы отклоняются сразу. Затем пропускается один пробный запрос -
+    при успехе предохранитель замыкается, при ошибке снова размыкается.
+    Если пробный запрос так и не был выполнен (например, не дождался
+    семафора), поток должен вернуть право на него через release_trial().
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_until = 0.0
+        self._trial_owner = None
+    
+    @property
+    def is_open(self) -> bool:
+        return bool(self._opened_until)
+    
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос"""
+        with self._lock:
+            if not self._opened_until:
+                return True
+            if time.monotonic() >= self._opened_until and self._trial_owner is None:
+                self._trial_owner = threading.get_ident()
+                return True
+            return False
+    
+    def seconds_until_retry(self) -> float:
+        return max(0.0, self._opened_until - time.monotonic())
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_until = 0.0
+            self._trial_owner = None
+    
+    def release_trial(self):
+        """Возвращает право на пробный запрос, если поток получил его, но не выполнил запрос"""
+        with self._lock:
+            if self._trial_owner == threading.get_ident():
+                self._trial_owner = None
+    
+    def record_failure(self, open_for: Optional[float] = None):
+        """
+        Учитывает ошибку
+        
+        Args:
+            open_for: Разомкнуть сразу на указанное время (например, по Retry-After)
+        """
+        with self._lock:
+            self._failures += 1
+            self._trial_owner = None
+            if open_for or self._failures >= self.failure_threshold:
+                self._opened_until = time.monotonic() + (open_for or self.reset_timeout)
+
+
+def parse_retry_after(response: requests.Response, default: float = 1.0) -> float:
+    """Возвращает задержку из заголовка Retry-After (секунды или HTTP-дата)"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+_state_lock = threading.Lock()
+_rate_limiter: Optional[RateLimiter] = None
+_in_flight: Optional[threading.BoundedSemaphore] = None
+_in_flight_limit: Optional[int] = None
+_session: Optional[requests.Session] = None
+
+circuit_breaker = CircuitBreaker()
+
+
+def get_rate_limiter(rate: Optional[float]) -> RateLimiter:
+    """Общий для процесса ограничитель частоты (пересоздается при изменении настроек)"""
+    global _rate_limiter
+    with _state_lock:
+        if _rate_limiter is None or _rate_limiter.rate != rate:
+            _rate_limiter = RateLimiter(rate)
+        return _rate_limiter
+
+
+def get_in_flight_semaphore(limit: int) -> threading.BoundedSemaphore:
+    """Общий для процесса семафор одновременных запросов"""
+    global _in_flight, _in_flight_limit
+    with _state_lock:
+        if _in_flight is None or _in_flight_limit != limit:
+            _in_flight = threading.BoundedSemaphore(max(1, limit))
+            _in_flight_limit = limit
+        return _in_flight
+
+
+def get_session() -> requests.Session:
+    """Общая для процесса HTTP-сессия: соединения с API переиспользуются (keep-alive)"""
+    global _session
+    with _state_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=20)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
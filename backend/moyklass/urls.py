@@ -9,5 +9,6 @@ app_name = 'moyklass'
 urlpatterns = [
     path('webhook/', views.MoyKlassWebhookView.as_view(), name='webhook'),
     path('create-student/', views.create_student_from_booking, name='create_student'),
+    path('schedule/', views.schedule, name='schedule'),
 ]
 
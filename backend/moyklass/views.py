@@ -7,9 +7,13 @@ from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
 import json
 from .models import MoyKlassSettings
 from .client import MoyKlassClient, MoyKlassAPIError
+from .webhooks import enqueue_webhook, process_pending_events_async
+from .schedule import get_schedule, SCHEDULE_CACHE_TTL
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -25,26 +29,24 @@ class MoyKlassWebhookView(View):
     """
     
     def post(self, request):
-        """Обрабатывает POST запрос от MoyKlass"""
-        settings = MoyKlassSettings.objects.first()
+        """
+        Принимает POST запрос от MoyKlass
         
-        if not settings or not settings.webhook_enabled:
+        Событие только сохраняется в очередь и сразу подтверждается,
+        применение к локальным данным выполняется в фоне (moyklass.webhooks).
+        """
+        if not MoyKlassSettings.webhooks_enabled():
             return JsonResponse({'error': 'Webhooks disabled'}, status=403)
         
         try:
             data = json.loads(request.body)
-            event_type = data.get('event')
-            event_data = data.get('data', {})
+            if not isinstance(data, dict):
+                return JsonResponse({'error': 'Invalid payload'}, status=400)
             
-            # Обрабатываем событие
-            # Здесь можно добавить логику обработки различных типов событий
-            # Например:
-            # if event_type == 'student.created':
-            #     # Обработать создание ученика
-            # elif event_type == 'payment.created':
-            #     # Обработать создание платежа
+            enqueue_webhook(data, request.body)
+            process_pending_events_async()
             
-            return JsonResponse({'status': 'ok', 'event': event_type})
+            return JsonResponse({'status': 'ok', 'event': data.get('event')})
             
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
@@ -105,6 +107,39 @@ def create_student_from_booking(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@require_http_methods(["GET"])
+def schedule(request):
+    """
+    Расписание занятий для страниц записи (только из локальных таблиц, без запросов к MoyKlass)
+    
+    Параметры: filial (ID филиала), date_from, date_to (YYYY-MM-DD), free=1 (только со свободными местами)
+    """
+    try:
+        filial_id = int(request.GET['filial']) if request.GET.get('filial') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid filial'}, status=400)
+    
+    dates = {}
+    for param in ('date_from', 'date_to'):
+        value = request.GET.get(param)
+        try:
+            # parse_date возвращает None для неверного формата и бросает ValueError для несуществующей даты
+            dates[param] = parse_date(value) if value else None
+        except ValueError:
+            dates[param] = None
+        if value and dates[param] is None:
+            return JsonResponse({'error': f'Invalid {param}'}, status=400)
+    
+    response = JsonResponse(get_schedule(
+        filial_id=filial_id,
+        date_from=dates['date_from'],
+        date_to=dates['date_to'],
+        only_free=request.GET.get('free') in ('1', 'true'),
+    ))
+    patch_cache_control(response, public=True, max_age=SCHEDULE_CACHE_TTL)
+    return response
+
+
 @staff_member_required
 def get_source_fields(request):
     """
@@ -0,0 +1,242 @@
+"""
+Очередь вебхуков MoyKlass
+
+Вебхук сохраняется во входящую таблицу MoyKlassWebhookEvent одним INSERT и сразу
+подтверждается. Обработка выполняется пачками: события применяются к локальным
+копиям данных (MoyKlassStudent, MoyKlassPayment, MoyKlassBooking).
+
+Пачку применяет только тот обработчик (поток gunicorn или команда), который
+захватил начало очереди целиком, поэтому пачки применяются строго по порядку.
+Записи, уже обновленные более свежими данными (remote_updated_at), опоздавшим
+вебхуком не перезаписываются.
+"""
+import hashlib
+import logging
+import threading
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import MoyKlassWebhookEvent
+from .sync import MIRROR_MODELS, upsert_mirror_records
+
+logger = logging.getLogger(__name__)
+
+# Ключевые слова в типе события -> тип данных локальной копии
+EVENT_ENTITIES = [
+    ('payment', 'payments'),
+    ('join', 'bookings'),
+    ('booking', 'bookings'),
+    ('user', 'students'),
+    ('student', 'students'),
+]
+
+DELETE_KEYWORDS = ('delete', 'remove')
+
+MAX_ATTEMPTS = 5
+
+# Через это время захват пачки считается брошенным (обработчик упал) и снимается
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Не запускаем больше одного обработчика очереди в процессе
+_processing_lock = threading.Lock()
+
+
+def get_dedup_key(data: Dict[str, Any], body: bytes) -> str:
+    """Ключ дедупликации: ID события, если MoyKlass его передал, иначе хэш тела запроса"""
+    event_id = data.get('id') or data.get('eventId')
+    if event_id:
+        return f'{data.get("event", "")}:{event_id}'[:150]
+    return hashlib.sha256(body).hexdigest()
+
+
+def enqueue_webhook(data: Dict[str, Any], body: bytes):
+    """
+    Сохраняет вебхук в очередь одним INSERT
+    
+    Повторная доставка того же вебхука игнорируется за счет уникального ключа дедупликации.
+    """
+    MoyKlassWebhookEvent.objects.bulk_create(
+        [MoyKlassWebhookEvent(
+            event_type=str(data.get('event') or '')[:100],
+            dedup_key=get_dedup_key(data, body),
+            payload=data,
+        )],
+        ignore_conflicts=True,
+    )
+
+
+def resolve_entity(event_type: str) -> Optional[str]:
+    """Определяет тип данных локальной копии по типу события"""
+    event_type = (event_type or '').lower()
+    for keyword, entity in EVENT_ENTITIES:
+        if keyword in event_type:
+            return entity
+    return None
+
+
+def claim_pending_events(batch_size: int = 100) -> List[MoyKlassWebhookEvent]:
+    """
+    Захватывает начало очереди для обработки
+    
+    Захват выполняется одним UPDATE по первым batch_size ожидающим событиям.
+    Если часть из них уже захвачена другим обработчиком, захват отменяется:
+    иначе более новая пачка могла бы примениться раньше старой.
+    
+    Returns:
+        Захваченные события по порядку или пустой список
+    """
+    ids = list(
+        MoyKlassWebhookEvent.objects
+        .filter(status='pending')
+        .order_by('id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    claimed = (
+        MoyKlassWebhookEvent.objects
+        .filter(pk__in=ids, status='pending')
+        .filter(Q(claim_token='') | Q(claimed_at__lt=now - CLAIM_TIMEOUT))
+        .update(claim_token=token, claimed_at=now)
+    )
+    if claimed < len(ids):
+        # Начало очереди обрабатывает другой обработчик
+        MoyKlassWebhookEvent.objects.filter(claim_token=token).update(claim_token='', claimed_at=None)
+        return []
+    
+    return list(MoyKlassWebhookEvent.objects.filter(claim_token=token).order_by('id'))
+
+
+def drop_stale_records(model, records: List[Any]) -> List[Any]:
+    """
+    Убирает записи, которые старше уже сохраненных локально
+    
+    Сравнивается время изменения в MoyKlass (remote_updated_at): опоздавший
+    вебхук не должен перезаписывать данные, полученные синхронизацией позже.
+    Для моделей без remote_updated_at записи возвращаются без изменений.
+    """
+    if not records or not any(field.name == 'remote_updated_at' for field in model._meta.fields):
+        return records
+    stored = dict(
+        model.objects
+        .filter(moyklass_id__in=[record.moyklass_id for record in records])
+        .exclude(remote_updated_at__isnull=True)
+        .values_list('moyklass_id', 'remote_updated_at')
+    )
+    return [
+        record for record in records
+        if not (
+            record.remote_updated_at
+            and record.moyklass_id in stored
+            and record.remote_updated_at < stored[record.moyklass_id]
+        )
+    ]
+
+
+def process_pending_events(batch_size: int = 100) -> Dict[str, int]:
+    """
+    Обрабатывает пачку ожидающих вебхуков
+    
+    Записи одного типа сохраняются одним bulk upsert, удаления - одним DELETE.
+    Применяются только события, захваченные этим обработчиком.
+    
+    Returns:
+        Словарь со счетчиками processed, ignored, errors
+    """
+    results = {'processed': 0, 'ignored': 0, 'errors': 0}
+    
+    events = claim_pending_events(batch_size)
+    if not events:
+        return results
+    
+    upserts = {entity: {} for entity in MIRROR_MODELS}
+    deletes = {entity: set() for entity in MIRROR_MODELS}
+    applied = {entity: [] for entity in MIRROR_MODELS}
+    now = timezone.now()
+    
+    for event in events:
+        event.attempts += 1
+        event.claim_token = ''
+        event.claimed_at = None
+        entity = resolve_entity(event.event_type)
+        record = (event.payload or {}).get('data') or {}
+        
+        if not entity or not isinstance(record, dict) or not record.get('id'):
+            event.status = 'ignored'
+            event.processed_at = now
+            results['ignored'] += 1
+            continue
+        
+        try:
+            # Внутри пачки побеждает последнее событие по записи
+            if any(keyword in event.event_type.lower() for keyword in DELETE_KEYWORDS):
+                upserts[entity].pop(record['id'], None)
+                deletes[entity].add(record['id'])
+            else:
+                deletes[entity].discard(record['id'])
+                upserts[entity][record['id']] = MIRROR_MODELS[entity].from_api(record)
+            applied[entity].append(event)
+        except Exception as e:
+            event.status = 'error' if event.attempts >= MAX_ATTEMPTS else 'pending'
+            event.error_message = str(e)
+            results['errors'] += 1
+    
+    for entity, model in MIRROR_MODELS.items():
+        if not applied[entity]:
+            continue
+        try:
+            with transaction.atomic():
+                upsert_mirror_records(model, drop_stale_records(model, list(upserts[entity].values())))
+                if deletes[entity]:
+                    model.objects.filter(moyklass_id__in=deletes[entity]).delete()
+            for event in applied[entity]:
+                event.status = 'processed'
+                event.processed_at = now
+                event.error_message = ''
+                results['processed'] += 1
+        except Exception as e:
+            logger.error(f'Ошибка применения вебхуков MoyKlass ({entity}): {str(e)}', exc_info=True)
+            for event in applied[entity]:
+                event.status = 'error' if event.attempts >= MAX_ATTEMPTS else 'pending'
+                event.error_message = str(e)
+                results['errors'] += 1
+    
+    MoyKlassWebhookEvent.objects.bulk_update(
+        events, ['status', 'attempts', 'error_message', 'processed_at', 'claim_token', 'claimed_at']
+    )
+    return results
+
+
+def drain_queue(batch_size: int = 100) -> Dict[str, int]:
+    """Обрабатывает очередь, пока в ней есть ожидающие вебхуки"""
+    totals = {'processed': 0, 'ignored': 0, 'errors': 0}
+    while True:
+        results = process_pending_events(batch_size)
+        for key, value in results.items():
+            totals[key] += value
+        if not any(results.values()) or results['errors']:
+            # Очередь пуста или пачка с ошибками - остаток разберет следующий запуск
+            return totals
+
+
+def process_pending_events_async():
+    """Запускает обработку очереди в фоновом потоке, если она еще не запущена"""
+    def worker():
+        if not _processing_lock.acquire(blocking=False):
+            return
+        try:
+            drain_queue()
+        except Exception as e:
+            logger.error(f'Ошибка обработки очереди вебхуков MoyKlass: {str(e)}', exc_info=True)
+        finally:
+            _processing_lock.release()
+            connection.close()
+    
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
@@ -6,7 +6,7 @@ from django.urls import reverse
 from django.utils.html import format_html
 import json
 from config.constants import get_api_domain, get_protocol, TELEGRAM_WEBHOOK_PATH
-from .models import TelegramBotSettings, TelegramUser, TelegramHashtagMapping, TelegramSyncLog
+from .models import TelegramBotSettings, TelegramUser, TelegramHashtagMapping, TelegramSyncLog, TelegramUpdate
 from .bot import set_webhook, delete_webhook, get_bot_settings
 
 
@@ -76,7 +76,7 @@ class TelegramBotSettingsAdmin(admin.ModelAdmin):
     def get_readonly_fields(self, request, obj=None):
         """Делаем webhook_url и webhook_actions только для чтения"""
         readonly = list(super().get_readonly_fields(request, obj))
-        readonly.extend(['webhook_url', 'webhook_actions', 'channel_id'])
+        readonly.extend(['webhook_url', 'webhook_actions', 'channel_id', 'updates_offset'])
         return readonly
     
     def webhook_actions(self, obj):
@@ -141,6 +141,7 @@ class TelegramBotSettingsAdmin(admin.ModelAdmin):
                 'notify_on_booking',
                 'notify_on_banner_start',
                 'notify_on_banner_end',
+                'notification_digest_seconds',
             ),
             'description': 'Выберите, какие события должны отправлять уведомления'
         }),
@@ -150,6 +151,7 @@ class TelegramBotSettingsAdmin(admin.ModelAdmin):
                 'channel_username',
                 'channel_id',
                 'catalog_page',
+                'check_chat_id',
             ),
             'description': 'Настройки для автоматического создания элементов каталога из постов в Telegram канале. '
                          'Бот должен быть администратором канала. Укажите username канала (например, @channel_name) '
@@ -157,7 +159,7 @@ class TelegramBotSettingsAdmin(admin.ModelAdmin):
                          'Обязательно укажите страницу каталога, в которую будут создаваться элементы.'
         }),
         ('Техническая информация', {
-            'fields': ('webhook_url',),
+            'fields': ('webhook_url', 'updates_offset'),
             'classes': ('collapse',),
             'description': 'URL webhook устанавливается автоматически при нажатии кнопки "Установить webhook"'
         }),
@@ -263,6 +265,32 @@ class TelegramHashtagMappingAdmin(admin.ModelAdmin):
         return ['created_at', 'updated_at']
 
 
+@admin.register(TelegramUpdate)
+class TelegramUpdateAdmin(admin.ModelAdmin):
+    """Админка для очереди обновлений Telegram"""
+    
+    list_display = ['update_id', 'update_type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'update_type', 'received_at']
+    readonly_fields = [
+        'update_id', 'update_type', 'payload', 'status', 'attempts',
+        'error_message', 'received_at', 'processed_at'
+    ]
+    search_fields = ['=update_id', 'error_message']
+    actions = ['requeue_updates']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def requeue_updates(self, request, queryset):
+        """Возвращает выбранные обновления в очередь"""
+        from .inbox import process_pending_updates_async
+        
+        updated = queryset.exclude(status='pending').update(status='pending', attempts=0, error_message='')
+        process_pending_updates_async()
+        self.message_user(request, f'✓ Возвращено в очередь: {updated}', level='SUCCESS')
+    requeue_updates.short_description = 'Обработать повторно'
+
+
 # Регистрируем TelegramSyncLog с обработкой ошибок
 try:
     @admin.register(TelegramSyncLog)
@@ -315,8 +343,9 @@ try:
         
         def raw_data_preview(self, obj):
             """Показывает превью исходных данных"""
-            if obj.raw_data:
-                formatted = json.dumps(obj.raw_data, indent=2, ensure_ascii=False)
+            raw_data = obj.get_raw_data() if obj.pk else None
+            if raw_data:
+                formatted = json.dumps(raw_data, indent=2, ensure_ascii=False)
                 return format_html('<pre style="max-height: 400px; overflow: auto; background: #f5f5f5; padding: 10px; border-radius: 4px;">{}</pre>', formatted)
             return '-'
         raw_data_preview.short_description = 'Исходные данные'
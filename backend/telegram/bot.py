@@ -4,19 +4,30 @@
 import requests
 import logging
 import os
+import random
 import tempfile
 import re
 from io import BytesIO
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
 from django.core.files import File
 from django.core.files.images import ImageFile
 from django.utils.text import slugify
-from .models import TelegramBotSettings, TelegramUser, TelegramSyncLog
-from content.models import transliterate_slug, Article
+from .models import TelegramBotSettings, TelegramUser, TelegramSyncLog, TelegramSyncLogPayload
+from .transport import TELEGRAM_API_URL, call_api, download_file, fan_out
+from content.models import transliterate_slug, unique_slug, Article
 
 logger = logging.getLogger(__name__)
 
-TELEGRAM_API_URL = 'https://api.telegram.org/bot{token}/{method}'
+# Хештег: слово после # (буквы, цифры, подчеркивания)
+HASHTAG_RE = re.compile(r'#(\w+)', re.UNICODE)
+
+# Таблица активных настроек хештегов. Ключ содержит версию из БД (число настроек и время
+# последнего изменения), поэтому изменения из админки видны и долгоживущим обработчикам
+# (--loop), хотя локальный кэш у каждого процесса свой
+HASHTAG_ROUTES_CACHE_KEY = 'telegram_hashtag_routes'
+HASHTAG_ROUTES_CACHE_TTL = 3600
 
 
 def get_bot_settings():
@@ -24,6 +35,23 @@ def get_bot_settings():
     return TelegramBotSettings.objects.first()
 
 
+def _build_message_payload(chat_id, text, parse_mode='HTML', reply_markup=None, keyboard=None):
+    """Параметры sendMessage"""
+    payload = {
+        'chat_id': chat_id,
+        'text': text,
+        'parse_mode': parse_mode
+    }
+    
+    # Приоритет: reply_markup (inline) > keyboard (reply)
+    if reply_markup:
+        payload['reply_markup'] = reply_markup
+    elif keyboard:
+        payload['reply_markup'] = keyboard
+    
+    return payload
+
+
 def send_message(chat_id, text, parse_mode='HTML', reply_markup=None, keyboard=None):
     """
     Отправить сообщение пользователю
@@ -43,24 +71,10 @@ def send_message(chat_id, text, parse_mode='HTML', reply_markup=None, keyboard=N
         logger.debug('Telegram бот не активен')
         return False
     
-    url = TELEGRAM_API_URL.format(token=bot_settings.token, method='sendMessage')
-    
-    payload = {
-        'chat_id': chat_id,
-        'text': text,
-        'parse_mode': parse_mode
-    }
-    
-    # Приоритет: reply_markup (inline) > keyboard (reply)
-    if reply_markup:
-        payload['reply_markup'] = reply_markup
-    elif keyboard:
-        payload['reply_markup'] = keyboard
+    payload = _build_message_payload(chat_id, text, parse_mode, reply_markup, keyboard)
     
     try:
-        response = requests.post(url, json=payload, timeout=10)
-        
-        response.raise_for_status()
+        call_api(bot_settings.token, 'sendMessage', payload)
         return True
     except requests.exceptions.RequestException as e:
         logger.error(f'Ошибка отправки сообщения в Telegram: {str(e)}')
@@ -80,8 +94,6 @@ def answer_callback_query(callback_query_id, text=None, show_alert=False):
     if not bot_settings or not bot_settings.is_active:
         return False
     
-    url = TELEGRAM_API_URL.format(token=bot_settings.token, method='answerCallbackQuery')
-    
     payload = {
         'callback_query_id': callback_query_id
     }
@@ -92,8 +104,8 @@ def answer_callback_query(callback_query_id, text=None, show_alert=False):
         payload['show_alert'] = True
     
     try:
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status()
+        # Ответ на нажатие кнопки не является сообщением и не ждет лимитов рассылки
+        call_api(bot_settings.token, 'answerCallbackQuery', payload, limit_rate=False)
         return True
     except requests.exceptions.RequestException as e:
         logger.error(f'Ошибка ответа на callback query: {str(e)}')
@@ -115,8 +127,6 @@ def edit_message_text(chat_id, message_id, text, parse_mode='HTML', reply_markup
     if not bot_settings or not bot_settings.is_active:
         return False
     
-    url = TELEGRAM_API_URL.format(token=bot_settings.token, method='editMessageText')
-    
     payload = {
         'chat_id': chat_id,
         'message_id': message_id,
@@ -128,17 +138,44 @@ def edit_message_text(chat_id, message_id, text, parse_mode='HTML', reply_markup
         payload['reply_markup'] = reply_markup
     
     try:
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status()
+        call_api(bot_settings.token, 'editMessageText', payload, limit_rate=False)
         return True
     except requests.exceptions.RequestException as e:
         logger.error(f'Ошибка редактирования сообщения: {str(e)}')
         return False
 
 
+def send_message_to_chats(chat_ids, text, parse_mode='HTML', reply_markup=None):
+    """
+    Отправить одно сообщение нескольким получателям параллельно
+    
+    Args:
+        chat_ids: ID чатов
+        text: Текст сообщения
+        parse_mode: Режим парсинга
+        reply_markup: Inline клавиатура (опционально)
+    
+    Returns:
+        dict: {chat_id: None при успехе или текст ошибки}
+    """
+    bot_settings = get_bot_settings()
+    if not bot_settings or not bot_settings.is_active:
+        logger.debug('Telegram бот не активен')
+        return {chat_id: 'Telegram бот не активен' for chat_id in chat_ids}
+    
+    payload = _build_message_payload(None, text, parse_mode, reply_markup)
+    results = fan_out(bot_settings.token, 'sendMessage', chat_ids, payload)
+    
+    for chat_id, error in results.items():
+        if error:
+            logger.error(f'Ошибка отправки сообщения в Telegram (чат {chat_id}): {error}')
+    
+    return results
+
+
 def send_notification_to_admins(text):
     """
-    Отправить уведомление всем админам
+    Отправить уведомление всем админам (параллельно, с учетом лимитов Telegram)
     
     Args:
         text: Текст уведомления
@@ -146,14 +183,14 @@ def send_notification_to_admins(text):
     Returns:
         int: Количество успешно отправленных уведомлений
     """
-    admins = TelegramUser.objects.filter(is_admin=True, is_active=True)
-    sent_count = 0
-    
-    for admin in admins:
-        if send_message(admin.telegram_id, text):
-            sent_count += 1
+    admin_ids = list(
+        TelegramUser.objects.filter(is_admin=True, is_active=True).values_list('telegram_id', flat=True)
+    )
+    if not admin_ids:
+        return 0
     
-    return sent_count
+    results = send_message_to_chats(admin_ids, text)
+    return sum(1 for error in results.values() if error is None)
 
 
 def get_file_from_telegram(file_id):
@@ -171,10 +208,8 @@ def get_file_from_telegram(file_id):
         return None
     
     # Сначала получаем путь к файлу
-    url = TELEGRAM_API_URL.format(token=bot_settings.token, method='getFile')
     try:
-        response = requests.post(url, json={'file_id': file_id}, timeout=10)
-        response.raise_for_status()
+        response = call_api(bot_settings.token, 'getFile', {'file_id': file_id}, limit_rate=False)
         file_data = response.json()
         
         if not file_data.get('ok'):
@@ -184,11 +219,7 @@ def get_file_from_telegram(file_id):
         file_path = file_data['result']['file_path']
         
         # Скачиваем файл
-        download_url = f'https://api.telegram.org/file/bot{bot_settings.token}/{file_path}'
-        file_response = requests.get(download_url, timeout=30)
-        file_response.raise_for_status()
-        
-        return file_response.content
+        return download_file(bot_settings.token, file_path)
     except requests.exceptions.RequestException as e:
         logger.error(f'Ошибка получения файла из Telegram: {str(e)}')
         return None
@@ -229,10 +260,20 @@ def extract_hashtags(text):
     Returns:
         list: Список хештегов без символа #
     """
-    # Ищем хештеги (слово после #, может содержать буквы, цифры и подчеркивания)
-    hashtags = re.findall(r'#(\w+)', text, re.UNICODE)
     # Приводим к нижнему регистру для сравнения
-    return [tag.lower() for tag in hashtags]
+    return [tag.lower() for tag in HASHTAG_RE.findall(text)]
+
+
+def strip_hashtags(text):
+    """Удалить все хештеги из текста (за один проход)"""
+    return HASHTAG_RE.sub('', text)
+
+
+def _should_keep_payload(event_type, status):
+    """Исходные данные сохраняются для ошибок и предупреждений и для доли остальных событий"""
+    if status in ('error', 'warning') or event_type in ('error', 'warning'):
+        return True
+    return random.random() < settings.TELEGRAM_LOG_PAYLOAD_SAMPLE_RATE
 
 
 def log_sync_event(event_type, status='success', message='', message_id=None, chat_id=None, 
@@ -250,7 +291,8 @@ def log_sync_event(event_type, status='success', message='', message_id=None, ch
         hashtags: Список хештегов или строка через запятую
         catalog_item: Объект CatalogItem
         error_details: Детали ошибки
-        raw_data: Исходные данные из Telegram
+        raw_data: Исходные данные из Telegram (сохраняются сжатыми, для успешных
+            событий - только для доли TELEGRAM_LOG_PAYLOAD_SAMPLE_RATE)
     """
     try:
         hashtags_str = ', '.join(hashtags) if isinstance(hashtags, list) else (hashtags or '')
@@ -265,9 +307,10 @@ def log_sync_event(event_type, status='success', message='', message_id=None, ch
             hashtags=hashtags_str,
             catalog_item=catalog_item,
             catalog_item_title=catalog_item.title if catalog_item else '',
-            error_details=error_details,
-            raw_data=raw_data
+            error_details=error_details
         )
+        if raw_data is not None and _should_keep_payload(event_type, status):
+            TelegramSyncLogPayload.objects.create(log=log, data=TelegramSyncLogPayload.compress(raw_data))
         return log
     except Exception as e:
         # Обрабатываем ошибки, связанные с отсутствием таблицы (миграция еще не применена)
@@ -293,6 +336,35 @@ def log_sync_event(event_type, status='success', message='', message_id=None, ch
         return None
 
 
+def get_hashtag_routes_version():
+    """Версия настроек хештегов: меняется при добавлении, изменении и удалении настройки"""
+    from .models import TelegramHashtagMapping
+    
+    stamp = TelegramHashtagMapping.objects.aggregate(count=Count('pk'), updated=Max('updated_at'))
+    updated = int(stamp['updated'].timestamp() * 1000000) if stamp['updated'] else 0
+    return f'{stamp["count"]}:{updated}'
+
+
+def get_hashtag_routes():
+    """
+    Таблица активных настроек хештегов
+    
+    Returns:
+        dict: {хештег в нижнем регистре: id TelegramHashtagMapping}
+    """
+    from .models import TelegramHashtagMapping
+    
+    cache_key = f'{HASHTAG_ROUTES_CACHE_KEY}:{get_hashtag_routes_version()}'
+    routes = cache.get(cache_key)
+    if routes is None:
+        routes = {
+            hashtag.lstrip('#').lower(): pk
+            for pk, hashtag in TelegramHashtagMapping.objects.filter(is_active=True).values_list('pk', 'hashtag')
+        }
+        cache.set(cache_key, routes, HASHTAG_ROUTES_CACHE_TTL)
+    return routes
+
+
 def find_hashtag_mapping(hashtags):
     """
     Найти настройку для хештега
@@ -308,30 +380,68 @@ def find_hashtag_mapping(hashtags):
     if not hashtags:
         return None
     
-    # Ищем первую активную настройку для любого из хештегов
+    # Первая активная настройка для любого из хештегов
+    routes = get_hashtag_routes()
     for hashtag in hashtags:
-        mapping = TelegramHashtagMapping.objects.filter(
-            hashtag__iexact=hashtag,
-            is_active=True
-        ).first()
-        if mapping:
-            return mapping
+        mapping_id = routes.get(hashtag.lower())
+        if mapping_id:
+            return TelegramHashtagMapping.objects.filter(pk=mapping_id, is_active=True).select_related(
+                'catalog_page', 'button_booking_form', 'button_quiz'
+            ).first()
     
     return None
 
 
-def create_or_update_catalog_item_from_telegram_post(post_data, is_edit=False):
+def get_next_catalog_order(catalog_page, base_order=0):
+    """
+    Порядок для нового элемента каталога
+    
+    Если base_order > 0 - следующий после последнего элемента с таким же или большим order,
+    иначе - в конец каталога.
+    """
+    from content.models import CatalogItem
+    
+    items = CatalogItem.objects.filter(page=catalog_page)
+    if base_order > 0:
+        last_order = items.filter(order__gte=base_order).order_by('-order').values_list('order', flat=True).first()
+        return last_order + 1 if last_order is not None else base_order
+    last_order = items.order_by('-order').values_list('order', flat=True).first()
+    return last_order + 1 if last_order is not None else 0
+
+
+class CatalogOrderAllocator:
+    """
+    Порядок новых элементов каталога в пределах пачки постов
+    
+    Последний порядок запрашивается из БД один раз на страницу каталога
+    и базовый порядок, дальше номера выдаются по возрастанию без запросов.
+    """
+    
+    def __init__(self):
+        self._next = {}
+    
+    def allocate(self, catalog_page, base_order=0):
+        key = (catalog_page.pk, base_order if base_order > 0 else 0)
+        if key not in self._next:
+            self._next[key] = get_next_catalog_order(catalog_page, base_order)
+        order = self._next[key]
+        self._next[key] = order + 1
+        return order
+
+
+def create_or_update_catalog_item_from_telegram_post(post_data, is_edit=False, order_allocator=None):
     """
     Создать или обновить элемент каталога из поста Telegram
     
     Args:
         post_data: Данные поста из Telegram (channel_post, edited_channel_post или message)
         is_edit: True если это обновление существующего поста
+        order_allocator: CatalogOrderAllocator пачки (при обработке нескольких постов подряд)
     
     Returns:
         CatalogItem: Созданный или обновленный элемент каталога или None
     """
-    from content.utils.image_processing import process_uploaded_image
+    from content.utils.image_processing import process_image_data
     from content.models import CatalogItem
     
     bot_settings = get_bot_settings()
@@ -395,22 +505,17 @@ def create_or_update_catalog_item_from_telegram_post(post_data, is_edit=False):
         catalog_page = hashtag_mapping.catalog_page
         
         # Извлекаем изображение
-        image_file = None
-        image_filename = None
+        image_data = None
         photo = post_data.get('photo')
         if photo:
             # Берем самое большое изображение (последнее в массиве)
             largest_photo = photo[-1] if isinstance(photo, list) else photo
             file_id = largest_photo.get('file_id')
             if file_id:
-                image_file, image_filename = download_image_from_telegram(file_id)
+                image_data = get_file_from_telegram(file_id)
         
         # Убираем хештеги из текста для заголовка и описания
-        text_without_hashtags = text
-        for hashtag in hashtags:
-            # Удаляем хештег из текста (с # и без)
-            text_without_hashtags = re.sub(rf'#{hashtag}\b', '', text_without_hashtags, flags=re.IGNORECASE)
-        text_without_hashtags = text_without_hashtags.strip()
+        text_without_hashtags = strip_hashtags(text).strip()
         
         # Разделяем текст на части, если указан разделитель
         full_description = text_without_hashtags
@@ -448,16 +553,6 @@ def create_or_update_catalog_item_from_telegram_post(post_data, is_edit=False):
         else:
             card_description = full_description.strip()
         
-        # Создаем slug
-        slug_base = transliterate_slug(title) or f'telegram_post_{post_data.get("message_id", "unknown")}'
-        
-        # Проверяем, не существует ли уже элемент с таким slug
-        slug = slug_base
-        counter = 1
-        while CatalogItem.objects.filter(slug=slug).exists():
-            slug = f'{slug_base}_{counter}'
-            counter += 1
-        
         # Если элемент уже существует - обновляем его
         if existing_item:
             catalog_item = existing_item
@@ -488,20 +583,14 @@ def create_or_update_catalog_item_from_telegram_post(post_data, is_edit=False):
             # Определяем порядок
             # Если в настройках указан order > 0, используем его как базовый
             # Иначе берем последний элемент + 1
-            if hashtag_mapping.order > 0:
-                # Ищем последний элемент с таким же или большим order
-                last_item = CatalogItem.objects.filter(
-                    page=catalog_page,
-                    order__gte=hashtag_mapping.order
-                ).order_by('-order').first()
-                if last_item:
-                    order = last_item.order + 1
-                else:
-                    order = hashtag_mapping.order
+            if order_allocator is not None:
+                order = order_allocator.allocate(catalog_page, hashtag_mapping.order)
             else:
-                # Используем порядок по умолчанию (в конец)
-                last_item = CatalogItem.objects.filter(page=catalog_page).order_by('-order').first()
-                order = (last_item.order + 1) if last_item else 0
+                order = get_next_catalog_order(catalog_page, hashtag_mapping.order)
+            
+            # Свободный slug (все занятые варианты - одним запросом)
+            slug_base = transliterate_slug(title) or f'telegram_post_{message_id}'
+            slug = unique_slug(CatalogItem, slug_base, separator='_')
             
             # Создаем элемент каталога с настройками из хештега
             catalog_item = CatalogItem(
@@ -525,36 +614,18 @@ def create_or_update_catalog_item_from_telegram_post(post_data, is_edit=False):
                 telegram_message_id=message_id
             )
         
-        # Сохраняем изображение для карточки (если есть)
-        if image_file and image_filename:
-            catalog_item.card_image.save(
-                image_filename,
-                image_file,
-                save=False
-            )
-            # Также используем это изображение для страницы элемента
-            catalog_item.image.save(
-                image_filename,
-                image_file,
-                save=False
-            )
-        
-        catalog_item.save()
-        
-        # Обрабатываем изображения после сохранения
-        if catalog_item.card_image and hasattr(catalog_item.card_image, 'file'):
+        # Изображение для карточки и для страницы элемента: одно декодирование,
+        # одна запись оптимизированного файла, на который ссылаются оба поля
+        if image_data:
             try:
-                process_uploaded_image(catalog_item.card_image, image_type='general')
-                catalog_item.save(update_fields=['card_image'])
+                process_image_data(image_data, [
+                    (catalog_item.card_image, 'general'),
+                    (catalog_item.image, 'general'),
+                ])
             except Exception as e:
-                logger.error(f'Ошибка обработки изображения карточки для элемента {catalog_item.title}: {e}')
+                logger.error(f'Ошибка обработки изображения для элемента {catalog_item.title}: {e}')
         
-        if catalog_item.image and hasattr(catalog_item.image, 'file'):
-            try:
-                process_uploaded_image(catalog_item.image, image_type='general')
-                catalog_item.save(update_fields=['image'])
-            except Exception as e:
-                logger.error(f'Ошибка обработки изображения страницы для элемента {catalog_item.title}: {e}')
+        catalog_item.save()
         
         action = 'Обновлен' if existing_item else 'Создан'
         logger.info(f'{action} элемент каталога из Telegram поста с хештегом {hashtags}: {catalog_item.title}')
@@ -625,12 +696,13 @@ def deactivate_catalog_item_by_message_id(message_id, chat_id=None):
         return None
 
 
-def handle_webhook_update(update_data):
+def handle_webhook_update(update_data, order_allocator=None):
     """
     Обработать обновление от Telegram webhook
     
     Args:
         update_data: Данные обновления от Telegram
+        order_allocator: CatalogOrderAllocator пачки обновлений (необязательно)
     """
     try:
         bot_settings = get_bot_settings()
@@ -690,7 +762,7 @@ def handle_webhook_update(update_data):
                     raw_data=channel_post
                 )
                 # Создаем элемент каталога из поста
-                catalog_item = create_or_update_catalog_item_from_telegram_post(channel_post, is_edit=False)
+                catalog_item = create_or_update_catalog_item_from_telegram_post(channel_post, is_edit=False, order_allocator=order_allocator)
                 if catalog_item:
                     logger.info(f'Создан элемент каталога из Telegram канала: {catalog_item.title}')
                 else:
@@ -738,7 +810,7 @@ def handle_webhook_update(update_data):
                     raw_data=edited_channel_post
                 )
                 # Обновляем элемент каталога из отредактированного поста
-                catalog_item = create_or_update_catalog_item_from_telegram_post(edited_channel_post, is_edit=True)
+                catalog_item = create_or_update_catalog_item_from_telegram_post(edited_channel_post, is_edit=True, order_allocator=order_allocator)
                 if catalog_item:
                     logger.info(f'Обновлен элемент каталога из Telegram канала: {catalog_item.title}')
                 else:
@@ -895,19 +967,13 @@ def set_webhook(webhook_url):
     if not bot_settings or not bot_settings.is_active:
         return False
     
-    url = TELEGRAM_API_URL.format(token=bot_settings.token, method='setWebhook')
-    
     try:
-        response = requests.post(url, json={
-            'url': webhook_url
-        }, timeout=10)
+        response = call_api(bot_settings.token, 'setWebhook', {'url': webhook_url}, limit_rate=False)
         
         # Логируем ответ для отладки
         logger.info(f'Telegram API response status: {response.status_code}')
         logger.info(f'Telegram API response: {response.text}')
         
-        response.raise_for_status()
-        
         # Сохраняем URL webhook в настройках
         bot_settings.webhook_url = webhook_url
         bot_settings.save(update_fields=['webhook_url'])
@@ -927,11 +993,8 @@ def delete_webhook():
     if not bot_settings:
         return False
     
-    url = TELEGRAM_API_URL.format(token=bot_settings.token, method='deleteWebhook')
-    
     try:
-        response = requests.post(url, timeout=10)
-        response.raise_for_status()
+        call_api(bot_settings.token, 'deleteWebhook', limit_rate=False)
         
         bot_settings.webhook_url = ''
         bot_settings.save(update_fields=['webhook_url'])
@@ -1101,6 +1164,17 @@ def handle_callback_query(callback_query):
             show_clients_list(chat_id, message_id, callback_query_id)
         elif callback_data == 'crm_refresh':
             show_main_menu(chat_id, message_id, callback_query_id)
+        elif callback_data.startswith('crm_leads_page:'):
+            # Листание лидов: crm_leads_page:<фильтр>:<a|b><id>
+            _, list_filter, cursor_value = (callback_data.split(':', 2) + [''])[:3]
+            cursor, direction = parse_page_cursor(cursor_value)
+            status_code = None if list_filter == 'open' else list_filter
+            show_leads_list(chat_id, message_id, callback_query_id, status_code=status_code,
+                            cursor=cursor, direction=direction)
+        elif callback_data.startswith('crm_clients_page:'):
+            # Листание клиентов: crm_clients_page:<a|b><id>
+            cursor, direction = parse_page_cursor(callback_data.split(':', 1)[1])
+            show_clients_list(chat_id, message_id, callback_query_id, cursor=cursor, direction=direction)
         elif callback_data.startswith('crm_lead_'):
             # Просмотр деталей лида: crm_lead_<id>
             lead_id = callback_data.replace('crm_lead_', '')
@@ -1151,30 +1225,101 @@ def show_main_menu(chat_id, message_id=None, callback_query_id=None):
         send_message(chat_id, text, reply_markup=keyboard)
 
 
-def show_leads_list(chat_id, message_id=None, callback_query_id=None, status_code=None):
-    """Показать список лидов"""
+CRM_PAGE_SIZE = 10
+
+# Фильтры списка лидов: ключ в callback_data -> (коды статусов, заголовок)
+LEAD_LIST_FILTERS = {
+    'open': (('new', 'in_progress'), '📋 Необработанные заявки'),
+    'new': (('new',), None),
+    'in_progress': (('in_progress',), None),
+}
+
+
+def keyset_page(queryset, cursor=None, direction='next', page_size=CRM_PAGE_SIZE):
+    """
+    Страница списка по курсору id (от новых к старым)
+    
+    Вместо OFFSET и count() выбирается page_size + 1 строк: лишняя строка
+    показывает, есть ли следующая страница.
+    
+    Args:
+        queryset: Исходный QuerySet
+        cursor: id, от которого листаем (None - первая страница)
+        direction: 'next' - записи старше курсора, 'prev' - новее курсора
+        page_size: Размер страницы
+    
+    Returns:
+        tuple: (список объектов, есть ли более новые, есть ли более старые)
+    """
+    if cursor is None:
+        rows = list(queryset.order_by('-id')[:page_size + 1])
+        return rows[:page_size], False, len(rows) > page_size
+    
+    if direction == 'prev':
+        rows = list(queryset.filter(id__gt=cursor).order_by('id')[:page_size + 1])
+        has_newer = len(rows) > page_size
+        return list(reversed(rows[:page_size])), has_newer, True
+    
+    rows = list(queryset.filter(id__lt=cursor).order_by('-id')[:page_size + 1])
+    return rows[:page_size], True, len(rows) > page_size
+
+
+def parse_page_cursor(value):
+    """
+    Разобрать курсор из callback_data: 'b<id>' - страница старше id, 'a<id>' - новее id
+    
+    Returns:
+        tuple: (cursor, direction) или (None, 'next'), если курсор некорректен
+    """
+    if len(value) > 1 and value[0] in ('a', 'b') and value[1:].isdigit():
+        return int(value[1:]), 'prev' if value[0] == 'a' else 'next'
+    return None, 'next'
+
+
+def get_page_navigation(prefix, items, has_newer, has_older):
+    """Ряд кнопок листания для страницы списка"""
+    row = []
+    if items and has_newer:
+        row.append({'text': '⬅️ Новее', 'callback_data': f'{prefix}:a{items[0].id}'})
+    if items and has_older:
+        row.append({'text': 'Старее ➡️', 'callback_data': f'{prefix}:b{items[-1].id}'})
+    return row
+
+
+def show_leads_list(chat_id, message_id=None, callback_query_id=None, status_code=None,
+                    cursor=None, direction='next'):
+    """
+    Показать страницу списка лидов
+    
+    Статусы берутся из кэшированной карты, страница выбирается одним запросом
+    (со статусом через JOIN) по курсору id. Курсор передается в callback_data
+    кнопок листания: crm_leads_page:<фильтр>:<a|b><id>.
+    """
     try:
-        from crm.models import Lead, LeadStatus
+        from crm.models import Lead, get_lead_status_map
         
-        if status_code:
-            status = LeadStatus.objects.filter(code=status_code).first()
-            if not status:
-                if callback_query_id:
-                    answer_callback_query(callback_query_id, f'❌ Статус "{status_code}" не найден', show_alert=True)
-                return
-            leads = Lead.objects.filter(status=status).order_by('-created_at')[:20]
-            title = f'📋 {status.name}'
+        status_map = get_lead_status_map()
+        list_filter = status_code or 'open'
+        if list_filter in LEAD_LIST_FILTERS:
+            codes, title = LEAD_LIST_FILTERS[list_filter]
         else:
-            # Необработанные (новые и в работе)
-            new_status = LeadStatus.objects.filter(code='new').first()
-            in_progress_status = LeadStatus.objects.filter(code='in_progress').first()
-            statuses = [s for s in [new_status, in_progress_status] if s]
-            if not statuses:
-                if callback_query_id:
+            codes, title = (status_code,), None
+        
+        statuses = [status_map[code] for code in codes if code in status_map]
+        if not statuses:
+            if callback_query_id:
+                if status_code:
+                    answer_callback_query(callback_query_id, f'❌ Статус "{status_code}" не найден', show_alert=True)
+                else:
                     answer_callback_query(callback_query_id, '❌ Статусы не настроены', show_alert=True)
-                return
-            leads = Lead.objects.filter(status__in=statuses).order_by('-created_at')[:20]
-            title = '📋 Необработанные заявки'
+            return
+        if not title:
+            title = f'📋 {statuses[0]["name"]}'
+        
+        queryset = Lead.objects.filter(
+            status_id__in=[status['id'] for status in statuses]
+        ).select_related('status')
+        leads, has_newer, has_older = keyset_page(queryset, cursor, direction)
         
         if not leads:
             text = f'{title}\n\n✅ Нет заявок.'
@@ -1192,10 +1337,10 @@ def show_leads_list(chat_id, message_id=None, callback_query_id=None, status_cod
                 answer_callback_query(callback_query_id, '✅ Нет заявок')
             return
         
-        text = f'{title} ({leads.count()}):\n\n'
+        text = f'{title}:\n\n'
         buttons = []
         
-        for lead in leads[:10]:  # Показываем первые 10
+        for lead in leads:
             name = lead.get_name() or 'Без имени'
             phone = lead.get_phone() or 'Нет телефона'
             status_name = lead.status.name if lead.status else 'Без статуса'
@@ -1207,6 +1352,9 @@ def show_leads_list(chat_id, message_id=None, callback_query_id=None, status_cod
             )
             buttons.append([{'text': f'#{lead.id} {name}', 'callback_data': f'crm_lead_{lead.id}'}])
         
+        navigation = get_page_navigation(f'crm_leads_page:{list_filter}', leads, has_newer, has_older)
+        if navigation:
+            buttons.append(navigation)
         buttons.append([{'text': '🔙 Назад', 'callback_data': 'crm_refresh'}])
         
         keyboard = {'inline_keyboard': buttons}
@@ -1217,7 +1365,7 @@ def show_leads_list(chat_id, message_id=None, callback_query_id=None, status_cod
             send_message(chat_id, text, keyboard=get_crm_menu_keyboard())
         
         if callback_query_id:
-            answer_callback_query(callback_query_id, f'✅ Найдено {leads.count()} заявок')
+            answer_callback_query(callback_query_id, f'✅ Показано {len(leads)} заявок')
             
     except Exception as e:
         logger.error(f'Ошибка показа списка лидов: {str(e)}', exc_info=True)
@@ -1285,21 +1433,21 @@ def show_lead_details(chat_id, message_id, callback_query_id, lead_id):
 def set_lead_status(chat_id, message_id, callback_query_id, lead_id, status_code):
     """Изменить статус лида"""
     try:
-        from crm.models import Lead, LeadStatus
+        from crm.models import Lead, get_lead_status_map
         
         lead = Lead.objects.get(id=lead_id)
-        status = LeadStatus.objects.filter(code=status_code).first()
+        status = get_lead_status_map().get(status_code)
         
         if not status:
             answer_callback_query(callback_query_id, '❌ Статус не найден', show_alert=True)
             return
         
-        lead.status = status
+        lead.status_id = status['id']
         lead.save()
         
         # Показываем обновленные детали
         show_lead_details(chat_id, message_id, callback_query_id, lead_id)
-        answer_callback_query(callback_query_id, f'✅ Статус изменен на "{status.name}"')
+        answer_callback_query(callback_query_id, f'✅ Статус изменен на "{status["name"]}"')
         
     except Lead.DoesNotExist:
         answer_callback_query(callback_query_id, '❌ Лид не найден', show_alert=True)
@@ -1308,12 +1456,12 @@ def set_lead_status(chat_id, message_id, callback_query_id, lead_id, status_code
         answer_callback_query(callback_query_id, '❌ Ошибка', show_alert=True)
 
 
-def show_clients_list(chat_id, message_id=None, callback_query_id=None):
-    """Показать список клиентов"""
+def show_clients_list(chat_id, message_id=None, callback_query_id=None, cursor=None, direction='next'):
+    """Показать страницу списка клиентов (курсор id в callback_data: crm_clients_page:<a|b><id>)"""
     try:
         from crm.models import Client
         
-        clients = Client.objects.filter(is_active=True).order_by('-created_at')[:20]
+        clients, has_newer, has_older = keyset_page(Client.objects.filter(is_active=True), cursor, direction)
         
         if not clients:
             text = '👥 <b>Клиенты</b>\n\n✅ Нет клиентов.'
@@ -1330,10 +1478,10 @@ def show_clients_list(chat_id, message_id=None, callback_query_id=None):
                 answer_callback_query(callback_query_id, '✅ Нет клиентов')
             return
         
-        text = f'👥 <b>Клиенты ({clients.count()}):</b>\n\n'
+        text = '👥 <b>Клиенты:</b>\n\n'
         buttons = []
         
-        for client in clients[:10]:
+        for client in clients:
             name = client.get_name() or 'Без имени'
             phone = client.get_phone() or 'Нет телефона'
             created = client.created_at.strftime('%d.%m.%Y %H:%M')
@@ -1343,6 +1491,9 @@ def show_clients_list(chat_id, message_id=None, callback_query_id=None):
             )
             buttons.append([{'text': f'#{client.id} {name}', 'callback_data': f'crm_client_{client.id}'}])
         
+        navigation = get_page_navigation('crm_clients_page', clients, has_newer, has_older)
+        if navigation:
+            buttons.append(navigation)
         buttons.append([{'text': '🔙 Назад', 'callback_data': 'crm_refresh'}])
         
         keyboard = {'inline_keyboard': buttons}
@@ -1353,7 +1504,7 @@ def show_clients_list(chat_id, message_id=None, callback_query_id=None):
             send_message(chat_id, text, keyboard=get_crm_menu_keyboard())
         
         if callback_query_id:
-            answer_callback_query(callback_query_id, f'✅ Найдено {clients.count()} клиентов')
+            answer_callback_query(callback_query_id, f'✅ Показано {len(clients)} клиентов')
             
     except Exception as e:
         logger.error(f'Ошибка показа списка клиентов: {str(e)}', exc_info=True)
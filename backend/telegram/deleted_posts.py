@@ -0,0 +1,175 @@
+"""
+Проверка удаленных постов канала
+
+Bot API не сообщает об удалении постов и не позволяет прочитать сообщение по ID.
+Существование поста проверяется копированием (copyMessage) в служебный чат из
+настроек бота (check_chat_id): для удаленного поста Telegram отвечает "message to
+copy not found", а копия существующего сразу удаляется. Сам пост и канал при этом
+не меняются.
+
+Удаленным пост считается только по ответу "message ... not found". Посты, которые
+нельзя скопировать (например, с запретом пересылки), остаются непроверенными.
+Ошибки уровня чата (неверный channel_id или check_chat_id, бот удален из канала или
+лишен прав) останавливают запуск, чтобы не деактивировать весь каталог.
+
+Проверка идет параллельно через общую HTTP-сессию с ограничением частоты, по порядку
+давности последней проверки (telegram_checked_at), поэтому при ограниченном числе
+элементов за запуск каждый следующий запуск продолжает с непроверенных.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+import requests
+from django.db.models import F
+from django.utils import timezone
+from config.rate_limit import RateLimiter
+from .models import TelegramSyncLog
+from .transport import FANOUT_WORKERS, call_api
+
+logger = logging.getLogger(__name__)
+
+# Запросов в секунду при проверке (запас до общего лимита бота)
+CHECK_RATE_LIMIT = 10
+
+_check_limiter = RateLimiter(CHECK_RATE_LIMIT)
+
+# Результаты проверки одного поста
+EXISTS = 'exists'
+DELETED = 'deleted'
+UNKNOWN = 'unknown'
+# Канал недоступен боту: проверка постов бессмысленна
+CHAT_ERROR = 'chat_error'
+
+# Ответы Telegram для удаленного сообщения
+DELETED_DESCRIPTIONS = ('message to copy not found', 'message not found')
+# Ответы Telegram, относящиеся к каналу целиком, а не к посту
+CHAT_ERROR_DESCRIPTIONS = (
+    'chat not found',
+    'bot is not a member',
+    'bot was kicked',
+    'need administrator rights',
+    'not enough rights',
+)
+
+
+def get_channel_chat_id(bot_settings) -> Optional[str]:
+    """ID канала для API: channel_id или @username"""
+    chat_id = bot_settings.channel_id or bot_settings.channel_username
+    if chat_id and not chat_id.startswith('-') and not chat_id.startswith('@'):
+        chat_id = f'@{chat_id}'
+    return chat_id or None
+
+
+def delete_check_copy(token: str, check_chat_id: str, message_id: int):
+    """Удаляет копию поста из служебного чата"""
+    _check_limiter.wait()
+    try:
+        call_api(token, 'deleteMessage', {
+            'chat_id': check_chat_id,
+            'message_id': message_id,
+        }, limit_rate=False)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f'Не удалось удалить копию поста {message_id} из служебного чата: {str(e)}')
+
+
+def check_post_exists(token: str, chat_id: str, message_id: int, check_chat_id: str) -> str:
+    """Проверяет, существует ли пост в канале (EXISTS, DELETED, UNKNOWN или CHAT_ERROR)"""
+    _check_limiter.wait()
+    try:
+        response = call_api(token, 'copyMessage', {
+            'chat_id': check_chat_id,
+            'from_chat_id': chat_id,
+            'message_id': message_id,
+            'disable_notification': True,
+        }, limit_rate=False)
+    except requests.exceptions.HTTPError as e:
+        try:
+            description = e.response.json().get('description', '').lower()
+        except (ValueError, AttributeError):
+            description = ''
+        if any(text in description for text in DELETED_DESCRIPTIONS):
+            return DELETED
+        status_code = getattr(e.response, 'status_code', None)
+        if status_code in (401, 403) or any(text in description for text in CHAT_ERROR_DESCRIPTIONS):
+            logger.warning(f'Канал {chat_id} или служебный чат {check_chat_id} недоступен для проверки постов: {description or str(e)}')
+            return CHAT_ERROR
+        logger.debug(f'Не удалось проверить пост {message_id}: {description or str(e)}')
+        return UNKNOWN
+    except requests.exceptions.RequestException as e:
+        logger.debug(f'Не удалось проверить пост {message_id}: {str(e)}')
+        return UNKNOWN
+    
+    try:
+        copy_id = response.json()['result']['message_id']
+    except (ValueError, KeyError, TypeError):
+        copy_id = None
+    if copy_id:
+        delete_check_copy(token, check_chat_id, copy_id)
+    return EXISTS
+
+
+def check_deleted_posts(bot_settings, limit: int = 100, max_workers: int = FANOUT_WORKERS) -> Dict[str, int]:
+    """
+    Проверяет посты активных элементов каталога и деактивирует удаленные
+    
+    Returns:
+        Словарь со счетчиками checked, deactivated, unknown
+    """
+    from content.models import CatalogItem
+    
+    results = {'checked': 0, 'deactivated': 0, 'unknown': 0}
+    chat_id = get_channel_chat_id(bot_settings)
+    check_chat_id = bot_settings.check_chat_id
+    if not chat_id or not check_chat_id:
+        return results
+    
+    items = list(
+        CatalogItem.objects
+        .filter(telegram_message_id__isnull=False, is_active=True)
+        .order_by(F('telegram_checked_at').asc(nulls_first=True), 'id')
+        .values_list('id', 'telegram_message_id', 'title')[:limit]
+    )
+    if not items:
+        return results
+    
+    def check(item):
+        return check_post_exists(bot_settings.token, chat_id, item[1], check_chat_id)
+    
+    # Первый пост проверяем отдельно: если канал недоступен, остальные запросы не нужны
+    first_status = check(items[0])
+    if first_status == CHAT_ERROR:
+        results['unknown'] = len(items)
+        return results
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))), thread_name_prefix='telegram-check') as pool:
+        statuses = [first_status] + list(pool.map(check, items[1:]))
+    
+    if CHAT_ERROR in statuses:
+        # Канал стал недоступен во время проверки - ответам "not found" не доверяем
+        statuses = [UNKNOWN if status in (CHAT_ERROR, DELETED) else status for status in statuses]
+    
+    checked_ids = [item[0] for item, status in zip(items, statuses) if status != UNKNOWN]
+    deleted = [item for item, status in zip(items, statuses) if status == DELETED]
+    now = timezone.now()
+    
+    CatalogItem.objects.filter(pk__in=checked_ids).update(telegram_checked_at=now)
+    if deleted:
+        CatalogItem.objects.filter(pk__in=[item[0] for item in deleted]).update(is_active=False)
+        TelegramSyncLog.objects.bulk_create([
+            TelegramSyncLog(
+                event_type='catalog_item_deactivated',
+                status='success',
+                message='Элемент каталога деактивирован: пост удален из канала',
+                message_id=message_id,
+                chat_id=str(chat_id),
+                catalog_item_id=item_id,
+                catalog_item_title=title,
+            )
+            for item_id, message_id, title in deleted
+        ])
+        logger.info(f'Деактивированы элементы каталога удаленных постов Telegram: {[item[1] for item in deleted]}')
+    
+    results['checked'] = len(checked_ids)
+    results['deactivated'] = len(deleted)
+    results['unknown'] = len(items) - len(checked_ids)
+    return results
@@ -0,0 +1,189 @@
+"""
+Объединение уведомлений админам в сводки
+
+Если в настройках бота задано окно объединения (notification_digest_seconds),
+первое уведомление отправляется сразу и открывает окно. Уведомления, пришедшие
+в течение окна, копятся и по его окончании уходят одной сводкой. Если за окно
+что-то пришло, открывается следующее окно; если нет - следующее уведомление
+снова отправляется сразу.
+
+Уведомления копятся в таблице AdminNotification, а окно отсчитывается от
+последней отправки, поэтому окно общее для всех процессов. Сводку отправляет
+таймер процесса, добавившего уведомление; каждое уведомление захватывается
+для отправки одним UPDATE, так что в сводку попадает ровно один раз. Уведомления,
+оставшиеся после перезапуска, отправляются при остановке процесса (atexit) или,
+если процесс упал, вместе со следующим уведомлением.
+"""
+import atexit
+import html
+import logging
+import re
+import threading
+from datetime import timedelta
+from typing import List, Optional
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from .bot import send_notification_to_admins
+from .models import AdminNotification
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram - 4096 символов на сообщение
+MAX_MESSAGE_LENGTH = 4000
+DIGEST_SEPARATOR = '\n\n➖➖➖➖➖\n\n'
+
+# Сколько хранить отправленные уведомления (для отсчета окна нужна только последняя отправка)
+SENT_RETENTION = timedelta(days=1)
+
+HTML_TAG_RE = re.compile(r'<[^>]*>')
+
+
+def truncate_html(text: str, limit: int) -> str:
+    """
+    Обрезает текст с HTML-разметкой Telegram до limit символов
+    
+    Обрезка посреди тега или сущности ломает разбор parse_mode=HTML, поэтому
+    длинный текст отправляется без разметки: теги удаляются, спецсимволы
+    экранируются заново.
+    """
+    if len(text) <= limit:
+        return text
+    
+    plain = html.unescape(HTML_TAG_RE.sub('', text))
+    parts = []
+    length = 0
+    for char in plain:
+        escaped = html.escape(char, quote=False)
+        if length + len(escaped) > limit - 1:
+            return ''.join(parts) + '…'
+        parts.append(escaped)
+        length += len(escaped)
+    return ''.join(parts)
+
+
+def build_digest_messages(texts: List[str], window_seconds: int) -> List[str]:
+    """Собирает тексты уведомлений в сообщения-сводки, не длиннее MAX_MESSAGE_LENGTH"""
+    header = f'🗂 <b>Сводка: {len(texts)} новых уведомлений за {window_seconds} с</b>'
+    continuation = header + ' (продолжение)'
+    messages = []
+    current = header
+    for text in texts:
+        text = truncate_html(text, MAX_MESSAGE_LENGTH - len(continuation) - len(DIGEST_SEPARATOR))
+        if len(current) + len(DIGEST_SEPARATOR) + len(text) > MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = continuation
+        current += DIGEST_SEPARATOR + text
+    messages.append(current)
+    return messages
+
+
+def get_window_end(window_seconds: int):
+    """Время окончания текущего окна или None, если уведомлений еще не отправляли"""
+    last_sent = AdminNotification.objects.aggregate(last_sent=Max('sent_at'))['last_sent']
+    if last_sent is None:
+        return None
+    return last_sent + timedelta(seconds=window_seconds)
+
+
+def claim_pending() -> List[AdminNotification]:
+    """Захватывает неотправленные уведомления, пропуская уже взятые другим процессом"""
+    now = timezone.now()
+    claimed = []
+    for notification in AdminNotification.objects.filter(sent_at__isnull=True).order_by('id'):
+        updated = AdminNotification.objects.filter(
+            pk=notification.pk, sent_at__isnull=True
+        ).update(sent_at=now)
+        if updated:
+            claimed.append(notification)
+    return claimed
+
+
+def send_claimed(notifications: List[AdminNotification], window_seconds: int):
+    """Отправляет захваченные уведомления: одно - как есть, несколько - сводкой"""
+    texts = [notification.text for notification in notifications]
+    if len(texts) == 1:
+        send_notification_to_admins(texts[0])
+    elif texts:
+        for message in build_digest_messages(texts, window_seconds):
+            send_notification_to_admins(message)
+    AdminNotification.objects.filter(sent_at__lt=timezone.now() - SENT_RETENTION).delete()
+
+
+class NotificationDigest:
+    """Таймер отправки сводок уведомлений админам в процессе"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._window_seconds = 0
+        atexit.register(self.flush)
+    
+    def notify(self, text: str, window_seconds: int):
+        """
+        Отправляет уведомление сразу или добавляет его в сводку текущего окна
+        
+        Вызывается из фонового потока (отправка может ждать лимитов Telegram).
+        """
+        if not window_seconds:
+            send_notification_to_admins(text)
+            return
+        
+        AdminNotification.objects.create(text=text)
+        window_end = get_window_end(window_seconds)
+        if window_end is None or window_end <= timezone.now():
+            # Окно закрыто - отправляем сразу (вместе с уведомлениями, оставшимися после сбоя)
+            send_claimed(claim_pending(), window_seconds)
+            return
+        self._schedule(window_end, window_seconds)
+    
+    def _schedule(self, window_end, window_seconds: int):
+        with self._lock:
+            self._window_seconds = window_seconds
+            if self._timer is not None:
+                return
+            delay = max(0.0, (window_end - timezone.now()).total_seconds())
+            self._timer = threading.Timer(delay, self._on_window_end)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def _on_window_end(self):
+        with self._lock:
+            self._timer = None
+            window_seconds = self._window_seconds
+        
+        try:
+            window_end = get_window_end(window_seconds)
+            if window_end is not None and window_end > timezone.now():
+                # Окно продлила сводка другого процесса - ждем его окончания
+                if AdminNotification.objects.filter(sent_at__isnull=True).exists():
+                    self._schedule(window_end, window_seconds)
+                return
+            # Отправленная сводка открывает следующее окно
+            send_claimed(claim_pending(), window_seconds)
+        except Exception as e:
+            logger.error(f'Ошибка отправки сводки уведомлений в Telegram: {str(e)}', exc_info=True)
+        finally:
+            connection.close()
+    
+    def flush(self):
+        """Отправляет накопленное, не дожидаясь конца окна (при остановке процесса)"""
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            window_seconds = self._window_seconds
+        
+        try:
+            send_claimed(claim_pending(), window_seconds)
+        except Exception as e:
+            logger.error(f'Ошибка отправки сводки уведомлений при остановке: {str(e)}', exc_info=True)
+
+
+notification_digest = NotificationDigest()
+
+
+def notify_admins(text: str, bot_settings):
+    """Уведомление админам с учетом окна объединения из настроек бота"""
+    notification_digest.notify(text, bot_settings.notification_digest_seconds)
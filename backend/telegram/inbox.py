@@ -0,0 +1,219 @@
+"""
+Очередь входящих обновлений Telegram
+
+Webhook только сохраняет обновление во входящую таблицу TelegramUpdate одним INSERT
+и сразу отвечает Telegram. Повторная доставка (Telegram повторяет webhook, если ответ
+был медленным) отбрасывается по уникальному update_id. Обработка (загрузка
+изображений, элементы каталога, ответы бота) выполняется в фоне по порядку update_id.
+
+Если webhook не установлен, те же обновления можно получать через getUpdates
+(poll_updates, команда sync_telegram_channel): пачки попадают в ту же очередь,
+а смещение сохраняется в настройках бота.
+"""
+import logging
+import threading
+from datetime import timedelta
+from typing import Any, Dict, List
+import requests
+from django.db import connection
+from django.utils import timezone
+from .models import TelegramBotSettings, TelegramUpdate
+from .transport import call_api
+from .bot import CatalogOrderAllocator, handle_webhook_update, log_sync_event
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+# Типы обновлений, которые обрабатывает бот
+UPDATE_TYPES = ('channel_post', 'edited_channel_post', 'message', 'edited_message', 'callback_query')
+
+# Максимум обновлений за один вызов getUpdates (ограничение Telegram)
+GET_UPDATES_LIMIT = 100
+
+# Не запускаем больше одного обработчика очереди в процессе
+_processing_lock = threading.Lock()
+
+
+class WebhookActiveError(Exception):
+    """getUpdates недоступен: у бота установлен webhook"""
+    pass
+
+
+def get_update_type(data: Dict[str, Any]) -> str:
+    """Тип обновления - первый известный ключ, кроме update_id"""
+    for update_type in UPDATE_TYPES:
+        if update_type in data:
+            return update_type
+    return next((key for key in data if key != 'update_id'), '')[:50]
+
+
+def enqueue_updates(updates: List[Dict[str, Any]]):
+    """
+    Сохраняет обновления в очередь одним INSERT
+    
+    Повторная доставка того же update_id игнорируется.
+    """
+    TelegramUpdate.objects.bulk_create(
+        [
+            TelegramUpdate(
+                update_id=data.get('update_id') if isinstance(data.get('update_id'), int) else None,
+                update_type=get_update_type(data),
+                payload=data,
+            )
+            for data in updates
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def enqueue_update(data: Dict[str, Any]):
+    """Сохраняет одно обновление (из webhook) в очередь"""
+    enqueue_updates([data])
+
+
+def poll_updates(bot_settings: TelegramBotSettings, limit: int = GET_UPDATES_LIMIT, timeout: int = 0) -> int:
+    """
+    Получает следующую пачку обновлений через getUpdates и сохраняет ее в очередь
+    
+    Смещение (updates_offset) сохраняется после записи пачки в очередь, поэтому между
+    запусками обновления не теряются и не обрабатываются повторно.
+    
+    Args:
+        bot_settings: Настройки бота
+        limit: Размер пачки (не больше GET_UPDATES_LIMIT)
+        timeout: Long polling - сколько секунд ждать новых обновлений (0 - не ждать)
+    
+    Returns:
+        Количество полученных обновлений
+    
+    Raises:
+        WebhookActiveError: у бота установлен webhook
+        requests.exceptions.RequestException: ошибка запроса
+    """
+    payload = {
+        'limit': max(1, min(limit, GET_UPDATES_LIMIT)),
+        'timeout': timeout,
+        'allowed_updates': list(UPDATE_TYPES),
+    }
+    if bot_settings.updates_offset is not None:
+        payload['offset'] = bot_settings.updates_offset
+    
+    try:
+        response = call_api(bot_settings.token, 'getUpdates', payload, timeout=timeout + 10, limit_rate=False)
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 409:
+            raise WebhookActiveError('У бота установлен webhook, обновления приходят через него') from e
+        raise
+    
+    updates = response.json().get('result', [])
+    if updates:
+        enqueue_updates(updates)
+        bot_settings.updates_offset = max(update['update_id'] for update in updates) + 1
+        TelegramBotSettings.objects.filter(pk=bot_settings.pk).update(updates_offset=bot_settings.updates_offset)
+    return len(updates)
+
+
+def _log_received(update: TelegramUpdate):
+    """Лог синхронизации о полученном обновлении (раньше писался прямо в webhook)"""
+    data = update.payload
+    log_sync_event(
+        event_type='webhook_received',
+        status='success',
+        message=f'Получен webhook: {", ".join(data.keys())}',
+        raw_data=data
+    )
+    if update.update_type == 'edited_channel_post':
+        edited_post = data['edited_channel_post']
+        chat = edited_post.get('chat', {})
+        log_sync_event(
+            event_type='edited_channel_post',
+            status='success',
+            message='Получен обновленный пост из канала через webhook',
+            message_id=edited_post.get('message_id'),
+            chat_id=str(chat.get('id', '')),
+            chat_username=chat.get('username', ''),
+            raw_data=edited_post
+        )
+
+
+def process_pending_updates(batch_size: int = 50) -> Dict[str, int]:
+    """
+    Обрабатывает пачку ожидающих обновлений по порядку update_id
+    
+    Порядок новых элементов каталога определяется одним запросом на страницу за пачку.
+    
+    Returns:
+        Словарь со счетчиками processed, errors
+    """
+    results = {'processed': 0, 'errors': 0}
+    
+    updates = list(
+        TelegramUpdate.objects
+        .filter(status='pending')
+        .order_by('update_id', 'id')[:batch_size]
+    )
+    
+    order_allocator = CatalogOrderAllocator()
+    for update in updates:
+        # Захватываем обновление: если его уже взял другой процесс, пропускаем
+        claimed = TelegramUpdate.objects.filter(
+            pk=update.pk, status='pending', attempts=update.attempts
+        ).update(attempts=update.attempts + 1)
+        if not claimed:
+            continue
+        update.attempts += 1
+        try:
+            if update.attempts == 1:
+                _log_received(update)
+            handle_webhook_update(update.payload, order_allocator=order_allocator)
+            update.status = 'processed'
+            update.processed_at = timezone.now()
+            update.error_message = ''
+            results['processed'] += 1
+        except Exception as e:
+            logger.error(f'Ошибка обработки обновления Telegram {update.update_id}: {str(e)}', exc_info=True)
+            update.status = 'error' if update.attempts >= MAX_ATTEMPTS else 'pending'
+            update.error_message = str(e)
+            results['errors'] += 1
+        update.save(update_fields=['status', 'attempts', 'error_message', 'processed_at'])
+    
+    return results
+
+
+def drain_queue(batch_size: int = 50) -> Dict[str, int]:
+    """Обрабатывает очередь, пока в ней есть ожидающие обновления"""
+    totals = {'processed': 0, 'errors': 0}
+    while True:
+        results = process_pending_updates(batch_size)
+        for key, value in results.items():
+            totals[key] += value
+        if not any(results.values()) or results['errors']:
+            # Очередь пуста или пачка с ошибками - остаток разберет следующий запуск
+            return totals
+
+
+def process_pending_updates_async():
+    """Запускает обработку очереди в фоновом потоке, если она еще не запущена"""
+    def worker():
+        if not _processing_lock.acquire(blocking=False):
+            return
+        try:
+            drain_queue()
+        except Exception as e:
+            logger.error(f'Ошибка обработки очереди обновлений Telegram: {str(e)}', exc_info=True)
+        finally:
+            _processing_lock.release()
+            connection.close()
+    
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+
+
+def prune_processed_updates(days: int = 7) -> int:
+    """Удаляет обработанные обновления старше days дней"""
+    deleted, _ = TelegramUpdate.objects.filter(
+        status='processed',
+        processed_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
@@ -0,0 +1,60 @@
+"""
+Команда для обработки очереди обновлений Telegram
+
+Обновления обычно обрабатываются в фоне сразу после получения webhook. Команда
+разбирает то, что осталось в очереди (например, после перезапуска сервера),
+удаляет старые обработанные обновления и может работать постоянно или из cron.
+
+Использование:
+    python manage.py process_telegram_updates
+    python manage.py process_telegram_updates --loop --interval 5
+"""
+import time
+from django.core.management.base import BaseCommand
+from telegram.inbox import drain_queue, prune_processed_updates
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь обновлений Telegram'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Количество обновлений в одной пачке (по умолчанию: 50)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проверяя очередь с интервалом --interval'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=5,
+            help='Интервал проверки очереди в секундах в режиме --loop (по умолчанию: 5)'
+        )
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=7,
+            help='Сколько дней хранить обработанные обновления (по умолчанию: 7)'
+        )
+    
+    def handle(self, *args, **options):
+        deleted = prune_processed_updates(options['keep_days'])
+        if deleted:
+            self.stdout.write(f'Удалено старых обновлений: {deleted}')
+        
+        while True:
+            results = drain_queue(options['batch_size'])
+            if any(results.values()):
+                self.stdout.write(
+                    f'Обработано: {results["processed"]}, '
+                    f'ошибок: {results["errors"]}'
+                )
+            
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -1,29 +1,49 @@
 """
-Management команда для синхронизации постов из Telegram канала
-Можно запускать периодически через cron для получения постов, которые могли быть пропущены
-"""
-from django.core.management.base import BaseCommand
-from telegram.bot import get_bot_settings, get_file_from_telegram, create_catalog_item_from_telegram_post
-from telegram.models import TelegramBotSettings
-import requests
-import logging
+Management команда для получения постов из Telegram канала через getUpdates
 
-logger = logging.getLogger(__name__)
+Используется, когда webhook не установлен: обновления забираются пачками
+(long polling), сохраняются в очередь TelegramUpdate и обрабатываются так же,
+как полученные через webhook. Смещение сохраняется в настройках бота, поэтому
+каждый запуск продолжает с места, где остановился предыдущий.
 
-TELEGRAM_API_URL = 'https://api.telegram.org/bot{token}/{method}'
+Использование:
+    python manage.py sync_telegram_channel             # забрать все накопившиеся обновления (cron)
+    python manage.py sync_telegram_channel --loop      # работать постоянно
+"""
+import time
+import requests
+from django.core.management.base import BaseCommand
+from telegram.bot import get_bot_settings
+from telegram.inbox import GET_UPDATES_LIMIT, WebhookActiveError, drain_queue, poll_updates
 
 
 class Command(BaseCommand):
-    help = 'Синхронизирует посты из Telegram канала и создает элементы каталога'
-
+    help = 'Получает посты из Telegram канала через getUpdates и создает элементы каталога'
+    
     def add_arguments(self, parser):
         parser.add_argument(
             '--limit',
             type=int,
-            default=10,
-            help='Максимальное количество постов для синхронизации (по умолчанию: 10)',
+            default=GET_UPDATES_LIMIT,
+            help=f'Размер пачки обновлений (по умолчанию и максимум: {GET_UPDATES_LIMIT})',
         )
-
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно (long polling)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=25,
+            help='Сколько секунд ждать новых обновлений в режиме --loop (по умолчанию: 25)',
+        )
+        parser.add_argument(
+            '--reset-offset',
+            action='store_true',
+            help='Сбросить сохраненное смещение и получить все обновления, которые хранит Telegram',
+        )
+    
     def handle(self, *args, **options):
         bot_settings = get_bot_settings()
         
@@ -39,60 +59,44 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('Не указан канал для синхронизации'))
             return
         
-        if not bot_settings.catalog_page:
-            self.stdout.write(self.style.ERROR('Не указана страница каталога для создания элементов'))
-            return
+        if options['reset_offset']:
+            bot_settings.updates_offset = None
+            bot_settings.save(update_fields=['updates_offset'])
         
-        limit = options['limit']
+        limit = max(1, min(options['limit'], GET_UPDATES_LIMIT))
+        timeout = options['timeout'] if options['loop'] else 0
+        totals = {'fetched': 0, 'processed': 0, 'errors': 0}
         
-        try:
-            # Получаем обновления из канала
-            url = TELEGRAM_API_URL.format(token=bot_settings.token, method='getUpdates')
-            
-            # Получаем последние обновления
-            response = requests.post(url, json={
-                'offset': -limit,  # Получаем последние N обновлений
-                'allowed_updates': ['channel_post']  # Только посты из канала
-            }, timeout=30)
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data.get('ok'):
-                self.stdout.write(self.style.ERROR(f'Ошибка API Telegram: {data}'))
+        while True:
+            try:
+                fetched = poll_updates(bot_settings, limit, timeout)
+            except WebhookActiveError as e:
+                self.stdout.write(self.style.ERROR(
+                    f'{e}. Удалите webhook, чтобы получать обновления этой командой'
+                ))
                 return
+            except requests.exceptions.RequestException as e:
+                self.stdout.write(self.style.ERROR(f'Ошибка запроса к Telegram: {str(e)}'))
+                if not options['loop']:
+                    return
+                time.sleep(5)
+                continue
             
-            updates = data.get('result', [])
-            created_count = 0
-            
-            for update in updates:
-                channel_post = update.get('channel_post')
-                if channel_post:
-                    # Проверяем соответствие канала
-                    chat = channel_post.get('chat', {})
-                    chat_id = str(chat.get('id', ''))
-                    chat_username = chat.get('username', '')
-                    
-                    channel_match = False
-                    if bot_settings.channel_id and chat_id == bot_settings.channel_id:
-                        channel_match = True
-                    elif bot_settings.channel_username:
-                        username_clean = bot_settings.channel_username.lstrip('@')
-                        if chat_username == username_clean:
-                            channel_match = True
-                            # Сохраняем ID канала
-                            if not bot_settings.channel_id:
-                                bot_settings.channel_id = chat_id
-                                bot_settings.save(update_fields=['channel_id'])
-                    
-                    if channel_match:
-                        catalog_item = create_catalog_item_from_telegram_post(channel_post)
-                        if catalog_item:
-                            created_count += 1
-                            self.stdout.write(self.style.SUCCESS(f'Создан элемент каталога: {catalog_item.title}'))
+            if fetched:
+                results = drain_queue()
+                totals['fetched'] += fetched
+                totals['processed'] += results['processed']
+                totals['errors'] += results['errors']
+                if options['loop']:
+                    self.stdout.write(
+                        f'Получено: {fetched}, обработано: {results["processed"]}, ошибок: {results["errors"]}'
+                    )
             
-            self.stdout.write(self.style.SUCCESS(f'Синхронизация завершена. Создано элементов каталога: {created_count}'))
-            
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Ошибка синхронизации: {str(e)}'))
-            logger.error(f'Ошибка синхронизации Telegram канала: {str(e)}')
+            # Без --loop забираем пачки, пока Telegram отдает полные
+            if not options['loop'] and fetched < limit:
+                break
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Синхронизация завершена. Получено обновлений: {totals["fetched"]}, '
+            f'обработано: {totals["processed"]}, ошибок: {totals["errors"]}'
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:32
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0010_add_telegram_sync_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegrambotsettings',
+            name='notification_digest_seconds',
+            field=models.PositiveIntegerField(default=0, help_text='Заявки и анкеты, пришедшие в течение этого времени после уведомления, объединяются в одну сводку. Первое уведомление в окне отправляется сразу. 0 - отправлять каждое уведомление отдельно.', validators=[django.core.validators.MaxValueValidator(3600)], verbose_name='Окно объединения уведомлений (секунды)'),
+        ),
+    ]
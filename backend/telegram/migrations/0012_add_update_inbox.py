@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0011_add_notification_digest_seconds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('update_id', models.BigIntegerField(blank=True, help_text='update_id от Telegram. Повторная доставка того же обновления не создает новую запись', null=True, unique=True, verbose_name='ID обновления')),
+                ('update_type', models.CharField(blank=True, max_length=50, verbose_name='Тип обновления')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Данные обновления')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает обработки'), ('processed', 'Обработано'), ('error', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Попыток обработки')),
+                ('error_message', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Получено')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Обработано')),
+            ],
+            options={
+                'verbose_name': 'Обновление Telegram',
+                'verbose_name_plural': 'Обновления Telegram',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['status', 'id'], name='telegram_te_status_a69021_idx')],
+            },
+        ),
+    ]
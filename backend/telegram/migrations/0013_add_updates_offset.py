@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0012_add_update_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegrambotsettings',
+            name='updates_offset',
+            field=models.BigIntegerField(blank=True, help_text='update_id, с которого команда sync_telegram_channel продолжит получение обновлений (заполняется автоматически)', null=True, verbose_name='Смещение getUpdates'),
+        ),
+    ]
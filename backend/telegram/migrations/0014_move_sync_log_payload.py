@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:39
+
+import json
+import zlib
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_payloads(apps, schema_editor):
+    """Переносит исходные данные ошибок и предупреждений в сжатую таблицу (остальные не сохраняются)"""
+    TelegramSyncLog = apps.get_model('telegram', 'TelegramSyncLog')
+    TelegramSyncLogPayload = apps.get_model('telegram', 'TelegramSyncLogPayload')
+    
+    logs = (
+        TelegramSyncLog.objects
+        .filter(raw_data__isnull=False)
+        .filter(models.Q(status__in=['error', 'warning']) | models.Q(event_type__in=['error', 'warning']))
+        .values_list('id', 'raw_data')
+    )
+    batch = []
+    for log_id, raw_data in logs.iterator(chunk_size=500):
+        data = zlib.compress(json.dumps(raw_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        batch.append(TelegramSyncLogPayload(log_id=log_id, data=data))
+        if len(batch) >= 500:
+            TelegramSyncLogPayload.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        TelegramSyncLogPayload.objects.bulk_create(batch)
+
+
+def restore_payloads(apps, schema_editor):
+    TelegramSyncLog = apps.get_model('telegram', 'TelegramSyncLog')
+    TelegramSyncLogPayload = apps.get_model('telegram', 'TelegramSyncLogPayload')
+    
+    for payload in TelegramSyncLogPayload.objects.iterator(chunk_size=500):
+        raw_data = json.loads(zlib.decompress(bytes(payload.data)).decode('utf-8'))
+        TelegramSyncLog.objects.filter(pk=payload.log_id).update(raw_data=raw_data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0013_add_updates_offset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramSyncLogPayload',
+            fields=[
+                ('log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='telegram.telegramsynclog', verbose_name='Лог')),
+                ('data', models.BinaryField(verbose_name='Данные (JSON, zlib)')),
+            ],
+            options={
+                'verbose_name': 'Исходные данные события Telegram',
+                'verbose_name_plural': 'Исходные данные событий Telegram',
+            },
+        ),
+        migrations.RunPython(move_payloads, restore_payloads),
+        migrations.RemoveField(
+            model_name='telegramsynclog',
+            name='raw_data',
+        ),
+    ]
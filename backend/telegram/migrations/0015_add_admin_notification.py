@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0014_move_sync_log_payload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdminNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(verbose_name='Текст')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent_at', models.DateTimeField(blank=True, db_index=True, help_text='Пусто - уведомление ждет окончания окна', null=True, verbose_name='Отправлено')),
+            ],
+            options={
+                'verbose_name': 'Уведомление админам',
+                'verbose_name_plural': 'Уведомления админам',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0015_add_admin_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegrambotsettings',
+            name='check_chat_id',
+            field=models.CharField(blank=True, help_text='ID чата (группы или личного чата с ботом), куда бот копирует пост, чтобы проверить, что он не удален из канала. Копия сразу удаляется. Без него удаленные посты не проверяются.', max_length=100, verbose_name='Служебный чат для проверки постов'),
+        ),
+    ]
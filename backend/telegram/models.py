@@ -1,5 +1,8 @@
+import json
+import zlib
 from django.db import models
 from django.utils import timezone
+from django.core.validators import MaxValueValidator
 
 
 class TelegramBotSettings(models.Model):
@@ -15,6 +18,11 @@ class TelegramBotSettings(models.Model):
     notify_on_booking = models.BooleanField('Уведомлять при новой записи', default=True)
     notify_on_banner_start = models.BooleanField('Уведомлять при начале отображения баннера', default=True)
     notify_on_banner_end = models.BooleanField('Уведомлять при завершении отображения баннера', default=True)
+    notification_digest_seconds = models.PositiveIntegerField(
+        'Окно объединения уведомлений (секунды)', default=0,
+        validators=[MaxValueValidator(3600)],
+        help_text='Заявки и анкеты, пришедшие в течение этого времени после уведомления, объединяются в одну сводку. '
+                  'Первое уведомление в окне отправляется сразу. 0 - отправлять каждое уведомление отдельно.')
     
     # Настройки синхронизации с каналом
     sync_channel_enabled = models.BooleanField('Включить синхронизацию с каналом', default=False,
@@ -23,6 +31,9 @@ class TelegramBotSettings(models.Model):
                                        help_text='Username канала (например, @channel_name) или ID канала (например, -1001234567890). Бот должен быть администратором канала.')
     channel_id = models.CharField('ID канала', max_length=100, blank=True,
                                  help_text='ID канала (заполняется автоматически при первой синхронизации)')
+    check_chat_id = models.CharField('Служебный чат для проверки постов', max_length=100, blank=True,
+                                     help_text='ID чата (группы или личного чата с ботом), куда бот копирует пост, чтобы проверить, '
+                                               'что он не удален из канала. Копия сразу удаляется. Без него удаленные посты не проверяются.')
     catalog_page = models.ForeignKey('content.ContentPage', on_delete=models.SET_NULL, null=True, blank=True,
                                      related_name='telegram_sync_sources',
                                      verbose_name='Страница каталога',
@@ -31,6 +42,8 @@ class TelegramBotSettings(models.Model):
     
     webhook_url = models.CharField('URL webhook', max_length=500, blank=True,
                                   help_text='URL для webhook (заполняется автоматически)')
+    updates_offset = models.BigIntegerField('Смещение getUpdates', null=True, blank=True,
+                                            help_text='update_id, с которого команда sync_telegram_channel продолжит получение обновлений (заполняется автоматически)')
     created_at = models.DateTimeField('Создан', auto_now_add=True)
     updated_at = models.DateTimeField('Обновлен', auto_now=True)
 
@@ -225,10 +238,6 @@ class TelegramSyncLog(models.Model):
     error_details = models.TextField('Детали ошибки', blank=True,
                                     help_text='Детали ошибки, если произошла')
     
-    # Метаданные
-    raw_data = models.JSONField('Исходные данные', null=True, blank=True,
-                               help_text='Исходные данные из Telegram (для отладки)')
-    
     created_at = models.DateTimeField('Создано', auto_now_add=True)
     
     class Meta:
@@ -255,3 +264,84 @@ class TelegramSyncLog(models.Model):
             'skipped': '#6c757d',
         }
         return colors.get(self.status, '#6c757d')
+    
+    def get_raw_data(self):
+        """Исходные данные из Telegram (если были сохранены)"""
+        try:
+            return self.payload.get_data()
+        except TelegramSyncLogPayload.DoesNotExist:
+            return None
+
+
+class TelegramSyncLogPayload(models.Model):
+    """
+    Исходные данные события синхронизации в сжатом виде
+    
+    Хранятся отдельно от лога и только для ошибок и предупреждений
+    и для доли успешных событий (TELEGRAM_LOG_PAYLOAD_SAMPLE_RATE).
+    """
+    log = models.OneToOneField(TelegramSyncLog, on_delete=models.CASCADE, primary_key=True,
+                               related_name='payload', verbose_name='Лог')
+    data = models.BinaryField('Данные (JSON, zlib)')
+    
+    class Meta:
+        verbose_name = 'Исходные данные события Telegram'
+        verbose_name_plural = 'Исходные данные событий Telegram'
+        app_label = 'telegram'
+    
+    @staticmethod
+    def compress(data):
+        return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    
+    def get_data(self):
+        return json.loads(zlib.decompress(bytes(self.data)).decode('utf-8'))
+
+
+class TelegramUpdate(models.Model):
+    """Входящее обновление Telegram (webhook), ожидающее обработки"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает обработки'),
+        ('processed', 'Обработано'),
+        ('error', 'Ошибка'),
+    ]
+    
+    update_id = models.BigIntegerField('ID обновления', null=True, blank=True, unique=True,
+                                       help_text='update_id от Telegram. Повторная доставка того же обновления не создает новую запись')
+    update_type = models.CharField('Тип обновления', max_length=50, blank=True)
+    payload = models.JSONField('Данные обновления', default=dict, blank=True)
+    status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField('Попыток обработки', default=0)
+    error_message = models.TextField('Ошибка', blank=True)
+    received_at = models.DateTimeField('Получено', auto_now_add=True)
+    processed_at = models.DateTimeField('Обработано', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Обновление Telegram'
+        verbose_name_plural = 'Обновления Telegram'
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+        app_label = 'telegram'
+    
+    def __str__(self):
+        return f'{self.update_type or "Обновление"} #{self.update_id} - {self.get_status_display()}'
+
+
+class AdminNotification(models.Model):
+    """Уведомление админам, ожидающее отправки в сводке (окно объединения уведомлений)"""
+    
+    text = models.TextField('Текст')
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Отправлено', null=True, blank=True, db_index=True,
+                                   help_text='Пусто - уведомление ждет окончания окна')
+    
+    class Meta:
+        verbose_name = 'Уведомление админам'
+        verbose_name_plural = 'Уведомления админам'
+        ordering = ['-created_at']
+        app_label = 'telegram'
+    
+    def __str__(self):
+        return f'Уведомление от {self.created_at:%d.%m.%Y %H:%M}'
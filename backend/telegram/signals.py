@@ -7,6 +7,7 @@ from django.utils import timezone
 from django.core.cache import cache
 from .models import TelegramBotSettings
 from .bot import send_notification_to_admins
+from .digest import notify_admins
 import logging
 
 logger = logging.getLogger(__name__)
@@ -43,7 +44,7 @@ def notify_quiz_submission(sender, instance, created, **kwargs):
             f'Время: {instance.created_at.strftime("%d.%m.%Y %H:%M")}'
         )
         
-        send_notification_to_admins(text)
+        notify_admins(text, bot_settings)
     
     thread = threading.Thread(target=send_notification, daemon=True)
     thread.start()
@@ -131,7 +132,7 @@ def notify_booking_submission(sender, instance, created, **kwargs):
         
         text += f'\nВремя: {instance.created_at.strftime("%d.%m.%Y %H:%M")}'
         
-        send_notification_to_admins(text)
+        notify_admins(text, bot_settings)
     
     thread = threading.Thread(target=send_notification, daemon=True)
     thread.start()
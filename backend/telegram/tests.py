@@ -1,3 +1,292 @@
-from django.test import TestCase
+import json
+import re
+from datetime import timedelta
+from unittest import mock
+import requests
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from content.models import CatalogItem, ContentPage
+from crm.models import Client
+from .bot import keyset_page, parse_page_cursor, show_clients_list
+from .deleted_posts import CHAT_ERROR, DELETED, EXISTS, UNKNOWN, check_deleted_posts, check_post_exists
+from .digest import MAX_MESSAGE_LENGTH, NotificationDigest, build_digest_messages, truncate_html
+from .models import AdminNotification, TelegramBotSettings
 
-# Create your tests here.
+
+class TruncateHtmlTests(SimpleTestCase):
+    """Обрезка уведомлений с HTML-разметкой"""
+    
+    def test_short_text_is_unchanged(self):
+        self.assertEqual(truncate_html('<b>Имя:</b> Иван', 100), '<b>Имя:</b> Иван')
+    
+    def test_long_text_loses_markup(self):
+        result = truncate_html('<b>Имя:</b> ' + 'а' * 50, 20)
+        
+        self.assertEqual(len(result), 20)
+        self.assertNotIn('<', result)
+        self.assertTrue(result.startswith('Имя: ааа'))
+        self.assertTrue(result.endswith('…'))
+    
+    def test_entities_are_not_cut(self):
+        result = truncate_html('&lt;' * 20, 10)
+        
+        self.assertEqual(result, '&lt;&lt;…')
+
+
+class BuildDigestMessagesTests(SimpleTestCase):
+    """Сборка сводок уведомлений"""
+    
+    def test_short_texts_fit_one_message(self):
+        messages = build_digest_messages(['<b>Первое</b>', '<b>Второе</b>'], 60)
+        
+        self.assertEqual(len(messages), 1)
+        self.assertIn('Сводка: 2 новых уведомлений за 60 с', messages[0])
+        self.assertIn('<b>Первое</b>', messages[0])
+        self.assertIn('<b>Второе</b>', messages[0])
+    
+    def test_long_digest_is_split(self):
+        messages = build_digest_messages(['<b>Заявка</b> ' + 'x' * 1500] * 5, 60)
+        
+        self.assertGreater(len(messages), 1)
+        self.assertIn('(продолжение)', messages[1])
+        for message in messages:
+            self.assertLessEqual(len(message), MAX_MESSAGE_LENGTH)
+    
+    def test_oversized_text_keeps_markup_balanced(self):
+        messages = build_digest_messages(['<b>' + 'x' * 5000 + '</b>', '<i>Короткое</i>'], 60)
+        
+        for message in messages:
+            self.assertLessEqual(len(message), MAX_MESSAGE_LENGTH)
+            self.assertEqual(
+                len(re.findall(r'<[a-z]', message)), len(re.findall(r'</[a-z]', message))
+            )
+
+
+@mock.patch('telegram.digest.connection')
+@mock.patch('telegram.digest.threading.Timer')
+@mock.patch('telegram.digest.send_notification_to_admins')
+class NotificationDigestTests(TestCase):
+    """Окно объединения уведомлений"""
+    
+    def setUp(self):
+        self.digest = NotificationDigest()
+        self.addCleanup(setattr, self.digest, '_timer', None)
+    
+    def test_without_window_sends_immediately(self, send, timer, connection):
+        self.digest.notify('Заявка', 0)
+        
+        send.assert_called_once_with('Заявка')
+        self.assertFalse(AdminNotification.objects.exists())
+    
+    def test_first_sends_rest_are_collected(self, send, timer, connection):
+        self.digest.notify('Первая', 60)
+        self.digest.notify('Вторая', 60)
+        self.digest.notify('Третья', 60)
+        
+        send.assert_called_once_with('Первая')
+        timer.assert_called_once()
+        self.assertEqual(AdminNotification.objects.filter(sent_at__isnull=True).count(), 2)
+    
+    def test_window_end_sends_digest(self, send, timer, connection):
+        self.digest.notify('Первая', 60)
+        self.digest.notify('Вторая', 60)
+        self.digest.notify('Третья', 60)
+        AdminNotification.objects.update(sent_at=timezone.now() - timedelta(seconds=61))
+        AdminNotification.objects.exclude(text='Первая').update(sent_at=None)
+        
+        self.digest._on_window_end()
+        
+        self.assertEqual(send.call_count, 2)
+        digest_text = send.call_args[0][0]
+        self.assertIn('Сводка: 2', digest_text)
+        self.assertIn('Вторая', digest_text)
+        self.assertFalse(AdminNotification.objects.filter(sent_at__isnull=True).exists())
+    
+    def test_window_extended_by_other_process_waits(self, send, timer, connection):
+        self.digest.notify('Первая', 60)
+        self.digest.notify('Вторая', 60)
+        self.digest._timer = None
+        
+        self.digest._on_window_end()
+        
+        send.assert_called_once_with('Первая')
+        self.assertEqual(timer.call_count, 2)
+    
+    def test_left_after_crash_sent_with_next(self, send, timer, connection):
+        AdminNotification.objects.create(text='Осталась', sent_at=None)
+        AdminNotification.objects.create(text='Старая', sent_at=timezone.now() - timedelta(hours=1))
+        
+        self.digest.notify('Новая', 60)
+        
+        send.assert_called_once()
+        self.assertIn('Осталась', send.call_args[0][0])
+        self.assertIn('Новая', send.call_args[0][0])
+    
+    def test_flush_sends_collected(self, send, timer, connection):
+        self.digest.notify('Первая', 60)
+        self.digest.notify('Вторая', 60)
+        
+        self.digest.flush()
+        
+        self.assertEqual(send.call_args_list[-1], mock.call('Вторая'))
+        self.assertIsNone(self.digest._timer)
+
+
+def api_response(status_code, data):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(data).encode()
+    return response
+
+
+def api_error(status_code, description):
+    response = api_response(status_code, {'ok': False, 'description': description})
+    return requests.exceptions.HTTPError(response=response)
+
+
+@mock.patch('telegram.deleted_posts._check_limiter', mock.Mock())
+@mock.patch('telegram.deleted_posts.call_api')
+class CheckPostExistsTests(SimpleTestCase):
+    """Классификация ответов при проверке поста"""
+    
+    def check(self):
+        return check_post_exists('token', '@channel', 10, '-100500')
+    
+    def test_copy_is_deleted_after_check(self, call_api):
+        call_api.return_value = api_response(200, {'ok': True, 'result': {'message_id': 77}})
+        
+        self.assertEqual(self.check(), EXISTS)
+        self.assertEqual(
+            [(c.args[1], c.args[2]['chat_id']) for c in call_api.call_args_list],
+            [('copyMessage', '-100500'), ('deleteMessage', '-100500')]
+        )
+        self.assertEqual(call_api.call_args_list[1].args[2]['message_id'], 77)
+    
+    def test_message_not_found_is_deleted(self, call_api):
+        call_api.side_effect = api_error(400, 'Bad Request: message to copy not found')
+        
+        self.assertEqual(self.check(), DELETED)
+    
+    def test_not_copyable_is_unknown(self, call_api):
+        call_api.side_effect = api_error(400, "Bad Request: message can't be copied")
+        
+        self.assertEqual(self.check(), UNKNOWN)
+    
+    def test_chat_level_errors(self, call_api):
+        for error in (
+            api_error(400, 'Bad Request: chat not found'),
+            api_error(403, 'Forbidden: bot was kicked from the channel chat'),
+            api_error(401, 'Unauthorized'),
+        ):
+            call_api.side_effect = error
+            self.assertEqual(self.check(), CHAT_ERROR)
+    
+    def test_network_error_is_unknown(self, call_api):
+        call_api.side_effect = requests.exceptions.ConnectionError('refused')
+        
+        self.assertEqual(self.check(), UNKNOWN)
+
+
+@mock.patch('telegram.deleted_posts.check_post_exists')
+class CheckDeletedPostsTests(TestCase):
+    """Деактивация элементов каталога удаленных постов"""
+    
+    def setUp(self):
+        self.bot_settings = TelegramBotSettings(token='token', channel_id='-1001', check_chat_id='-100500')
+        page = ContentPage.objects.create(title='Каталог', slug='catalog')
+        self.items = [
+            CatalogItem.objects.create(page=page, title=f'Пост {n}', slug=f'post-{n}', telegram_message_id=n)
+            for n in (1, 2)
+        ]
+    
+    def active_ids(self):
+        return set(CatalogItem.objects.filter(is_active=True).values_list('telegram_message_id', flat=True))
+    
+    def test_deleted_post_is_deactivated(self, check_post_exists):
+        check_post_exists.side_effect = lambda token, chat_id, message_id, check_chat_id: (
+            DELETED if message_id == 2 else EXISTS
+        )
+        
+        results = check_deleted_posts(self.bot_settings)
+        
+        self.assertEqual(results, {'checked': 2, 'deactivated': 1, 'unknown': 0})
+        self.assertEqual(self.active_ids(), {1})
+    
+    def test_chat_error_stops_run(self, check_post_exists):
+        check_post_exists.return_value = CHAT_ERROR
+        
+        results = check_deleted_posts(self.bot_settings)
+        
+        self.assertEqual(check_post_exists.call_count, 1)
+        self.assertEqual(results['unknown'], 2)
+        self.assertEqual(self.active_ids(), {1, 2})
+    
+    def test_chat_error_during_run_keeps_posts(self, check_post_exists):
+        check_post_exists.side_effect = [EXISTS, CHAT_ERROR]
+        self.items[0].telegram_message_id = 3
+        self.items[0].save()
+        
+        check_deleted_posts(self.bot_settings, max_workers=1)
+        
+        self.assertEqual(self.active_ids(), {2, 3})
+    
+    def test_without_check_chat_nothing_is_checked(self, check_post_exists):
+        self.bot_settings.check_chat_id = ''
+        
+        self.assertEqual(check_deleted_posts(self.bot_settings), {'checked': 0, 'deactivated': 0, 'unknown': 0})
+        check_post_exists.assert_not_called()
+
+
+class KeysetPageTests(TestCase):
+    """Листание списков бота по курсору id"""
+    
+    def setUp(self):
+        self.ids = [AdminNotification.objects.create(text=str(n)).id for n in range(5)]
+        self.queryset = AdminNotification.objects.all()
+    
+    def page_ids(self, *args, **kwargs):
+        items, has_newer, has_older = keyset_page(self.queryset, *args, page_size=2, **kwargs)
+        return [item.id for item in items], has_newer, has_older
+    
+    def test_first_page(self):
+        self.assertEqual(self.page_ids(), ([self.ids[4], self.ids[3]], False, True))
+    
+    def test_next_page(self):
+        self.assertEqual(self.page_ids(self.ids[3]), ([self.ids[2], self.ids[1]], True, True))
+    
+    def test_last_page(self):
+        self.assertEqual(self.page_ids(self.ids[1]), ([self.ids[0]], True, False))
+    
+    def test_previous_page(self):
+        self.assertEqual(self.page_ids(self.ids[1], 'prev'), ([self.ids[3], self.ids[2]], True, True))
+        self.assertEqual(self.page_ids(self.ids[2], 'prev'), ([self.ids[4], self.ids[3]], False, True))
+    
+    def test_single_query_without_count(self):
+        with self.assertNumQueries(1):
+            keyset_page(self.queryset, self.ids[3], page_size=2)
+
+
+class ParsePageCursorTests(SimpleTestCase):
+    """Разбор курсора из callback_data"""
+    
+    def test_older_and_newer(self):
+        self.assertEqual(parse_page_cursor('b15'), (15, 'next'))
+        self.assertEqual(parse_page_cursor('a15'), (15, 'prev'))
+    
+    def test_invalid_cursor_is_first_page(self):
+        for value in ('', 'b', 'x15', 'b1x', 'a-1'):
+            self.assertEqual(parse_page_cursor(value), (None, 'next'))
+
+
+@mock.patch('telegram.bot.send_message')
+class CrmListMessageTests(TestCase):
+    """Списки CRM, отправленные новым сообщением, сохраняют клавиатуру CRM"""
+    
+    def test_clients_list_keeps_crm_keyboard(self, send_message):
+        Client.objects.create()
+        
+        show_clients_list(chat_id=1)
+        
+        keyboard = send_message.call_args.kwargs['keyboard']
+        self.assertIn('keyboard', keyboard)
+        self.assertIsNone(send_message.call_args.kwargs.get('reply_markup'))
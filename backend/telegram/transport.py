@@ -0,0 +1,149 @@
+"""
+HTTP-транспорт для Telegram Bot API
+
+- общая для процесса HTTP-сессия с пулом соединений (без TLS-рукопожатия на каждый запрос);
+- ограничения Telegram: не больше GLOBAL_RATE_LIMIT сообщений в секунду на бота
+  и PER_CHAT_RATE_LIMIT в секунду в один чат;
+- на 429 ждет parameters.retry_after и повторяет запрос;
+- параллельная рассылка нескольким получателям с ограниченным числом потоков.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from config.rate_limit import RateLimiter
+
+TELEGRAM_API_URL = 'https://api.telegram.org/bot{token}/{method}'
+TELEGRAM_FILE_URL = 'https://api.telegram.org/file/bot{token}/{file_path}'
+
+GLOBAL_RATE_LIMIT = 30
+PER_CHAT_RATE_LIMIT = 1
+
+# Повторы при 429, если retry_after не больше MAX_RETRY_AFTER секунд
+MAX_RATE_LIMIT_RETRIES = 2
+MAX_RETRY_AFTER = 30
+
+# Потоков при рассылке нескольким получателям
+FANOUT_WORKERS = 8
+
+_state_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_global_limiter = RateLimiter(GLOBAL_RATE_LIMIT)
+_chat_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_session() -> requests.Session:
+    """Общая для процесса HTTP-сессия для Telegram API"""
+    global _session
+    with _state_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=FANOUT_WORKERS * 2)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def _get_chat_limiter(chat_id) -> RateLimiter:
+    key = str(chat_id)
+    with _state_lock:
+        limiter = _chat_limiters.get(key)
+        if limiter is None:
+            if len(_chat_limiters) > 10000:
+                _chat_limiters.clear()
+            limiter = _chat_limiters[key] = RateLimiter(PER_CHAT_RATE_LIMIT)
+        return limiter
+
+
+def _get_retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.json().get('parameters', {}).get('retry_after'))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def call_api(
+    token: str,
+    method: str,
+    payload: Optional[Dict[str, Any]] = None,
+    timeout: float = 10,
+    limit_rate: bool = True
+) -> requests.Response:
+    """
+    Вызывает метод Bot API через общую сессию
+    
+    Args:
+        token: Токен бота
+        method: Метод API (sendMessage, getFile, ...)
+        payload: Параметры метода
+        timeout: Таймаут запроса в секундах
+        limit_rate: Учитывать ограничения частоты (для отправки сообщений)
+    
+    Returns:
+        Ответ API
+    
+    Raises:
+        requests.exceptions.RequestException: сетевая ошибка или ответ с ошибкой (после повторов на 429)
+    """
+    url = TELEGRAM_API_URL.format(token=token, method=method)
+    chat_id = (payload or {}).get('chat_id')
+    
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        if limit_rate:
+            _global_limiter.wait()
+            if chat_id is not None:
+                _get_chat_limiter(chat_id).wait()
+        
+        response = get_session().post(url, json=payload, timeout=timeout)
+        if response.status_code != 429:
+            break
+        
+        retry_after = _get_retry_after(response) or 1
+        if attempt == MAX_RATE_LIMIT_RETRIES or retry_after > MAX_RETRY_AFTER:
+            break
+        # Flood control Telegram действует на весь бот - приостанавливаем все отправки
+        _global_limiter.pause(retry_after)
+        if chat_id is not None:
+            _get_chat_limiter(chat_id).pause(retry_after)
+    
+    response.raise_for_status()
+    return response
+
+
+def download_file(token: str, file_path: str, timeout: float = 30) -> bytes:
+    """Скачивает файл по file_path из ответа getFile"""
+    response = get_session().get(TELEGRAM_FILE_URL.format(token=token, file_path=file_path), timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+def fan_out(
+    token: str,
+    method: str,
+    chat_ids: Iterable,
+    payload: Dict[str, Any],
+    max_workers: int = FANOUT_WORKERS
+) -> Dict[Any, Optional[str]]:
+    """
+    Параллельно вызывает метод для нескольких чатов
+    
+    Returns:
+        Словарь {chat_id: None при успехе или текст ошибки}
+    """
+    chat_ids = list(dict.fromkeys(chat_ids))
+    if not chat_ids:
+        return {}
+    
+    def send(chat_id) -> Optional[str]:
+        try:
+            call_api(token, method, dict(payload, chat_id=chat_id))
+            return None
+        except requests.exceptions.RequestException as e:
+            return str(e)
+    
+    if len(chat_ids) == 1:
+        return {chat_ids[0]: send(chat_ids[0])}
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chat_ids)), thread_name_prefix='telegram-fanout') as pool:
+        return dict(zip(chat_ids, pool.map(send, chat_ids)))
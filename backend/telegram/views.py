@@ -6,7 +6,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
 import logging
-from .bot import handle_webhook_update
+from .inbox import enqueue_update, process_pending_updates_async
 
 logger = logging.getLogger(__name__)
 
@@ -16,56 +16,18 @@ logger = logging.getLogger(__name__)
 def webhook(request):
     """
     Обработчик webhook от Telegram
+    
+    Обновление только сохраняется в очередь (TelegramUpdate) и сразу подтверждается,
+    обработка выполняется в фоне (telegram.inbox).
     """
     try:
         data = json.loads(request.body)
-        logger.info(f'Получен webhook от Telegram: {list(data.keys())}')
+        if not isinstance(data, dict):
+            return JsonResponse({'ok': False, 'error': 'Invalid payload'}, status=400)
+        logger.info(f'Получен webhook от Telegram: update_id={data.get("update_id")}, {list(data.keys())}')
         
-        # Сохраняем лог о получении webhook
-        from .bot import log_sync_event
-        try:
-            log_sync_event(
-                event_type='webhook_received',
-                status='success',
-                message=f'Получен webhook: {", ".join(data.keys())}',
-                raw_data=data
-            )
-        except Exception as e:
-            logger.error(f'Ошибка сохранения лога webhook: {str(e)}')
-        
-        # Логируем тип обновления
-        if 'channel_post' in data:
-            channel_post = data.get('channel_post', {})
-            chat = channel_post.get('chat', {})
-            message_id = channel_post.get('message_id')
-            logger.info(f'Webhook: channel_post от канала {chat.get("id")} ({chat.get("username")}), message_id: {message_id}')
-        elif 'edited_channel_post' in data:
-            edited_post = data.get('edited_channel_post', {})
-            chat = edited_post.get('chat', {})
-            message_id = edited_post.get('message_id')
-            logger.info(f'Webhook: edited_channel_post от канала {chat.get("id")} ({chat.get("username")}), message_id: {message_id}')
-            # Сохраняем лог о получении обновленного поста
-            try:
-                from .bot import log_sync_event
-                log_sync_event(
-                    event_type='edited_channel_post',
-                    status='success',
-                    message=f'Получен обновленный пост из канала через webhook',
-                    message_id=message_id,
-                    chat_id=str(chat.get('id', '')),
-                    chat_username=chat.get('username', ''),
-                    raw_data=edited_post
-                )
-            except Exception as e:
-                logger.error(f'Ошибка сохранения лога edited_channel_post: {str(e)}')
-        elif 'message' in data:
-            message = data.get('message', {})
-            chat = message.get('chat', {})
-            logger.info(f'Webhook: message от чата {chat.get("id")} ({chat.get("type")})')
-        else:
-            logger.debug(f'Webhook: неизвестный тип обновления: {list(data.keys())}')
-        
-        handle_webhook_update(data)
+        enqueue_update(data)
+        process_pending_updates_async()
         return JsonResponse({'ok': True})
     except json.JSONDecodeError:
         logger.error('Ошибка парсинга JSON от Telegram webhook')